@@ -7,33 +7,115 @@
 # It also carries over some information from the previous chunk to preserve all information, improving RAG performance
 # Returns chunked_pages.json
 
+# Works with .json or .jsonl files (see pipeline_io.py), for example:
+#   python Chunk_cleaned_text.py pages_clean.jsonl chunked_pages.jsonl
+# chunk_pages() can also be imported and given pages straight from the cleaning step
+# --near-dup-threshold 0.9 drops chunks that are near duplicates of an earlier chunk (see near_duplicates.py)
+
+# --max-tokens sizes chunks in nomic-embed-text tokens instead of characters. The exact tokenizer is used if
+# the tokenizers package is installed (pip install tokenizers), otherwise the count is estimated.
+# --workers chunks pages in several processes.
+# chunk_ids are "<url>#<hash of the chunk>", so a chunk keeps its id as long as its text doesn't change
+# (--id-scheme index gives the old "<url>#chunk<number>" ids).
+# benchmark_chunking.py measures the chunker on large generated pages, tests/test_chunking.py checks it still gives
+# the same chunks as the original (legacy_chunk_text)
+# Email addresses, phone numbers, addresses and opening hours found in the chunks are saved to contact_facts.json
+# (see contact_facts.py), the chatbot answers contact questions from it without the LLM. After an incremental crawl
+# use --incremental (and --removed removed_pages.json) so the facts of the pages that did not change are kept:
+#   python Chunk_cleaned_text.py pages_clean.json chunked_pages.json --removed removed_pages.json
+
+import argparse
+import hashlib
 import re
-import json
-from pathlib import Path
+from functools import partial
+from multiprocessing import Pool
+
+from contact_facts import CONTACT_FACTS_FILE, ContactFacts
+from near_duplicates import NearDuplicateIndex, REPORT_FILE, drop_near_duplicates, save_report
+from pipeline_io import read_records, write_records
+
+TOKENIZER_NAME = "nomic-ai/nomic-embed-text-v1"   # Hugging Face tokenizer of nomic-embed-text (BERT WordPiece)
 
 def sentence_split(text):
     """Split text into sentences using regex."""
     sentences = re.split(r'(?<=[.!?]) +', text)
     return [s.strip() for s in sentences if s.strip()]
 
-def chunk_text(text, max_chars=800, overlap=150):
-    """Split text into overlapping chunks, sentence-aware."""
+
+# --- Token counting ---
+TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def approx_token_count(text):
+    """
+    Estimate of the nomic-embed-text token count: one token per word or symbol,
+    plus one for every 4 characters past 6 in long words (WordPiece splits rare long words up)
+    """
+    return sum(1 + max(0, len(piece) - 6) // 4 for piece in TOKEN_PIECES.findall(text))
+
+_tokenizer = None
+
+def exact_token_count(text):
+    """Token count from the real nomic-embed-text tokenizer, loaded once per process"""
+    global _tokenizer
+    if _tokenizer is None:
+        from tokenizers import Tokenizer
+        _tokenizer = Tokenizer.from_pretrained(TOKENIZER_NAME)
+    return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+
+def load_token_counter():
+    """exact_token_count if the tokenizer can be loaded, otherwise approx_token_count"""
+    try:
+        exact_token_count("test")
+        return exact_token_count
+    except Exception as e:
+        print(f"⚠️ Tokenizer not available ({e}), estimating token counts")
+        return approx_token_count
+
+def token_tail(text, tokens, count_tokens):
+    """The end of text, whole words only, holding about the given number of tokens"""
+    words = text.split(" ")
+    total = 0
+    start = len(words)
+    while start > 0 and total < tokens:
+        start -= 1
+        total += count_tokens(words[start])
+    return " ".join(words[start:])
+
+
+# --- Chunking ---
+def chunk_text(text, max_chars=800, overlap=150, count_tokens=None):
+    """
+    Split text into overlapping chunks, sentence-aware.
+
+    If count_tokens (a function returning the number of tokens in a string) is given,
+    max_chars and overlap are numbers of tokens instead of characters.
+    """
+    size = count_tokens or len
     sentences = sentence_split(text)
     chunks = []
     current_chunk = []
+    current_size = 0  # Running total of size(s) for s in current_chunk, so long pages stay linear
 
     for sentence in sentences:
+        sentence_size = size(sentence)
         # If adding this sentence would exceed max length, finalize the current chunk
-        if sum(len(s) for s in current_chunk) + len(sentence) > max_chars:
+        if current_size + sentence_size > max_chars:
             chunk = " ".join(current_chunk).strip()
             if chunk:
                 chunks.append(chunk)
 
             # Start a new chunk, beginning with overlap from previous chunk
-            overlap_text = chunk[-overlap:]
+            if not overlap:
+                overlap_text = ""
+            elif count_tokens:
+                overlap_text = token_tail(chunk, overlap, count_tokens)
+            else:
+                overlap_text = chunk[-overlap:]
             current_chunk = [overlap_text, sentence]
+            current_size = size(overlap_text) + sentence_size
         else:
             current_chunk.append(sentence)
+            current_size += sentence_size
 
     # Add any leftover text
     if current_chunk:
@@ -42,26 +124,119 @@ def chunk_text(text, max_chars=800, overlap=150):
     return chunks
 
 
-# ===  usage with cleaned JSON ===
-input_path = Path("pages_clean.json")   # input JSON file from cleaning step
-output_path = Path("chunked_pages.json")
+def legacy_chunk_text(text, max_chars=800, overlap=150):
+    """
+    chunk_text as it was before the running length (it re-added the length of the whole chunk for every sentence)
+
+    Kept as the reference chunk_text must match: tests/test_chunking.py compares them, benchmark_chunking.py times them
+    """
+    sentences = sentence_split(text)
+    chunks = []
+    current_chunk = []
+    for sentence in sentences:
+        if sum(len(s) for s in current_chunk) + len(sentence) > max_chars:
+            chunk = " ".join(current_chunk).strip()
+            if chunk:
+                chunks.append(chunk)
+            current_chunk = [chunk[-overlap:], sentence]
+        else:
+            current_chunk.append(sentence)
+    if current_chunk:
+        chunks.append(" ".join(current_chunk).strip())
+    return chunks
 
-with input_path.open("r", encoding="utf-8") as f:
-    pages = json.load(f)
 
-chunked_data = []
-for page in pages:
+def chunk_ids(url, chunks, id_scheme="hash"):
+    """Ids for a page's chunks, from a hash of the url and chunk text, or from the chunk number"""
+    if id_scheme == "index":
+        return [f"{url}#chunk{i}" for i in range(len(chunks))]
+
+    ids = []
+    used = set()
+    for chunk in chunks:
+        digest = hashlib.sha256((url + "\n" + chunk).encode("utf-8")).hexdigest()
+        chunk_id = f"{url}#{digest[:16]}"
+        # The same text twice on one page still needs two ids
+        n = 1
+        unique_id = chunk_id
+        while unique_id in used:
+            n += 1
+            unique_id = f"{chunk_id}-{n}"
+        used.add(unique_id)
+        ids.append(unique_id)
+    return ids
+
+
+def chunk_page(page, max_chars=800, overlap=150, count_tokens=None, id_scheme="hash"):
+    """List of chunk records for one page"""
     url = page["url"]
-    text = page["text"]
-    chunks = chunk_text(text, max_chars=800, overlap=150)
-    for i, chunk in enumerate(chunks):
-        chunked_data.append({
+    chunks = chunk_text(page["text"], max_chars=max_chars, overlap=overlap, count_tokens=count_tokens)
+    return [
+        {
             "url": url,
-            "chunk_id": f"{url}#chunk{i}",
+            "chunk_id": chunk_id,
             "text": chunk
-        })
+        }
+        for chunk_id, chunk in zip(chunk_ids(url, chunks, id_scheme), chunks)
+    ]
+
+
+def chunk_pages(pages, max_chars=800, overlap=150, count_tokens=None, id_scheme="hash", workers=1, chunksize=16):
+    """
+    Yield a chunk record for every chunk of every page, in page order
+
+    Args:
+        pages: Iterable of {"url", "text"} records, read lazily
+        max_chars, overlap, count_tokens: see chunk_text
+        id_scheme: "hash" for content hash chunk_ids, "index" for "<url>#chunk<number>"
+        workers: Number of processes to chunk in, pages are sent to them chunksize at a time
+    """
+    worker = partial(chunk_page, max_chars=max_chars, overlap=overlap, count_tokens=count_tokens, id_scheme=id_scheme)
+    if workers > 1:
+        with Pool(workers) as pool:
+            for page_chunks in pool.imap(worker, pages, chunksize=chunksize):
+                yield from page_chunks
+    else:
+        for page in pages:
+            yield from worker(page)
+
+
+# ===  usage with cleaned JSON ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", nargs="?", default="pages_clean.json")     # input file from cleaning step
+    parser.add_argument("output_path", nargs="?", default="chunked_pages.json")
+    parser.add_argument("--near-dup-threshold", type=float,
+                        help="drop chunks at least this similar (0-1) to an earlier chunk, e.g. 0.9")
+    parser.add_argument("--max-tokens", type=int, help="size chunks in tokens instead of characters, e.g. 200")
+    parser.add_argument("--overlap-tokens", type=int, default=40, help="tokens carried over when --max-tokens is used")
+    parser.add_argument("--id-scheme", choices=["hash", "index"], default="hash")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes to chunk pages in")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"the input only holds new and changed pages, keep the facts of the other pages "
+                             f"in {CONTACT_FACTS_FILE}")
+    parser.add_argument("--removed", help="removed_pages.json from an incremental crawl - implies --incremental, "
+                                          "the facts of those pages are dropped")
+    args = parser.parse_args()
 
-with output_path.open("w", encoding="utf-8") as f:
-    json.dump(chunked_data, f, indent=2, ensure_ascii=False)
+    if args.max_tokens:
+        size = {"max_chars": args.max_tokens, "overlap": args.overlap_tokens, "count_tokens": load_token_counter()}
+    else:
+        size = {"max_chars": 800, "overlap": 150}
+    chunks = chunk_pages(read_records(args.input_path), id_scheme=args.id_scheme, workers=args.workers, **size)
+    stats = {}
+    if args.near_dup_threshold:
+        index = NearDuplicateIndex(args.near_dup_threshold)
+        chunks = drop_near_duplicates(chunks, index, key="chunk_id", stats=stats)
+    # An incremental crawl only has the changed pages, so the facts of the other pages are kept
+    facts = ContactFacts.load() if args.incremental or args.removed else ContactFacts()
+    count = write_records(args.output_path, facts.collect(chunks))
+    if args.removed:
+        facts.forget_urls(read_records(args.removed))
+    facts.save()
 
-print(f"Chunking complete. {len(chunked_data)} chunks written to {output_path}")
+    print(f"Chunking complete. {count} chunks written to {args.output_path}")
+    print(f"{len(facts)} contact facts saved to {CONTACT_FACTS_FILE}")
+    if args.near_dup_threshold:
+        save_report(index, level="chunk")
+        print(f"Removed {stats['near_duplicates']} near duplicate chunks (clusters in {REPORT_FILE})")
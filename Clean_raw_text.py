@@ -3,21 +3,40 @@
 # Removes unnecessary/noncontributing text
 # Returns pages_clean.json
 
-import json
+# Works with .json or .jsonl files (see pipeline_io.py), for example:
+#   python Clean_raw_text.py crawl_log.jsonl pages_clean.jsonl
+# Pages are cleaned one at a time, so .jsonl files of any size can be cleaned without loading them into memory
+
+# Cleaning uses the compiled rules from compile_rules(), which give exactly the same text as preprocess_text().
+#   --workers 4   cleans pages in 4 processes
+#   --profile     prints how long each rule took, to find expensive patterns
+#   --near-dup-threshold 0.9   also drops pages that are near duplicates (see near_duplicates.py)
+# tests/test_cleaning.py checks the output still matches preprocess_text(), benchmark_cleaning.py measures the speed
+
+import argparse
+import hashlib
 import re
+import time
+from multiprocessing import Pool
+
+from near_duplicates import NearDuplicateIndex, REPORT_FILE, drop_near_duplicates, save_report
+from pipeline_io import read_records, write_records
+
+HEADER_PATTERNS = [
+    r'^President.*Company.*$',   # Example: "President - Company"
+    r'^Menu.*$'                # Example: "Menu | About | Programs"
+]
+FOOTER_PATTERNS = [
+    r'^© 20\d{2} Company.*$', # Example: "© 2024 Company"
+    r'^All rights reserved.*$'
+]
 
 # --- Preprocessing Functions ---
 def remove_headers_footers(text, header_patterns=None, footer_patterns=None):
     if header_patterns is None:
-        header_patterns = [
-            r'^President.*Company.*$',   # Example: "President - Company"
-            r'^Menu.*$'                # Example: "Menu | About | Programs"
-        ]
+        header_patterns = HEADER_PATTERNS
     if footer_patterns is None:
-        footer_patterns = [
-            r'^© 20\d{2} Company.*$', # Example: "© 2024 Company"
-            r'^All rights reserved.*$'
-        ]
+        footer_patterns = FOOTER_PATTERNS
 
     for pattern in header_patterns + footer_patterns:
         text = re.sub(pattern, '', text, flags=re.MULTILINE)
@@ -47,41 +66,174 @@ def preprocess_text(text):
     text = normalize_whitespace(text)
     return text
 
-# --- Deduplication ---
-def remove_duplicates(pages):
-    seen = set()
-    unique_pages = []
-    for page in pages:
-        cleaned_text = page["text"].strip()
-        if cleaned_text not in seen:
-            seen.add(cleaned_text)
-            unique_pages.append(page)
-    print(f"🧹 Removed {len(pages) - len(unique_pages)} duplicate entries.")
-    return unique_pages
-
-# --- JSON Cleaning Pipeline ---
-def clean_json(input_file, output_file):
-    with open(input_file, "r", encoding="utf-8") as f:
-        pages = json.load(f)
-
-    cleaned_pages = []
-    for page in pages:
-        url = page.get("url")
-        content = page.get("text", "")
-        cleaned_content = preprocess_text(content)
-        cleaned_pages.append({
-            "url": url,
-            "text": cleaned_content
-        })
+# --- Compiled Cleaning Rules ---
+# preprocess_text() above is the reference. The rules below do the same steps in the same order, but the
+# regexes are compiled once, and consecutive header/footer patterns are merged into one pass when that gives the
+# same result
+
+def is_whole_line_pattern(pattern):
+    """
+    True for ^...$ patterns ending in .*$ that can only match within one line. Each removes whole lines, so running
+    them one by one or as one alternation is the same. Patterns with inline flags ((?s), (?i)...), alternatives,
+    backreferences or anything that can match a line break (\\n, \\s, [^...]...) are not merged.
+    """
+    if not (pattern.startswith('^') and pattern.endswith('.*$')):
+        return False
+    if '\n' in pattern or '|' in pattern or re.search(r'\(\?(?!:)', pattern):
+        return False
+    return not re.search(r'\\(?:[nsWDxuUN0-9])|\[\^', pattern)
+
+def header_footer_regexes(patterns):
+    """The patterns compiled in order, each run of consecutive whole line patterns as one regex"""
+    regexes = []
+    run = []
+    for pattern in patterns + [None]:
+        if pattern is not None and is_whole_line_pattern(pattern):
+            run.append(pattern)
+            continue
+        if run:
+            regexes.append(re.compile('|'.join(f'(?:{p})' for p in run), re.MULTILINE))
+            run = []
+        if pattern is not None:
+            regexes.append(re.compile(pattern, re.MULTILINE))
+    return regexes
+
+def compile_rules(header_patterns=None, footer_patterns=None):
+    """The preprocess_text steps as a list of (name, function) pairs"""
+    patterns = (HEADER_PATTERNS if header_patterns is None else header_patterns) + \
+               (FOOTER_PATTERNS if footer_patterns is None else footer_patterns)
+    header_footer_passes = header_footer_regexes(patterns)
+
+    special_characters = re.compile(r'[^\w\s\.,;:\'\"\?\!\-\(\)\/@]')
+    dots = re.compile(r'\.{2,}')
+    dashes = re.compile(r'[-=]{3,}')
+    newlines = re.compile(r'\n{3,}')
+    # Same as [ \t]+ -> ' ', but single spaces (most of the matches, already correct) are not matched at all
+    spaces = re.compile(r'\t[ \t]*| [ \t]+')
+
+    def headers_footers(text):
+        for regex in header_footer_passes:
+            text = regex.sub('', text)
+        return text.strip()
+
+    # Merging dots and dashes into one regex needs a Python callback for the replacement, which measured slower
+    return [
+        ("headers_footers", headers_footers),
+        ("special_characters", lambda text: special_characters.sub('', text).strip()),
+        ("repeated_dots", lambda text: dots.sub('.', text)),
+        ("repeated_dashes", lambda text: dashes.sub(' ', text).strip()),
+        ("line_endings", lambda text: text.replace('\r\n', '\n')),
+        ("newlines", lambda text: newlines.sub('\n\n', text)),
+        ("whitespace", lambda text: spaces.sub(' ', text).strip()),
+    ]
+
+RULES = compile_rules()
+
+def clean_text(text, rules=RULES, timings=None):
+    """Same result as preprocess_text(text). If timings is a dict, the seconds spent in each rule are added to it"""
+    if timings is None:
+        for name, rule in rules:
+            text = rule(text)
+        return text
+
+    for name, rule in rules:
+        start = time.perf_counter()
+        text = rule(text)
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+    return text
 
-    # Remove duplicates before saving
-    cleaned_pages = remove_duplicates(cleaned_pages)
+def clean_page(page):
+    return {
+        "url": page.get("url"),
+        "text": clean_text(page.get("text", ""))
+    }
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(cleaned_pages, f, indent=2, ensure_ascii=False)
+def clean_page_timed(page):
+    timings = {}
+    cleaned = {
+        "url": page.get("url"),
+        "text": clean_text(page.get("text", ""), timings=timings)
+    }
+    return cleaned, timings
 
-    print(f"✅ Cleaned {len(cleaned_pages)} pages. Saved to {output_file}")
+# --- Deduplication ---
+def drop_duplicates(pages, stats=None):
+    """Yield the pages whose stripped text was not seen before, only a hash of each text is kept in memory"""
+    stats = stats if stats is not None else {}
+    stats["duplicates"] = 0
+    seen = set()
+    for page in pages:
+        text_hash = hashlib.sha1(page["text"].strip().encode("utf-8")).digest()
+        if text_hash in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(text_hash)
+        yield page
+
+# --- Cleaning Pipeline ---
+def clean_pages(pages, workers=1, chunksize=32, timings=None):
+    """
+    Yield each page with its text cleaned, in the same order
+
+    Args:
+        pages: Iterable of {"url", "text"} records, read lazily
+        workers: Number of processes to clean in, pages are sent to them chunksize at a time
+        chunksize: Pages per piece of work sent to a process, bigger means less overhead but more memory
+        timings: Optional dict, filled with the total seconds spent in each rule
+    """
+    # crawl_log.jsonl also lists pages removed from the website
+    pages = (page for page in pages if page.get("status") != "removed")
+    worker = clean_page if timings is None else clean_page_timed
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = pool.imap(worker, pages, chunksize=chunksize)
+            yield from collect_timings(results, timings)
+    else:
+        yield from collect_timings(map(worker, pages), timings)
+
+def collect_timings(results, timings):
+    if timings is None:
+        yield from results
+        return
+    for page, page_timings in results:
+        for name, seconds in page_timings.items():
+            timings[name] = timings.get(name, 0.0) + seconds
+        yield page
+
+def print_timings(timings):
+    total = sum(timings.values()) or 1.0
+    print("⏱️ Time per rule:")
+    for name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"   {name:20} {seconds:8.3f}s  {100 * seconds / total:5.1f}%")
+
+def clean_json(input_file, output_file, workers=1, profile=False, near_dup_threshold=None):
+    stats = {}
+    timings = {} if profile else None
+    pages = read_records(input_file)
+    pages = drop_duplicates(clean_pages(pages, workers, timings=timings), stats)
+    if near_dup_threshold:
+        index = NearDuplicateIndex(near_dup_threshold)
+        pages = drop_near_duplicates(pages, index, key="url", stats=stats)
+    count = write_records(output_file, pages)
+
+    print(f"🧹 Removed {stats['duplicates']} duplicate entries.")
+    if near_dup_threshold:
+        save_report(index, level="page")
+        print(f"🧹 Removed {stats['near_duplicates']} near duplicate entries (clusters in {REPORT_FILE})")
+    print(f"✅ Cleaned {count} pages. Saved to {output_file}")
+    if profile:
+        print_timings(timings)
 
 # --- Run ---
 if __name__ == "__main__":
-    clean_json("pages.json", "pages_clean.json")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_file", nargs="?", default="pages.json")
+    parser.add_argument("output_file", nargs="?", default="pages_clean.json")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes to clean pages in")
+    parser.add_argument("--profile", action="store_true", help="print the time spent in each cleaning rule")
+    parser.add_argument("--near-dup-threshold", type=float,
+                        help="also drop pages at least this similar (0-1) to an earlier page, e.g. 0.9")
+    args = parser.parse_args()
+
+    clean_json(args.input_file, args.output_file, args.workers, args.profile, args.near_dup_threshold)
@@ -1,20 +1,55 @@
 
 # ChatGPT generated, personally modified code
 # crawl all the pages in the webiste, scraping and storing relevant information
-# Running this script will create or overwrite pages.json
+# Running this script will create or overwrite pages.json and crawl_manifest.json
 
-# Install these packages: pip install requests beautifulsoup4
+# Every page is appended to crawl_log.jsonl as soon as it is scraped, and the crawl state (the frontier,
+# the urls already seen and the manifest) is saved to crawl_checkpoint.json every few seconds.
+# If the crawl is stopped part way (network error, Ctrl-C...) run it again with --resume to carry on
+# from the last checkpoint. pages.json is written from the log once the crawl has finished.
+
+# crawl_manifest.json remembers the ETag, Last-Modified and a hash of the text of every page.
+# Run with --incremental to only save pages that are new or changed since the last crawl, pages that
+# have disappeared are listed in removed_pages.json. Add --sitemap to start from the site's sitemap.xml,
+# pages whose sitemap <lastmod> has not changed are not downloaded at all.
+
+# Pages are fetched once each by a pool of worker threads, working through the site breadth-first.
+# The threads share one requests session so connections to the website are kept alive and reused.
+
+# By default pages are parsed with BeautifulSoup. --extractor fast uses fast_extract.py instead (lxml), which
+# drops nav/header/footer/script at the DOM level and learns text blocks repeated on many pages.
+
+# Install these packages: pip install requests beautifulsoup4 (and lxml for --extractor fast)
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urldefrag
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import xml.etree.ElementTree as ET
+import argparse
+import hashlib
 import json
+import os
+import threading
+import time
+
+from pipeline_io import read_records, write_records
 
 BASE_URL = ""     # The website you want your RAG chatbot to have knowledge from
 DOMAIN = ""       # Just the domain of the website you want to crawl
 
-visited = set()
-pages_data = []
+MAX_WORKERS = 8       # How many pages are fetched at the same time
+MAX_PER_HOST = 4      # How many of those requests may go to the same host at once - be polite to the website
+REQUEST_TIMEOUT = 10  # Seconds
+
+MANIFEST_FILE = "crawl_manifest.json"
+REMOVED_FILE = "removed_pages.json"
+LOG_FILE = "crawl_log.jsonl"
+CHECKPOINT_FILE = "crawl_checkpoint.json"
+CHECKPOINT_SECONDS = 30   # Save the crawl state at least this often
+CHECKPOINT_PAGES = 500    # ...or after this many pages, whichever comes first
 
 def is_valid_url(url):
     """Check if URL is valid and within the desired path"""
@@ -37,54 +72,360 @@ def should_skip(url):
     return False
 
 
-def scrape_page(url):
-    """Fetch page HTML and extract main content"""
+def make_session(pool_size=MAX_WORKERS):
+    """Session with a connection pool big enough for every worker thread"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# One semaphore per host caps how many requests hit the same host at once
+_host_slots = defaultdict(lambda: threading.Semaphore(MAX_PER_HOST))
+_host_slots_lock = threading.Lock()
+
+def host_slot(url):
+    with _host_slots_lock:
+        return _host_slots[urlparse(url).netloc]
+
+
+def extract_text(soup):
+    """Main content of the page as text"""
+    main = soup.find("main")
+    return main.get_text(separator="\n", strip=True) if main else soup.get_text(separator="\n", strip=True)
+
+def extract_links(url, hrefs):
+    """All crawlable links out of the page's hrefs, without #fragments"""
+    links = []
+    for href in hrefs:
+        new_url = urldefrag(urljoin(url, href))[0]
+        if is_valid_url(new_url) and not should_skip(new_url):
+            links.append(new_url)
+    return links
+
+def extract_page(response):
+    """Default extractor, BeautifulSoup with Python's html.parser - returns (text, hrefs)"""
+    soup = BeautifulSoup(response.text, "html.parser")
+    return extract_text(soup), [link["href"] for link in soup.find_all("a", href=True)]
+
+
+def scrape_page(url, session=None, entry=None, extractor=extract_page):
+    """
+    Fetch page HTML once
+
+    Args:
+        url: The page to fetch
+        session: requests session to fetch with
+        entry: The page's manifest entry from the last crawl, used for If-None-Match/If-Modified-Since
+        extractor: Function taking the response and returning (text, hrefs), see extract_page
+
+    Returns:
+        dict with "status" (ok, not_modified, gone, skipped or failed) and for ok pages
+        the main content "text", the "links" on the page, and its "etag" and "last_modified" headers
+    """
+    session = session or requests
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
     try:
-        response = requests.get(url, timeout=10)
+        with host_slot(url):
+            response = session.get(url, timeout=REQUEST_TIMEOUT, headers=headers)
+        if response.status_code == 304:
+            return {"status": "not_modified"}
+        if response.status_code in (404, 410):
+            print(f"🗑️ Page is gone: {url}")
+            return {"status": "gone"}
         response.raise_for_status()
         if not is_html(response):
             print(f"⚠️ Skipping non-HTML content: {url}")
-            return None
+            return {"status": "skipped"}
     except Exception as e:
         print(f"❌ Failed to fetch {url}: {e}")
-        return None
+        return {"status": "failed"}
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    main = soup.find("main")
-    return main.get_text(separator="\n", strip=True) if main else soup.get_text(separator="\n", strip=True)
+    try:
+        text, hrefs = extractor(response)
+        links = extract_links(url, hrefs)
+    except Exception as e:
+        # A page the parser chokes on must not stop the crawl
+        print(f"❌ Failed to parse {url}: {e}")
+        return {"status": "failed"}
+    return {
+        "status": "ok",
+        "text": text,
+        "links": links,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
 
 
-def crawl(url):
-    """Recursive crawl of all website pages"""
-    if url in visited or should_skip(url):
-        return
-    visited.add(url)
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-    print(f"🌐 Crawling: {url}")
-    text = scrape_page(url)
-    if text:
-        pages_data.append({"url": url, "text": text})
 
-    # Find all links and crawl them
+def load_manifest(path=MANIFEST_FILE):
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-    except Exception as e:
-        print(f"❌ Failed to re-fetch for links {url}: {e}")
-        return
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def fetch_sitemap(base_url, session=None):
+    """Returns {url: lastmod} from the site's sitemap.xml, following one level of sitemap index files"""
+    session = session or requests
+    ns = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+    sitemaps = [urljoin(base_url, "/sitemap.xml")]
+    urls = {}
+    for i, sitemap_url in enumerate(sitemaps):
+        try:
+            response = session.get(sitemap_url, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            root = ET.fromstring(response.content)
+        except Exception as e:
+            print(f"❌ Failed to read sitemap {sitemap_url}: {e}")
+            continue
+        if i == 0:
+            sitemaps += [loc.text.strip() for loc in root.findall("sm:sitemap/sm:loc", ns)]
+        for node in root.findall("sm:url", ns):
+            loc = node.find("sm:loc", ns)
+            lastmod = node.find("sm:lastmod", ns)
+            if loc is not None and loc.text:
+                urls[urldefrag(loc.text.strip())[0]] = lastmod.text.strip() if lastmod is not None and lastmod.text else None
+    return urls
+
+
+def crawl(start_url, stats=None, max_workers=MAX_WORKERS, manifest=None, sitemap=None,
+          checkpoint=None, resume_state=None, extractor=extract_page):
+    """
+    Breadth-first crawl of all website pages, yields every page that is new or has changed as it is scraped
+
+    Args:
+        start_url: The page to start from, normally BASE_URL
+        stats: Optional dict, filled in with page counts, seconds and pages_per_sec as the crawl runs
+        max_workers: Number of pages fetched at the same time
+        manifest: Optional dict from the last crawl (see load_manifest), updated in place.
+                  Without one every page counts as new.
+        sitemap: Optional {url: lastmod} (see fetch_sitemap) used to seed the frontier
+        checkpoint: Optional function called every CHECKPOINT_SECONDS/CHECKPOINT_PAGES with the crawl state.
+                    It is only called between pages, so every page yielded so far has been handled.
+        resume_state: A state passed to checkpoint by an earlier crawl, to carry on where it stopped.
+                      manifest and sitemap should be the ones that were saved with it.
+        extractor: Function turning a response into (text, hrefs), extract_page or fast_extract.make_extractor()
+
+    Yields:
+        {"url", "text", "status": "new" or "changed"} for scraped pages,
+        {"url", "status": "removed"} for manifest pages that now have no text, then
+        {"url", "status": "removed"} for manifest pages that are gone or no longer linked
+
+    Every url is only fetched once. Links are queued when they are first seen, so the same page
+    can't be queued twice and deep link chains don't build up a recursion stack.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(pages=0, new=0, changed=0, unchanged=0, empty=0, removed=0, failed=0, seconds=0.0, pages_per_sec=0.0)
+    manifest = manifest if manifest is not None else {}
+    sitemap = sitemap or {}
+
+    if resume_state:
+        stats.update(resume_state["stats"])
+        previous = set(resume_state["previous"])
+        reached = set(resume_state["reached"])
+        seen = set(resume_state["seen"])
+        frontier = deque(resume_state["frontier"])
+    else:
+        previous = set(manifest)
+        reached = set()
+        seen = set()
+        frontier = deque()
+        start_url = urldefrag(start_url)[0]
+        for url in [start_url, *sitemap]:
+            if url not in seen and not should_skip(url) and (url == start_url or is_valid_url(url)):
+                seen.add(url)
+                frontier.append(url)
+
+    session = make_session(max_workers)
+    start = time.perf_counter() - stats["seconds"]
+    last_report = last_checkpoint = time.perf_counter()
+    pages_at_checkpoint = stats["pages"]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while frontier or running:
+            # Keep every worker busy, oldest urls first
+            finished = []   # (url, result) of pages handled without a download
+            while frontier and len(running) < max_workers:
+                url = frontier.popleft()
+                entry = manifest.get(url)
+                lastmod = sitemap.get(url)
+                if entry and lastmod and entry.get("lastmod") == lastmod:
+                    # The sitemap says the page has not changed since the last crawl, don't download it
+                    finished.append((url, {"status": "not_modified"}))
+                else:
+                    running[pool.submit(scrape_page, url, session, entry, extractor)] = url
+
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                finished += [(running.pop(future), future.result()) for future in done]
+            for url, result in finished:
+                status = result["status"]
+                entry = manifest.get(url)
+                links = []
+
+                if status == "not_modified" and entry:
+                    reached.add(url)
+                    links = entry["links"]
+                    if url in sitemap:
+                        entry["lastmod"] = sitemap[url]
+                    stats["pages"] += 1
+                    stats["unchanged"] += 1
+                elif status == "ok":
+                    reached.add(url)
+                    links = result["links"]
+                    text = result["text"]
+                    text_hash = content_hash(text)
+                    stats["pages"] += 1
+                    if not text:
+                        # Nothing left to import, the page's old text must not stay in the manifest (or Weaviate)
+                        stats["empty"] += 1
+                        if entry is not None:
+                            del manifest[url]
+                            stats["removed"] += 1
+                            yield {"url": url, "status": "removed"}
+                    else:
+                        change = "new" if entry is None else "unchanged" if entry["hash"] == text_hash else "changed"
+                        manifest[url] = {
+                            "hash": text_hash,
+                            "etag": result["etag"],
+                            "last_modified": result["last_modified"],
+                            "lastmod": sitemap.get(url),
+                            "links": links,
+                        }
+                        stats[change] += 1
+                        if change != "unchanged":
+                            yield {"url": url, "text": text, "status": change}
+                elif status == "failed":
+                    # Could be a network blip, don't treat the page as removed. Its links from the last crawl are
+                    # followed too, or the pages only it links to would look removed
+                    reached.add(url)
+                    if entry:
+                        links = entry["links"]
+                    stats["failed"] += 1
+
+                for new_url in links:
+                    if new_url not in seen:
+                        seen.add(new_url)
+                        frontier.append(new_url)
+
+            now = time.perf_counter()
+            stats["seconds"] = now - start
+            stats["pages_per_sec"] = stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0
+            if now - last_report >= 5:
+                last_report = now
+                print(f"🌐 {stats['pages']} pages, {len(frontier)} queued, {stats['pages_per_sec']:.1f} pages/sec")
+
+            if checkpoint and (now - last_checkpoint >= CHECKPOINT_SECONDS
+                               or stats["pages"] - pages_at_checkpoint >= CHECKPOINT_PAGES):
+                last_checkpoint = now
+                pages_at_checkpoint = stats["pages"]
+                # Pages still being fetched go back to the front of the frontier, they will be fetched again on resume
+                checkpoint({
+                    "frontier": list(running.values()) + list(frontier),
+                    "seen": list(seen),
+                    "reached": list(reached),
+                    "previous": list(previous),
+                    "stats": dict(stats),
+                })
+
+    session.close()
+
+    # Pages from the last crawl that were not reached this time have been removed from the website
+    for url in sorted(previous - reached):
+        del manifest[url]
+        stats["removed"] += 1
+        yield {"url": url, "status": "removed"}
+
+
+def write_checkpoint(state, manifest, sitemap, log, path=CHECKPOINT_FILE):
+    """Save the crawl state with the manifest, the sitemap and how far the (binary) log got, written atomically"""
+    log.flush()
+    os.fsync(log.fileno())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"state": state, "manifest": manifest, "sitemap": sitemap, "log_offset": log.tell()}, f)
+    os.replace(tmp_path, path)
+
+
+def write_json_from_log(log_path=LOG_FILE, pages_path="pages.json", removed_path=REMOVED_FILE):
+    """Write pages.json and removed_pages.json from the crawl log, one record at a time"""
+    pages = write_records(pages_path, ({"url": page["url"], "text": page["text"]}
+                                       for page in read_records(log_path) if page["status"] != "removed"))
+    removed = write_records(removed_path, (page["url"]
+                                           for page in read_records(log_path) if page["status"] == "removed"))
+    return pages, removed
 
-    for link in soup.find_all("a", href=True):
-        new_url = urljoin(url, link["href"])
-        if is_valid_url(new_url) and new_url not in visited:
-            crawl(new_url)
 
 if __name__ == "__main__":
-    crawl(BASE_URL)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"only save pages that are new or changed since the crawl recorded in {MANIFEST_FILE}")
+    parser.add_argument("--sitemap", action="store_true",
+                        help="seed the crawl from sitemap.xml and skip pages whose lastmod has not changed")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"carry on from {CHECKPOINT_FILE} after a crawl was stopped")
+    parser.add_argument("--extractor", choices=["bs4", "fast"], default="bs4",
+                        help="bs4 = BeautifulSoup html.parser, fast = lxml with DOM-level boilerplate removal")
+    args = parser.parse_args()
 
-    # Save results to JSON
-    with open("pages.json", "w", encoding="utf-8") as f:
-        json.dump(pages_data, f, indent=2, ensure_ascii=False)
+    extractor = extract_page
+    boilerplate = None
+    if args.extractor == "fast":
+        import fast_extract
+        boilerplate = fast_extract.load_boilerplate()
+        extractor = fast_extract.make_extractor(boilerplate)
+
+    resume_state = None
+    if args.resume and os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        resume_state, manifest, sitemap = saved["state"], saved["manifest"], saved["sitemap"]
+        # Pages logged after the checkpoint will be fetched again, so drop them from the log
+        log = open(LOG_FILE, "r+b")
+        log.truncate(saved["log_offset"])
+        log.seek(saved["log_offset"])
+        print(f"↩️ Resuming crawl: {resume_state['stats']['pages']} pages done, {len(resume_state['frontier'])} queued")
+    else:
+        if args.resume:
+            print(f"⚠️ No {CHECKPOINT_FILE} found, starting a new crawl")
+        manifest = load_manifest() if args.incremental else {}
+        sitemap = fetch_sitemap(BASE_URL) if args.sitemap else {}
+        log = open(LOG_FILE, "wb")
 
-    print(f"\n✅ Finished crawling. Saved {len(pages_data)} pages to pages.json")
+    stats = {}
+    def checkpoint(state):
+        write_checkpoint(state, manifest, sitemap, log)
+
+    with log:
+        for page in crawl(BASE_URL, stats, manifest=manifest, sitemap=sitemap,
+                          checkpoint=checkpoint, resume_state=resume_state, extractor=extractor):
+            log.write((json.dumps(page, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    # Save results to JSON
+    pages_saved, removed_saved = write_json_from_log()
+    save_manifest(manifest)
+    if boilerplate is not None:
+        fast_extract.save_boilerplate(boilerplate)
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
 
+    print(f"\n✅ Finished crawling. Saved {pages_saved} pages to pages.json "
+          f"({stats['pages_per_sec']:.1f} pages/sec, {stats['failed']} failed)")
+    print(f"   {stats['new']} new, {stats['changed']} changed, {stats['unchanged']} unchanged, "
+          f"{stats['empty']} without text, {stats['removed']} removed (listed in {REMOVED_FILE})")
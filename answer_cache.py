@@ -0,0 +1,227 @@
+
+# Cache of chatbot answers, so the questions everyone asks don't cost a search and a generation every time
+# Used by multi_turn_RAG_conversation.chat() and chat_stream()
+
+# Answers are kept per prompt mode, keyed by the (rewritten) question in lowercase without punctuation.
+# A question that is not in the cache with the same words is embedded with nomic-embed-text and compared with the
+# cached questions of the same mode, so "how do I reach billing?" can find "billing office contact". A paraphrase
+# must also share PARAPHRASE_OVERLAP of its content words with the cached question, and the entities either names
+# (query_rewriter.extract_entities) must be in the other, so a similar question about a different office or topic is
+# answered again.
+# On a miss the search reuses that embedding (query_vector), so a new question is still embedded only once.
+# Entries expire after ANSWER_CACHE_TTL seconds, checked when they are looked up and swept every EXPIRE_INTERVAL
+# seconds; the least recently used go first when the cache is full.
+# import_knowledge_chunks_data.py writes knowledge_version.json whenever it changes the KnowledgeChunk collection,
+# the cache is emptied when that file changes.
+
+# Install these packages: pip install numpy requests
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import requests
+
+import ollama_client
+from query_rewriter import content_words, extract_entities, similarity
+
+ANSWER_CACHE_SIZE = 1000        # Answers kept, 0 turns the cache off
+ANSWER_CACHE_TTL = 24 * 60 * 60  # Seconds
+SIMILARITY = 0.92               # Cosine similarity two questions' embeddings need to share an answer
+PARAPHRASE_OVERLAP = 0.25       # Share of content words (query_rewriter.similarity) they need in common as well
+KNOWLEDGE_VERSION_FILE = "knowledge_version.json"
+VERSION_CHECK_INTERVAL = 1.0    # Seconds between looks at KNOWLEDGE_VERSION_FILE
+EXPIRE_INTERVAL = 60.0          # Seconds between sweeps for expired entries
+PENDING_VECTORS = 256           # Embeddings of missed questions kept until their answer is put in the cache
+
+
+def normalize(query):
+    return " ".join(re.findall(r"[a-z0-9]+", query.lower()))
+
+
+def bump_knowledge_version(path=KNOWLEDGE_VERSION_FILE):
+    """Record that the KnowledgeChunk collection changed, cached answers made before are dropped"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": uuid.uuid4().hex, "changed": time.time()}, f)
+    os.replace(tmp, path)
+
+
+def read_knowledge_version(path=KNOWLEDGE_VERSION_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def embed_query(query):
+    return ollama_client.embed([query])[0]
+
+
+def entity_words(query):
+    return set().union(*(content_words(entity) for entity in extract_entities(query)))
+
+
+def same_subject(query, cached):
+    """
+    Whether two normalized questions with close embeddings can share an answer: they have PARAPHRASE_OVERLAP of
+    their content words in common, and the entities either of them names are in the other one
+    """
+    if similarity(query, cached) < PARAPHRASE_OVERLAP:
+        return False
+    return entity_words(query) <= content_words(cached) and entity_words(cached) <= content_words(query)
+
+
+class AnswerCache:
+    """
+    Thread safe LRU cache of answers by (mode, normalized question), with a lookup by embedding for paraphrases
+
+    Args:
+        max_entries: Answers kept, 0 for no caching
+        ttl: Seconds an answer is kept
+        similarity: Cosine similarity needed for a paraphrase hit, None to only match the same words
+        embed: Function question -> vector
+        version_file: The file import_knowledge_chunks_data.py changes after every import
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, similarity=SIMILARITY, embed=embed_query,
+                 version_file=KNOWLEDGE_VERSION_FILE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed = embed
+        self.version_file = version_file
+        self.entries = OrderedDict()   # (mode, normalized question) -> {"answer", "vector", "expires"}
+        self.vectors = OrderedDict()   # Unit vectors of questions looked up but not answered yet, for put()
+        self.counts = {"hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+        self._version = read_knowledge_version(version_file)
+        self._version_checked = self._expired = time.monotonic()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def check_version(self):
+        """Empty the cache if the collection was imported again since the last look"""
+        now = time.monotonic()
+        if now - self._version_checked < VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked = now
+        version = read_knowledge_version(self.version_file)
+        if version != self._version:
+            self._version = version
+            if self.entries:
+                self.counts["invalidations"] += 1
+            self.entries.clear()
+            self.vectors.clear()
+
+    def vector(self, query):
+        """Unit length embedding of query, or None if it could not be embedded"""
+        try:
+            vector = np.asarray(self.embed(query), dtype=np.float32)
+        except requests.RequestException as e:
+            print(f"Answer cache: could not embed the question ({e})")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def get(self, mode, query, metrics=None):
+        """
+        The cached answer to query in this prompt mode, or None
+
+        metrics (optional dict) gets answer_cache: hit, semantic_hit (a paraphrase), miss or off
+        """
+        if not self.max_entries:
+            if metrics is not None:
+                metrics["answer_cache"] = "off"
+            return None
+        key = (mode, normalize(query))
+        now = time.monotonic()
+        with self._lock:
+            self.check_version()
+            self.expire(now)
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires"] <= now:
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.counts["hits"] += 1
+                result = "hit"
+            candidates = [(k, e) for k, e in self.entries.items()
+                          if k[0] == mode and e["vector"] is not None and e["expires"] > now]
+
+        # Embedded even without candidates: the search (query_vector) and put() use the vector
+        if entry is None and self.similarity is not None:
+            vector = self.vector(query)
+            if vector is not None and candidates:
+                scores = np.stack([e["vector"] for k, e in candidates]) @ vector
+                for i in np.argsort(-scores):
+                    if scores[i] < self.similarity:
+                        break
+                    if same_subject(key[1], candidates[i][0][1]):
+                        key, entry = candidates[i]
+                        break
+            if vector is not None:
+                with self._lock:
+                    if entry is None:
+                        self.vectors[key] = vector
+                        if len(self.vectors) > PENDING_VECTORS:
+                            self.vectors.popitem(last=False)
+                    elif key in self.entries:
+                        self.entries.move_to_end(key)
+                        self.counts["semantic_hits"] += 1
+                        result = "semantic_hit"
+                    else:
+                        entry = None   # Evicted in the meantime
+
+        if entry is None:
+            with self._lock:
+                self.counts["misses"] += 1
+            result = "miss"
+        if metrics is not None:
+            metrics["answer_cache"] = result
+        return entry["answer"] if entry is not None else None
+
+    def query_vector(self, mode, query):
+        """The embedding get() made of a question it missed (a list), for the search to reuse, or None"""
+        with self._lock:
+            vector = self.vectors.get((mode, normalize(query)))
+        return None if vector is None else vector.tolist()
+
+    def put(self, mode, query, answer):
+        if not self.max_entries or not answer:
+            return
+        key = (mode, normalize(query))
+        with self._lock:
+            vector = self.vectors.pop(key, None)
+        if vector is None and self.similarity is not None:
+            vector = self.vector(query)
+        with self._lock:
+            self.entries[key] = {"answer": answer, "vector": vector, "expires": time.monotonic() + self.ttl}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counts["evictions"] += 1
+
+    def expire(self, now):
+        """Drop the expired entries, at most every EXPIRE_INTERVAL seconds (get() skips expired ones in between)"""
+        if now - self._expired < EXPIRE_INTERVAL:
+            return
+        self._expired = now
+        for key in [key for key, entry in self.entries.items() if entry["expires"] <= now]:
+            del self.entries[key]
+
+    def stats(self):
+        """Counts of hits, semantic_hits, misses, evictions and invalidations, the hit rate and the entries kept"""
+        with self._lock:
+            stats = dict(self.counts, entries=len(self.entries))
+        lookups = stats["hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,190 @@
+# Answers a file of questions in one go, e.g. the known questions re-checked after every import
+#   python batch_questions.py questions.jsonl answers.jsonl --concurrency 4
+#   python batch_questions.py --stub        (made up questions, stub Ollama and StubKnowledge, to measure the tool)
+
+# questions.jsonl has one {"question": ...} per line, any other fields (an id, the expected answer...) are copied to
+# the answer. Every question is answered on its own by multi_turn_RAG_conversation.chat(), routed by the same keyword
+# router, without conversation history.
+#   - Questions that route to the same mode with the same (lowercased) text are searched once, the chunks are shared
+#   - Searches run in a pool of --retrieval-concurrency threads, started for all questions up front, while
+#     --concurrency questions are answered at the same time, so the next searches are done while answers generate
+#   - Extract questions that contact_facts.json answers are not searched at all
+# Answers are written to the output file as soon as they are ready (so not in input order, "index" is the line of
+# the question), with seconds (the whole question), wait_seconds (waiting for its search), the search's
+# retrieval_seconds and whether it was shared, and chat()'s metrics. A question that fails gets "error" instead.
+# At the end it prints the wall-clock time, questions per minute and latency percentiles.
+# The answer cache is off unless --answer-cache-size is given, so every answer is generated again.
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import multi_turn_RAG_conversation as conversation
+import ollama_client
+from answer_cache import AnswerCache
+from extract_engine import STRATEGIES, ExtractEngine
+from latency_stats import percentile
+from local_index import INDEX_DIR, LocalKnowledge
+from pipeline_io import read_records, write_records
+
+CONCURRENCY = 4             # Questions answered at the same time (generations sent to Ollama at once)
+RETRIEVAL_CONCURRENCY = 8   # Searches run at the same time
+
+
+def timed_retrieve(knowledge, q, prompt_mode, a):
+    start = time.perf_counter()
+    objects = conversation.retrieve(knowledge, q, prompt_mode, a)
+    return objects, time.perf_counter() - start
+
+
+class SharedRetrievals:
+    """One retrieve() per (mode, query), run in a pool of threads, its chunks shared by every question asking it"""
+
+    def __init__(self, knowledge, workers=RETRIEVAL_CONCURRENCY):
+        self.knowledge = knowledge
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieve")
+        self.searches = {}   # (mode, query) -> future of (objects, seconds)
+        self.askers = {}     # (mode, query) -> questions sharing the search
+
+    def submit(self, question):
+        """Start the search for a question unless it is running already, returns (future, key), None if not needed"""
+        q, prompt_mode, mode, temp, a = conversation.route_query(question, announce=False)
+        if prompt_mode == "extract" and conversation.CONTACT_FACTS.answer(q) is not None:
+            return None
+        key = (prompt_mode, q)
+        self.askers[key] = self.askers.get(key, 0) + 1
+        if key not in self.searches:
+            self.searches[key] = self.pool.submit(timed_retrieve, self.knowledge, q, prompt_mode, a)
+        return self.searches[key], key
+
+    def shared(self, key):
+        return self.askers[key] > 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def answer(record, index, knowledge, search, retrievals):
+    """The output record for one question, search is (future, key) from SharedRetrievals.submit() or None"""
+    result = {**record, "index": index}
+    start = time.perf_counter()
+    try:
+        objects = None
+        if search is not None:
+            future, key = search
+            objects, result["retrieval_seconds"] = future.result()
+            result["wait_seconds"] = time.perf_counter() - start
+            result["shared_retrieval"] = retrievals.shared(key)
+        metrics = {}
+        result["answer"] = conversation.chat(record["question"], [], knowledge, metrics, objects=objects)
+        result["mode"] = metrics.get("mode")
+        result["metrics"] = metrics
+    except Exception as e:   # One bad question doesn't stop the run
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run(records, output_path, knowledge, concurrency=CONCURRENCY, retrieval_concurrency=RETRIEVAL_CONCURRENCY):
+    """Answer the question records, writing them to output_path as they finish, returns (results, seconds, searches)"""
+    retrievals = SharedRetrievals(knowledge, retrieval_concurrency)
+    results = []
+    start = time.perf_counter()
+    try:
+        searches = [retrievals.submit(record["question"]) for record in records]
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="answer") as pool:
+            futures = [pool.submit(answer, record, i, knowledge, search, retrievals)
+                       for i, (record, search) in enumerate(zip(records, searches))]
+
+            def finished():
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    print(f"[{len(results)}/{len(records)}] {result['seconds']:.2f}s {result['question'][:60]}"
+                          + (f" ERROR {result['error']}" if "error" in result else ""))
+                    yield result
+
+            write_records(output_path, finished())
+    finally:
+        retrievals.shutdown()
+    return results, time.perf_counter() - start, len(retrievals.searches)
+
+
+def stub_setup(args):
+    """(stub Ollama server, StubKnowledge, made up question records) for --stub"""
+    from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+    from synthetic_site import make_paragraph
+
+    server = serve_stub_ollama(latency=args.latency, token_latency=args.token_latency)
+    ollama_client.OLLAMA_URL = stub_url(server)
+    rng = random.Random(0)
+    chunks = [{"url": f"https://example.com/page-{i}", "chunk_id": f"https://example.com/page-{i}#0",
+               "text": make_paragraph(rng)} for i in range(args.chunks)]
+    knowledge = StubKnowledge(chunks, stub_url(server), latency=args.search_latency)
+    topics = ["billing", "admissions", "the library", "parking", "housing", "financial aid", "IT support",
+              "the career center", "graduation", "transcripts"]
+    templates = ["What is the email address for {}?", "How do I get help with {}?", "Tell me about {}.",
+                 "Who should I contact about {}?", "What does {} cost?"]
+    # Only 50 different questions, so many are asked more than once, like in a question list that grew over time
+    questions = [rng.choice(templates).format(rng.choice(topics)) for _ in range(args.questions)]
+    return server, knowledge, [{"question": question} for question in questions]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", nargs="?", default="questions.jsonl")
+    parser.add_argument("output_path", nargs="?", default="answers.jsonl")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="questions answered at the same time")
+    parser.add_argument("--retrieval-concurrency", type=int, default=RETRIEVAL_CONCURRENCY,
+                        help="searches run at the same time")
+    parser.add_argument("--extract-strategy", choices=STRATEGIES, default=conversation.EXTRACT_ENGINE.strategy,
+                        help="how extract mode runs the generations for the top chunks (see extract_engine.py)")
+    parser.add_argument("--context-tokens", type=int, default=conversation.CONTEXT_TOKENS,
+                        help="token budget for the chunks in guidance and information prompts (see context_packer.py)")
+    parser.add_argument("--answer-cache-size", type=int, default=0, help="answers kept for repeated questions")
+    parser.add_argument("--backend", choices=["weaviate", "local"], default="weaviate",
+                        help="search Weaviate, or the in-process index built by local_index.py")
+    parser.add_argument("--local-index", default=INDEX_DIR, help="directory of the local index")
+    parser.add_argument("--stub", action="store_true", help="made up questions, stub Ollama and StubKnowledge")
+    parser.add_argument("--questions", type=int, default=200, help="questions with --stub")
+    parser.add_argument("--chunks", type=int, default=500, help="chunks in the stub collection")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="stub seconds per search")
+    parser.add_argument("--latency", type=float, default=0.1, help="stub Ollama seconds per request")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="stub Ollama seconds per generated word")
+    args = parser.parse_args()
+    conversation.EXTRACT_ENGINE = ExtractEngine(args.extract_strategy)
+    conversation.CONTEXT_TOKENS = args.context_tokens
+    conversation.ANSWER_CACHE = AnswerCache(args.answer_cache_size)
+
+    client = server = None
+    if args.stub:
+        server, knowledge, records = stub_setup(args)
+        conversation.CONTACT_FACTS = conversation.ContactFacts()   # Every extract question goes to the LLM
+    else:
+        records = list(read_records(args.input_path))
+        if args.backend == "local":
+            knowledge = LocalKnowledge(args.local_index)
+        else:
+            client = conversation.connect(pool_size=args.retrieval_concurrency + args.concurrency)
+            knowledge = client.collections.use(conversation.COLLECTION)
+
+    try:
+        results, seconds, searches = run(records, args.output_path, knowledge, args.concurrency,
+                                         args.retrieval_concurrency)
+    finally:
+        if client is not None:
+            client.close()
+        if server is not None:
+            server.shutdown()
+
+    latencies = [result["seconds"] for result in results]
+    errors = sum("error" in result for result in results)
+    print(f"\n{len(results)} questions in {seconds:.1f}s = {60 * len(results) / seconds:.1f} questions/min "
+          f"({errors} errors), answers in {args.output_path}")
+    print(f"{searches} searches for {sum('retrieval_seconds' in result for result in results)} questions that needed "
+          f"one | question p50 {percentile(latencies, 50):.2f}s p95 {percentile(latencies, 95):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Measures the answer cache (answer_cache.py) on FAQ-like traffic against a stub Ollama and StubKnowledge
+#   python benchmark_answer_cache.py --questions 200 --latency 0.2
+
+# Questions are drawn from a few FAQs, the popular ones much more often (Zipf), each asked in one of several wordings.
+# The stub Ollama's embeddings are random per text, so paraphrases are compared with a bag of words embedding here
+# instead of nomic-embed-text. Half way through, knowledge_version.json is rewritten like an import would, and the
+# cache has to start over.
+# Prints the time per question with the cache off and on, and the cache's hits, paraphrase hits and misses.
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+import answer_cache
+import multi_turn_RAG_conversation as conversation
+import ollama_client
+from answer_cache import AnswerCache, bump_knowledge_version
+from query_rewriter import content_words
+from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+
+FAQS = [
+    ["Tell me about financial aid", "Can you tell me about financial aid?", "Tell me about the financial aid"],
+    ["How do I apply for housing?", "how do i apply for housing", "How do I apply for campus housing?"],
+    ["What programs are offered online?", "Which programs are offered online?", "What programs are offered online"],
+    ["Who should I talk to about registration?", "Who should I talk to about my registration?"],
+    ["Explain the parking policy", "Please explain the parking policy"],
+    ["What research does the college do?", "What research does the college do"],
+    ["How do I get a transcript?", "How do I get my transcript?"],
+    ["What scholarships are there?", "What scholarships are there for students?"],
+]
+DIM = 256
+
+
+def bag_of_words(text):
+    """Stands in for nomic-embed-text: texts with mostly the same content words get similar vectors"""
+    vector = np.zeros(DIM, dtype=np.float32)
+    for word in content_words(text):
+        vector[zlib.crc32(word.encode("utf-8")) % DIM] += 1.0
+    return vector
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=500, help="chunks in the stub collection")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds per LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="stub seconds per search")
+    parser.add_argument("--similarity", type=float, default=answer_cache.SIMILARITY)
+    args = parser.parse_args()
+
+    server = serve_stub_ollama(latency=args.latency)
+    ollama_client.OLLAMA_URL = stub_url(server)
+    rng = random.Random(0)
+    chunks = [{"url": f"https://example.com/page-{i}", "chunk_id": f"https://example.com/page-{i}#0",
+               "text": make_paragraph(rng)} for i in range(args.chunks)]
+    knowledge = StubKnowledge(chunks, stub_url(server), latency=args.search_latency)
+    weights = [1 / (rank + 1) for rank in range(len(FAQS))]
+    questions = [rng.choice(rng.choices(FAQS, weights)[0]) for _ in range(args.questions)]
+    version_file = os.path.join(tempfile.mkdtemp(), "knowledge_version.json")
+
+    try:
+        for size in (0, answer_cache.ANSWER_CACHE_SIZE):
+            conversation.ANSWER_CACHE = cache = AnswerCache(size, similarity=args.similarity, embed=bag_of_words,
+                                                            version_file=version_file)
+            latencies = []
+            for i, question in enumerate(questions):
+                if i == len(questions) // 2:
+                    bump_knowledge_version(version_file)   # Re-imported
+                    time.sleep(answer_cache.VERSION_CHECK_INTERVAL)
+                start = time.perf_counter()
+                conversation.chat(question, [], knowledge)
+                latencies.append(time.perf_counter() - start)
+            label = "cache off" if size == 0 else "cache on"
+            print(f"{label:>10}: {sum(latencies):.2f}s for {len(questions)} questions, "
+                  f"{1000 * sum(latencies) / len(latencies):.0f} ms on average")
+        stats = cache.stats()
+        print(f"            {stats['hits']} hits, {stats['semantic_hits']} paraphrase hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), emptied {stats['invalidations']} time(s) by a re-import")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+
+# Measures Chunk_cleaned_text.py on large generated pages (no files needed)
+#   python benchmark_chunking.py --pages 50 --sentences 20000 --workers 4
+
+# Times the original chunk_text (which re-added the length of the whole chunk for every sentence) against the
+# current one, then token sizing and several processes. tests/test_chunking.py checks both give the same chunks.
+
+import argparse
+import random
+import sys
+import time
+
+from Chunk_cleaned_text import approx_token_count, chunk_pages, chunk_text, legacy_chunk_text
+from synthetic_site import make_sentence
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--sentences", type=int, default=20000, help="sentences per page")
+    parser.add_argument("--max-chars", type=int, default=20000,
+                        help="chunk size for the legacy comparison - the old code slows down with bigger chunks")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [{"url": f"https://example.com/{i}", "text": " ".join(make_sentence(rng) for _ in range(args.sentences))}
+             for i in range(args.pages)]
+    chars = sum(len(page["text"]) for page in pages)
+    print(f"{args.pages} pages, {chars / 1e6:.1f}M characters")
+
+    legacy, legacy_seconds = timed(lambda: [legacy_chunk_text(p["text"], args.max_chars) for p in pages])
+    current, seconds = timed(lambda: [chunk_text(p["text"], args.max_chars) for p in pages])
+    if legacy != current:
+        print("❌ chunk_text output differs from the original")
+        sys.exit(1)
+    print(f"max_chars={args.max_chars}: original {legacy_seconds:.2f}s, running length {seconds:.2f}s (same chunks)")
+
+    _, seconds = timed(lambda: list(chunk_pages(pages)))
+    print(f"800 chars, 1 process:       {chars / seconds / 1e6:6.2f}M chars/sec")
+    _, seconds = timed(lambda: list(chunk_pages(pages, max_chars=200, overlap=40, count_tokens=approx_token_count)))
+    print(f"200 tokens, 1 process:      {chars / seconds / 1e6:6.2f}M chars/sec")
+    _, seconds = timed(lambda: list(chunk_pages(pages, max_chars=200, overlap=40, count_tokens=approx_token_count,
+                                                workers=args.workers, chunksize=1)))
+    print(f"200 tokens, {args.workers} processes:    {chars / seconds / 1e6:6.2f}M chars/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+
+# Checks and measures the compiled cleaning rules in Clean_raw_text.py against the original preprocess_text()
+#   python benchmark_cleaning.py --pages 2000 --workers 4
+
+# Every page is cleaned both ways and the texts must be identical, otherwise the script lists the
+# differing pages and exits with an error. Pages include generated junk (dots, dashes, \r\n, symbols,
+# header and footer lines) as well as normal text, so the edge cases of every rule are exercised.
+
+import argparse
+import random
+import sys
+import time
+
+from Clean_raw_text import clean_pages, clean_text, preprocess_text, print_timings
+from synthetic_site import make_paragraph
+
+EDGE_CASES = [
+    "",
+    "   \n\n\n   ",
+    "Menu | About | Programs\nPresident - Company\nReal text\n© 2024 Company\nAll rights reserved.",
+    "line one\r\n\r\n\r\n\r\nline two\t\t  three",
+    "wait...... what--- ===== ok .. -- == ---",
+    "café © ™ emoji 😀 ¿qué? x@y.com (a/b) \"q\" 'r' ; : !",
+    "\t leading and trailing \t",
+    "President of the Company speaks\nMenu\n\nMenu item",
+    ". . . - - - = = =",
+    "a b c\x0bd\x0ce",
+]
+
+JUNK = ["...", "-----", "=====", "\r\n", "\n\n\n\n", "\t", "   ", "©", "™", "€", "*", "#", "|", "»", "..", "--"]
+LINES = ["Menu | About | Programs", "President - Company", "© 2023 Company Inc", "All rights reserved."]
+
+
+def make_page(rng):
+    parts = []
+    for _ in range(rng.randint(3, 12)):
+        roll = rng.random()
+        if roll < 0.15:
+            parts.append("\n" + rng.choice(LINES) + "\n")
+        elif roll < 0.45:
+            parts.append(rng.choice(JUNK))
+        else:
+            parts.append(make_paragraph(rng, rng.randint(1, 6)))
+        parts.append(rng.choice([" ", "\n", "\n\n", ""]))
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = EDGE_CASES + [make_page(rng) for _ in range(args.pages)]
+    pages = [{"url": f"https://example.com/{i}", "text": text} for i, text in enumerate(texts)]
+
+    # Byte for byte check
+    mismatches = [i for i, text in enumerate(texts) if clean_text(text) != preprocess_text(text)]
+    parallel = [page["text"] for page in clean_pages(pages, workers=args.workers)]
+    mismatches += [i for i, text in enumerate(texts) if parallel[i] != preprocess_text(text)]
+    if mismatches:
+        print(f"❌ {len(mismatches)} pages differ from preprocess_text, first few: {sorted(set(mismatches))[:10]}")
+        sys.exit(1)
+    print(f"✅ {len(texts)} pages cleaned identically to preprocess_text (1 and {args.workers} processes)")
+
+    start = time.perf_counter()
+    for text in texts:
+        preprocess_text(text)
+    original = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts:
+        clean_text(text)
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in clean_pages(pages, workers=args.workers):
+        pass
+    parallel_seconds = time.perf_counter() - start
+
+    print(f"preprocess_text:     {len(texts) / original:9.0f} pages/sec")
+    print(f"compiled rules:      {len(texts) / compiled:9.0f} pages/sec")
+    print(f"{args.workers} processes:         {len(texts) / parallel_seconds:9.0f} pages/sec")
+
+    timings = {}
+    for _ in clean_pages(pages, timings=timings):
+        pass
+    print_timings(timings)
+
+
+if __name__ == "__main__":
+    main()
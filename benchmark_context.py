@@ -0,0 +1,81 @@
+# Measures context packing (context_packer.py) on guidance and information questions against a stub Ollama and
+# StubKnowledge
+#   python benchmark_context.py --questions 20 --prompt-latency 0.002
+
+# The stub collection is made of pages chunked like Chunk_cleaned_text.py does it (800 characters, 150 overlap), each
+# page about one topic, so the top 8 chunks of a question often include neighbours from the same page.
+# The stub Ollama spends --prompt-latency seconds on every prompt word before the first word of the answer, like a
+# CPU-only Ollama reading the prompt. For packing off and for every --budgets value it prints the prompt words sent,
+# the tokens packing saved and the time to the first word.
+
+import argparse
+import random
+
+import multi_turn_RAG_conversation as conversation
+import ollama_client
+from answer_cache import AnswerCache
+from Chunk_cleaned_text import chunk_page
+from latency_stats import percentile
+from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+
+TOPICS = ["financial aid", "housing", "the library", "registration", "advising", "campus health", "research",
+          "career services"]
+QUESTIONS = ["Tell me about {}", "What does {} offer students?", "How do I get help from {}?",
+             "Explain the policy of {}"]
+
+
+def unpacked(objects, budget=None):
+    """Stands in for context_packer.pack(): every chunk as it is"""
+    passages = [{"url": obj.properties["url"], "text": obj.properties["text"]} for obj in objects]
+    return passages, {"chunks": len(passages), "passages": len(passages), "tokens": 0, "tokens_saved": 0}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--paragraphs", type=int, default=6, help="paragraphs per page")
+    parser.add_argument("--prompt-latency", type=float, default=0.002, help="stub seconds per prompt word")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[1500, 800, 400], help="token budgets to try")
+    args = parser.parse_args()
+
+    server = serve_stub_ollama(prompt_latency=args.prompt_latency)
+    ollama_client.OLLAMA_URL = stub_url(server)
+    rng = random.Random(0)
+    chunks = []
+    for i in range(args.pages):
+        topic = TOPICS[i % len(TOPICS)]
+        text = " ".join(f"{make_paragraph(rng)} This is about {topic}." for _ in range(args.paragraphs))
+        chunks.extend(chunk_page({"url": f"https://example.com/page-{i}", "text": text}))
+    knowledge = StubKnowledge(chunks, stub_url(server))
+    conversation.ANSWER_CACHE = AnswerCache(0)   # Every setup asks the same questions
+    questions = [rng.choice(QUESTIONS).format(rng.choice(TOPICS)) for _ in range(args.questions)]
+    print(f"{len(chunks)} chunks from {args.pages} pages, {len(questions)} questions")
+
+    pack, budget = conversation.pack, conversation.CONTEXT_TOKENS
+    try:
+        for setup in ["off"] + args.budgets:
+            conversation.pack = unpacked if setup == "off" else pack
+            conversation.CONTEXT_TOKENS = None if setup == "off" else setup
+            prompt_words_before = server.calls.get("prompt_tokens", 0)
+            first_words, saved, passages = [], [], []
+            for question in questions:
+                metrics = {}
+                for piece in conversation.chat_stream(question, [], knowledge, metrics):
+                    pass
+                first_words.append(metrics["first_token_seconds"])
+                saved.append(metrics["context"]["tokens_saved"])
+                passages.append(metrics["context"]["passages"])
+            prompt_words = (server.calls.get("prompt_tokens", 0) - prompt_words_before) / len(questions)
+            label = "off" if setup == "off" else f"{setup} tokens"
+            print(f"{label:>12}: {prompt_words:.0f} prompt words per question, "
+                  f"{sum(saved) / len(saved):.0f} tokens saved, {sum(passages) / len(passages):.1f} passages | "
+                  f"first words p50 {percentile(first_words, 50):.3f}s p95 {percentile(first_words, 95):.3f}s")
+    finally:
+        conversation.pack, conversation.CONTEXT_TOKENS = pack, budget
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
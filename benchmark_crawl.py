@@ -0,0 +1,99 @@
+
+# Benchmarks the crawler in Website_crawl_scrape.py against a synthetic website served locally
+# Nothing is fetched from the internet
+
+# Compares the thread pool crawler with the old approach (sequential, every page downloaded twice)
+#   python benchmark_crawl.py --pages 500 --latency 0.02 --workers 8
+# With --incremental it also edits/deletes some pages and times a re-crawl with the manifest (and with --sitemap)
+
+import argparse
+import time
+
+import requests
+from bs4 import BeautifulSoup
+from urllib.parse import urljoin
+
+import Website_crawl_scrape as crawler
+from synthetic_site import build_site, serve_site
+
+
+def legacy_crawl(start_url):
+    """The original crawl - sequential and every page fetched twice - written as a loop so big sites don't hit the recursion limit"""
+    visited = set()
+    pages = []
+    stack = [start_url]
+    while stack:
+        url = stack.pop()
+        if url in visited or crawler.should_skip(url):
+            continue
+        visited.add(url)
+
+        response = requests.get(url, timeout=10)
+        soup = BeautifulSoup(response.text, "html.parser")
+        pages.append({"url": url, "text": crawler.extract_text(soup)})
+
+        response = requests.get(url, timeout=10)
+        soup = BeautifulSoup(response.text, "html.parser")
+        for link in reversed(soup.find_all("a", href=True)):
+            new_url = urljoin(url, link["href"])
+            if crawler.is_valid_url(new_url) and new_url not in visited:
+                stack.append(new_url)
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300, help="size of the synthetic site")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds the server waits before answering")
+    parser.add_argument("--workers", type=int, default=crawler.MAX_WORKERS)
+    parser.add_argument("--per-host", type=int, default=crawler.MAX_PER_HOST)
+    parser.add_argument("--extractor", choices=["bs4", "fast"], default="bs4")
+    parser.add_argument("--skip-legacy", action="store_true", help="only run the new crawler")
+    parser.add_argument("--incremental", action="store_true", help="also time re-crawls after changing 5%% of the site")
+    args = parser.parse_args()
+
+    site = build_site(args.pages)
+    server = serve_site(site, latency=args.latency)
+    host, port = server.server_address
+    crawler.DOMAIN = f"{host}:{port}"
+    crawler.MAX_PER_HOST = args.per_host
+    start_url = f"http://{crawler.DOMAIN}/"
+
+    extractor = crawler.extract_page
+    if args.extractor == "fast":
+        import fast_extract
+        extractor = fast_extract.make_extractor(fast_extract.BoilerplateFilter())
+
+    stats = {}
+    manifest = {}
+    pages = list(crawler.crawl(start_url, stats, max_workers=args.workers, manifest=manifest, extractor=extractor))
+    print(f"thread pool crawler: {len(pages)} pages in {stats['seconds']:.2f}s "
+          f"= {stats['pages_per_sec']:.1f} pages/sec ({args.workers} workers, {args.per_host} per host, {args.extractor} extractor)")
+
+    if args.incremental:
+        # Change 5% of the pages and delete 1%, deleting from the end so the rest stay linked
+        for i in range(0, args.pages, 20):
+            site[f"/page{i}"] = site[f"/page{i}"].replace("</main>", "<p>Updated text.</p></main>")
+        for i in range(args.pages - max(1, args.pages // 100), args.pages):
+            del site[f"/page{i}"]
+
+        for use_sitemap in (False, True):
+            sitemap = crawler.fetch_sitemap(start_url) if use_sitemap else None
+            stats = {}
+            delta = list(crawler.crawl(start_url, stats, max_workers=args.workers,
+                                       manifest=dict(manifest), sitemap=sitemap, extractor=extractor))
+            print(f"re-crawl{' + sitemap' if use_sitemap else ''}: {len(delta)} pages in delta "
+                  f"({stats['new']} new, {stats['changed']} changed, {stats['removed']} removed, "
+                  f"{stats['unchanged']} unchanged) in {stats['seconds']:.2f}s")
+
+    if not args.skip_legacy:
+        start = time.perf_counter()
+        pages = legacy_crawl(start_url)
+        seconds = time.perf_counter() - start
+        print(f"legacy crawler:      {len(pages)} pages in {seconds:.2f}s = {len(pages) / seconds:.1f} pages/sec")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Compares the extract mode strategies of extract_engine.py against a stub Ollama and StubKnowledge
+#   python benchmark_extract.py --questions 30 --not-found-rate 0.5
+
+# not_found_rate is the share of chunks the stub LLM answers with "not in my data". The lower it is, the more often
+# the top chunk already has the answer and the more the early exit saves.
+# For every strategy it prints the latency per question, how many generations were started and stopped, the words
+# generated, and the time spent per chunk rank. Exits with an error if a strategy picks a different answer.
+# The last row answers from the contact facts index (contact_facts.py), built from the same chunks. Contact details
+# are added for the first --topics-with-facts topics, questions about the other topics fall back to the LLM.
+
+import argparse
+import random
+import sys
+import time
+
+import multi_turn_RAG_conversation as conversation
+import ollama_client
+from answer_cache import AnswerCache
+from contact_facts import ContactFacts
+from extract_engine import STRATEGIES, ExtractEngine
+from latency_stats import percentile
+from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+
+TOPICS = ["billing", "admissions", "the library", "support", "the main campus", "human resources", "parking"]
+QUESTIONS = ["What is the phone number for {}?", "What is the email address of {}?", "Where is the office of {}?",
+             "What are the opening hours of {}?"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--chunks", type=int, default=500, help="chunks in the stub collection")
+    parser.add_argument("--latency", type=float, default=0.1, help="stub seconds before the first word")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="stub seconds per generated word")
+    parser.add_argument("--not-found-rate", type=float, default=0.5)
+    parser.add_argument("--topics-with-facts", type=int, default=5, help=f"of the {len(TOPICS)} topics")
+    args = parser.parse_args()
+
+    server = serve_stub_ollama(latency=args.latency, token_latency=args.token_latency, not_found_rate=args.not_found_rate)
+    ollama_client.OLLAMA_URL = stub_url(server)
+    rng = random.Random(0)
+    chunks = [{"url": f"https://example.com/page-{i}", "chunk_id": f"https://example.com/page-{i}#0",
+               "text": make_paragraph(rng)} for i in range(args.chunks)]
+    for i, topic in enumerate(TOPICS[:args.topics_with_facts]):
+        chunks[i * 7]["text"] += (f" For questions about {topic} call (555) 010-{1000 + i} or email "
+                                  f"team{i}@example.com. The {topic} office is at {100 + i} Main Street. "
+                                  f"Opening hours for {topic}: Monday - Friday {8 + i % 2}:00 am - 5:00 pm.")
+    knowledge = StubKnowledge(chunks, stub_url(server))
+    conversation.ANSWER_CACHE = AnswerCache(0)   # Questions repeat, every one has to be answered
+    questions = [rng.choice(QUESTIONS).format(rng.choice(TOPICS)) for _ in range(args.questions)]
+    routed = [conversation.route_query(question) for question in questions]
+
+    answers = {}
+    try:
+        for strategy in STRATEGIES:
+            conversation.EXTRACT_ENGINE = ExtractEngine(strategy)
+            calls_before = dict(server.calls)
+            latencies = []
+            per_rank = {}
+            answers[strategy] = []
+            for q, prompt_mode, mode, temp, a in routed:
+                metrics = {}
+                start = time.perf_counter()
+                answers[strategy].append(conversation.extract_answer(knowledge, q, mode, temp, a, metrics))
+                latencies.append(time.perf_counter() - start)
+                for timing in metrics.get("extract_chunks", []):
+                    per_rank.setdefault(timing["rank"], []).append(timing)
+
+            def delta(name):
+                return server.calls.get(name, 0) - calls_before.get(name, 0)
+            print(f"{strategy:>10}: {sum(latencies):.2f}s for {len(questions)} questions, "
+                  f"p50 {percentile(latencies, 50):.3f}s p95 {percentile(latencies, 95):.3f}s | "
+                  f"{delta('/api/generate')} generations started, {delta('cancelled')} stopped early, "
+                  f"{delta('tokens')} words generated")
+            for rank, timings in sorted(per_rank.items()):
+                statuses = {}
+                for timing in timings:
+                    statuses[timing["status"]] = statuses.get(timing["status"], 0) + 1
+                mean = sum(timing["seconds"] for timing in timings) / len(timings)
+                print(f"            chunk {rank + 1}: {mean:.3f}s on average, "
+                      + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())))
+        conversation.EXTRACT_ENGINE = ExtractEngine("sequential")
+        facts = ContactFacts()
+        for chunk in chunks:
+            facts.add(chunk["url"], chunk["text"])
+        conversation.CONTACT_FACTS = facts
+        calls_before = server.calls.get("/api/generate", 0)
+        latencies = []
+        from_index = []
+        for q, prompt_mode, mode, temp, a in routed:
+            metrics = {}
+            start = time.perf_counter()
+            conversation.answer_extract(knowledge, q, mode, temp, a, metrics)
+            latencies.append(time.perf_counter() - start)
+            if metrics["contact_facts"]:
+                from_index.append(latencies[-1])
+        print(f"     facts: {sum(latencies):.2f}s for {len(questions)} questions, "
+              f"p50 {percentile(latencies, 50):.3f}s p95 {percentile(latencies, 95):.3f}s | "
+              f"{len(from_index)} answered from {len(facts)} contact facts "
+              f"in {1000 * sum(from_index) / max(1, len(from_index)):.2f} ms on average, "
+              f"{server.calls.get('/api/generate', 0) - calls_before} generations for the rest")
+    finally:
+        server.shutdown()
+
+    different = [s for s in STRATEGIES if answers[s] != answers["weaviate"]]
+    if different:
+        print(f"Different answers from: {', '.join(different)}")
+        sys.exit(1)
+    print("All strategies gave the same answers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+
+# Compares the two ways Website_crawl_scrape.py can turn a page into text, on synthetic pages (no network):
+#   bs4  - BeautifulSoup html.parser, then Clean_raw_text.py strips header/footer lines with regexes
+#   fast - fast_extract.py, lxml with nav/header/footer/script dropped in the DOM and repeated blocks learned
+# Reports pages per second for extraction and the size of the text that reaches the chunking step
+
+#   python benchmark_extraction.py --pages 1000
+
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+import fast_extract
+from Clean_raw_text import preprocess_text
+from Website_crawl_scrape import extract_text
+from synthetic_site import build_site
+
+
+def run(name, pages, extract):
+    start = time.perf_counter()
+    texts = [extract(html) for html in pages]
+    extract_seconds = time.perf_counter() - start
+    cleaned = [preprocess_text(text) for text in texts]
+    seconds = time.perf_counter() - start
+    chars = sum(len(text) for text in cleaned)
+    share_left = sum("Share this page" in text for text in cleaned)
+    print(f"{name:5} extract {len(pages) / extract_seconds:8.1f} pages/sec | extract+clean {len(pages) / seconds:8.1f} pages/sec "
+          f"| {chars / len(pages):7.0f} chars/page after cleaning | repeated share box left on {share_left} pages")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--paragraphs", type=int, default=8)
+    args = parser.parse_args()
+
+    site = build_site(args.pages, paragraphs=args.paragraphs)
+    pages = [html.encode("utf-8") for path, html in site.items() if path != "/"]
+
+    run("bs4", pages, lambda html: extract_text(BeautifulSoup(html.decode("utf-8"), "html.parser")))
+    boilerplate = fast_extract.BoilerplateFilter()
+    run("fast", pages, lambda html: fast_extract.extract(html, boilerplate)[0])
+    print(f"fast extractor dropped {boilerplate.dropped} repeated blocks, {len(boilerplate.known_blocks())} learned")
+
+
+if __name__ == "__main__":
+    main()
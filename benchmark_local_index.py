@@ -0,0 +1,94 @@
+# Compares the in-process index (local_index.py) with Weaviate's hybrid search
+#   python benchmark_local_index.py chunked_pages.json --weaviate
+#   python benchmark_local_index.py --stub          (synthetic chunks and a stub Ollama, no Weaviate needed)
+
+# The queries are known-item searches: a few words taken from a random chunk, which should then be among the
+# results. For each backend it prints the search latency (p50/p95, including embedding the query) and how often the
+# chunk the words came from is in the top --limit ("found").
+# With --weaviate the same queries also go to the KnowledgeChunk collection (imported from the same file), and
+# "recall" is the share of Weaviate's top --limit the local index returns as well.
+# The stub Ollama's embeddings are random per text, so with --stub only the keyword half of the search finds anything,
+# use --alpha 0 to compare BM25 alone.
+
+import argparse
+import tempfile
+import time
+
+import ollama_client
+from latency_stats import percentile
+from local_index import LocalKnowledge, build
+from pipeline_io import read_records
+from synthetic_site import make_queries, synthetic_chunks
+
+
+def run(knowledge, queries, limit, alpha):
+    """(latencies, [chunk_ids returned for each query])"""
+    latencies, results = [], []
+    for query, chunk_id in queries:
+        start = time.perf_counter()
+        response = knowledge.query.hybrid(query=query, limit=limit, alpha=alpha, return_properties=["url", "chunk_id"])
+        latencies.append(time.perf_counter() - start)
+        results.append([obj.properties["chunk_id"] for obj in response.objects])
+    return latencies, results
+
+
+def report(name, queries, latencies, results):
+    found = sum(chunk_id in result for (query, chunk_id), result in zip(queries, results))
+    print(f"{name:>9}: p50 {1000 * percentile(latencies, 50):.1f} ms  p95 {1000 * percentile(latencies, 95):.1f} ms | "
+          f"found {found}/{len(queries)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", nargs="?", default="chunked_pages.json")
+    parser.add_argument("--stub", action="store_true", help="synthetic chunks and a stub Ollama instead of input_path")
+    parser.add_argument("--pages", type=int, default=500, help="synthetic pages with --stub")
+    parser.add_argument("--weaviate", action="store_true", help="also search the KnowledgeChunk collection")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--words", type=int, default=6, help="words per query")
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--alpha", type=float, default=0.25)
+    args = parser.parse_args()
+
+    server = None
+    if args.stub:
+        from stub_servers import serve_stub_ollama, stub_url
+        server = serve_stub_ollama()
+        ollama_client.OLLAMA_URL = stub_url(server)
+        chunks = synthetic_chunks(args.pages)
+    else:
+        chunks = list(read_records(args.input_path))
+    queries = make_queries(chunks, args.queries, args.words)
+
+    try:
+        from vector_cache import CachedEmbedder, VectorCache
+        index_dir = tempfile.mkdtemp()
+        start = time.perf_counter()
+        build(chunks, CachedEmbedder(VectorCache(tempfile.mkdtemp()) if args.stub else VectorCache()), index_dir)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        local = LocalKnowledge(index_dir)
+        print(f"{len(local)} chunks: index built in {built:.1f}s, opened in {1000 * (time.perf_counter() - start):.0f} ms")
+        print(f"{len(queries)} queries of {args.words} words, limit {args.limit}, alpha {args.alpha}")
+
+        local_latencies, local_results = run(local, queries, args.limit, args.alpha)
+        report("local", queries, local_latencies, local_results)
+
+        if args.weaviate:
+            from multi_turn_RAG_conversation import COLLECTION, connect
+            client = connect()
+            try:
+                latencies, results = run(client.collections.use(COLLECTION), queries, args.limit, args.alpha)
+            finally:
+                client.close()
+            report("weaviate", queries, latencies, results)
+            shared = sum(len(set(a) & set(b)) for a, b in zip(local_results, results))
+            print(f"   recall: {shared / max(1, sum(len(b) for b in results)):.1%} of Weaviate's results "
+                  f"are also in the local index's")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
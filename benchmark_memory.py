@@ -0,0 +1,126 @@
+# Compares the rewrite prompts of the old conversation history (the last 3 turns pasted in full) with
+# ConversationMemory (conversation_memory.py), against a stub Ollama and StubKnowledge
+#   python benchmark_memory.py --answer-words 150 --prompt-latency 0.002
+
+# Every follow-up question is sent to the LLM for rewriting (resolve_locally is switched off), so each one shows the
+# size of its rewrite prompt. The stub Ollama counts prompt words as tokens and, with --prompt-latency, takes that
+# long per word to "read" the prompt, like a CPU-only Ollama does.
+# For both setups it prints the rewrite prompt tokens (mean and max) and rewrite latency, by turn of the conversation.
+# Then it saves and loads the memories with SessionDB, the time per save and load and the size of a saved session.
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import multi_turn_RAG_conversation as conversation
+import ollama_client
+from answer_cache import AnswerCache
+from conversation_memory import ConversationMemory, SessionDB
+from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+
+TOPICS = ["billing office", "library", "admissions office", "financial aid office", "Springfield Campus",
+          "career center", "housing office", "IT help desk"]
+FOLLOW_UPS = ["What are their opening hours?", "Who runs it?", "How do I get in touch with them?",
+              "Is it open on weekends?", "Does it have parking nearby?", "What do they charge for it?",
+              "Can I reach them online too?"]
+
+
+def legacy_prompt_text(conversation_history):
+    """The history text rewrite_query() used to send: the last 3 turns with their full answers"""
+    history_text = ""
+    for turn in conversation_history[-3:]:
+        history_text += f"User: {turn['user']}\nAssistant: {turn['assistant']}\n\n"
+    return history_text
+
+
+def run(knowledge, setup, conversations, memory_tokens):
+    """{turn number: [(rewrite prompt tokens, rewrite seconds), ...]} and the histories"""
+    prompt_text, resolve_locally = conversation.prompt_text, conversation.resolve_locally
+    conversation.resolve_locally = lambda query, history: None   # Every follow-up goes to the LLM
+    if setup == "old":
+        conversation.prompt_text = legacy_prompt_text
+    by_turn = {}
+    histories = []
+    try:
+        for turns in conversations:
+            history = [] if setup == "old" else ConversationMemory(budget=memory_tokens)
+            for i, question in enumerate(turns):
+                metrics = {}
+                conversation.chat(question, history, knowledge, metrics)
+                if "rewrite_prompt_tokens" in metrics:
+                    by_turn.setdefault(i + 1, []).append((metrics["rewrite_prompt_tokens"], metrics["rewrite_seconds"]))
+            histories.append(history)
+    finally:
+        conversation.prompt_text, conversation.resolve_locally = prompt_text, resolve_locally
+    return by_turn, histories
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=8, help="questions per conversation")
+    parser.add_argument("--answer-words", type=int, default=150, help="average words in a stub answer")
+    parser.add_argument("--prompt-latency", type=float, default=0.001, help="stub seconds per prompt word")
+    parser.add_argument("--memory-tokens", type=int, default=conversation.MEMORY_TOKENS)
+    parser.add_argument("--chunks", type=int, default=200, help="chunks in the stub collection")
+    args = parser.parse_args()
+
+    server = serve_stub_ollama(answer_words=args.answer_words, prompt_latency=args.prompt_latency)
+    ollama_client.OLLAMA_URL = stub_url(server)
+    rng = random.Random(0)
+    chunks = [{"url": f"https://example.com/page-{i}", "chunk_id": f"https://example.com/page-{i}#0",
+               "text": make_paragraph(rng)} for i in range(args.chunks)]
+    knowledge = StubKnowledge(chunks, stub_url(server))
+    conversation.CONTACT_FACTS = conversation.ContactFacts()   # Every extract question goes to the LLM
+    conversation.ANSWER_CACHE = AnswerCache(0)   # Both setups ask the same questions
+    conversations = [[f"Tell me about the {TOPICS[c % len(TOPICS)]}"] +
+                     [rng.choice(FOLLOW_UPS) for _ in range(args.turns - 1)] for c in range(args.conversations)]
+
+    results = {}
+    try:
+        for setup in ("old", "new"):
+            results[setup] = run(knowledge, setup, conversations, args.memory_tokens)
+    finally:
+        server.shutdown()
+
+    print(f"\nRewrite prompts, {args.conversations} conversations of {args.turns} turns, answers of about "
+          f"{args.answer_words} words (prompt tokens mean/max, rewrite seconds mean)")
+    print(f"{'turn':>4} " + " ".join(f"{setup:>22}" for setup in results))
+    for turn in sorted(results["old"][0]):
+        cells = []
+        for setup, (by_turn, histories) in results.items():
+            tokens = [t for t, s in by_turn.get(turn, [])]
+            seconds = [s for t, s in by_turn.get(turn, [])]
+            cells.append(f"{statistics.mean(tokens):7.0f}/{max(tokens):5} {statistics.mean(seconds):7.3f}s"
+                         if tokens else f"{'':>22}")
+        print(f"{turn:>4} " + " ".join(cells))
+    for setup, (by_turn, histories) in results.items():
+        tokens = [t for rewrites in by_turn.values() for t, s in rewrites]
+        seconds = [s for rewrites in by_turn.values() for t, s in rewrites]
+        print(f"{setup:>4}: {len(tokens)} rewrites, prompt tokens mean {statistics.mean(tokens):.0f} "
+              f"max {max(tokens)}, rewrite {statistics.mean(seconds):.3f}s on average")
+
+    memories = results["new"][1]
+    path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+    db = SessionDB(path, budget=args.memory_tokens)
+    try:
+        start = time.perf_counter()
+        for i, memory in enumerate(memories):
+            db.save(f"session-{i}", memory)
+        saved = (time.perf_counter() - start) / len(memories)
+        start = time.perf_counter()
+        loaded = [db.load(f"session-{i}") for i in range(len(memories))]
+        load = (time.perf_counter() - start) / len(memories)
+    finally:
+        db.close()
+    same = all(a.to_dict() == b.to_dict() for a, b in zip(memories, loaded))
+    print(f"SessionDB: save {1000 * saved:.2f} ms, load {1000 * load:.2f} ms per session, "
+          f"{os.path.getsize(path) / len(memories) / 1024:.1f} KB per session, loaded {'the same' if same else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# End to end benchmark: crawl -> clean -> chunk -> import -> query on a synthetic website, with the stub Ollama and
+# stub Weaviate from stub_servers.py standing in for the real services. Nothing is fetched from the internet.
+#   python benchmark_pipeline.py --pages 300 --questions 50
+#   python benchmark_pipeline.py --output after.json --compare before.json
+
+# The stages are the ones run_pipeline.py and the chatbot run, called the same way:
+#   crawl   Website_crawl_scrape.crawl() of the synthetic site (synthetic_site.py)
+#   clean   Clean_raw_text.clean_pages() and drop_duplicates()
+#   chunk   Chunk_cleaned_text.chunk_page() of every page, collecting contact facts like run_pipeline.py
+#   import  import_knowledge_chunks_data.import_chunks() through the weaviate client into the stub Weaviate, which
+#           embeds every object through the stub Ollama (or --client-embed, embedded here with the vector cache)
+#   query   multi_turn_RAG_conversation.chat() of --questions questions, answer cache off
+# Each stage runs on its own, on the whole output of the one before, and reports its throughput, the p50/p95 latency
+# of one item (a page fetched and extracted, a page cleaned, a page chunked, a batch imported, a question answered)
+# and its peak memory: the most Python memory (tracemalloc) it had allocated on top of what was there when it started.
+# Tracing memory slows the CPU heavy stages down, use --no-memory when only the speed matters.
+
+# The site and the stubs are served from a separate process, so they neither share the GIL with the stages nor count
+# towards their memory. Their latencies are set with the --*-latency options, the defaults are small so the run is
+# mostly about this project's own code.
+# Results are written to --output as JSON, with the git commit they were measured on. --compare reads an earlier
+# results file and prints the change of every number; the exit code is 1 if a stage got slower or used more memory
+# by more than --tolerance, so it can run between two commits in CI. Only compare runs with the same settings
+# (--no-memory included, traced runs are slower).
+
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import weaviate
+
+import Website_crawl_scrape as crawler
+import multi_turn_RAG_conversation as conversation
+import ollama_client
+from answer_cache import AnswerCache
+from Chunk_cleaned_text import chunk_page
+from Clean_raw_text import clean_pages, drop_duplicates
+from bulk_import import BulkImporter
+from contact_facts import ContactFacts
+from import_knowledge_chunks_data import import_chunks
+from latency_stats import percentile
+from stub_servers import serve_stub_ollama, serve_stub_weaviate, stub_url
+from synthetic_site import WORDS, build_site, serve_site
+
+QUESTIONS = ["Tell me about {} {}", "What does the {} office do?", "How do I apply for {} {}?",
+             "Explain the {} policy", "Who should I contact about {}?", "Where can I find the {} {}?"]
+STAGES = ["crawl", "clean", "chunk", "import", "query"]
+
+
+def git_commit():
+    """Short hash of the checked out commit, with -dirty if tracked files were changed, None outside git"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        changed = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if changed else "")
+
+
+def serve_stubs(settings, ready):
+    """Runs in the stubs process: serve the synthetic site, the stub Ollama and the stub Weaviate until killed"""
+    site = build_site(settings["pages"], paragraphs=settings["paragraphs"])
+    site_server = serve_site(site, latency=settings["site_latency"])
+    ollama = serve_stub_ollama(latency=settings["ollama_latency"], per_item_latency=settings["embed_latency"],
+                               token_latency=settings["token_latency"], prompt_latency=settings["prompt_latency"])
+    weaviate_server = serve_stub_weaviate(stub_url(ollama), latency=settings["weaviate_latency"],
+                                          per_object_latency=settings["object_latency"])
+    ready.put({
+        "site": stub_url(site_server),
+        "site_bytes": sum(len(html.encode("utf-8")) for html in site.values()),
+        "ollama": stub_url(ollama),
+        "weaviate_port": weaviate_server.server_address[1],
+        "weaviate_grpc_port": weaviate_server.grpc_port,
+    })
+    while True:
+        time.sleep(3600)
+
+
+def timed(items, latencies):
+    """Yield the items, adding the seconds each one took to produce to latencies"""
+    items = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        latencies.append(time.perf_counter() - start)
+        yield item
+
+
+def timed_extractor(latencies):
+    """crawler.extract_page, adding the seconds to fetch and extract each page to latencies"""
+    def extractor(response):
+        start = time.perf_counter()
+        result = crawler.extract_page(response)
+        latencies.append(response.elapsed.total_seconds() + time.perf_counter() - start)
+        return result
+    return extractor
+
+
+def make_questions(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(QUESTIONS).format(*rng.sample(WORDS, 2)) for _ in range(count)]
+
+
+class Stages:
+    """
+    Runs the stages one after the other and keeps their measurements
+
+    Args:
+        trace_memory: Measure the peak memory of every stage with tracemalloc
+        verbose: Show what the stages print, otherwise it is hidden
+    """
+
+    def __init__(self, trace_memory=True, verbose=False):
+        self.trace_memory = trace_memory
+        self.verbose = verbose
+        self.results = {}
+        if trace_memory:
+            tracemalloc.start()
+
+    def run(self, name, unit, latency_of, stage):
+        """
+        Run stage(latencies), a function returning (output, number of items done) that appends the seconds of every
+        item to latencies. Returns the output
+        """
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        latencies = []
+        start = time.perf_counter()
+        with contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO()):
+            output, items = stage(latencies)
+        seconds = time.perf_counter() - start
+        peak = (tracemalloc.get_traced_memory()[1] - before) / 2 ** 20 if self.trace_memory else None
+
+        result = self.results[name] = {
+            "items": items,
+            "unit": unit,
+            "seconds": round(seconds, 3),
+            "per_sec": round(items / seconds, 2) if seconds else 0.0,
+            "latency_of": latency_of,
+            "p50_ms": round(1000 * percentile(latencies, 50), 2),
+            "p95_ms": round(1000 * percentile(latencies, 95), 2),
+            "peak_mb": round(peak, 2) if peak is not None else None,
+        }
+        memory = f" | peak {result['peak_mb']:.1f} MB" if peak is not None else ""
+        print(f"{name:>7}: {items} {unit} in {seconds:.2f}s = {result['per_sec']:.1f} {unit}/sec | "
+              f"{latency_of} p50 {result['p50_ms']:.1f} ms p95 {result['p95_ms']:.1f} ms{memory}")
+        return output
+
+
+def compare(previous, current, tolerance):
+    """Print the change of every stage's numbers since previous, returns the names of the stages that got worse"""
+    if previous.get("settings") != current["settings"]:
+        print("⚠️ The two runs used different settings, the numbers are not comparable")
+    print(f"Compared with {previous.get('commit') or 'unknown commit'} ({previous.get('created', '?')}):")
+    regressions = []
+    for name in STAGES:
+        old, new = previous["stages"].get(name), current["stages"].get(name)
+        if not old or not new:
+            continue
+        changes = []
+        worse = False
+        # (key, True if higher is better)
+        for key, higher_is_better in (("per_sec", True), ("p95_ms", False), ("peak_mb", False)):
+            if old.get(key) is None or new.get(key) is None:
+                continue
+            change = (new[key] - old[key]) / old[key] if old[key] else 0.0
+            changes.append(f"{key} {old[key]:g} -> {new[key]:g} ({change:+.0%})")
+            if (-change if higher_is_better else change) > tolerance:
+                worse = True
+        print(f"  {'❌' if worse else '  '} {name:>7}: " + ", ".join(changes))
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200, help="pages of the synthetic site")
+    parser.add_argument("--paragraphs", type=int, default=4, help="paragraphs per page")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--site-latency", type=float, default=0.005, help="seconds the website takes per page")
+    parser.add_argument("--ollama-latency", type=float, default=0.005, help="stub Ollama seconds per request")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="stub Ollama seconds per text embedded")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="stub Ollama seconds per generated word")
+    parser.add_argument("--prompt-latency", type=float, default=0.0, help="stub Ollama seconds per prompt word")
+    parser.add_argument("--weaviate-latency", type=float, default=0.002, help="stub Weaviate seconds per request")
+    parser.add_argument("--object-latency", type=float, default=0.0, help="stub Weaviate seconds per object inserted")
+    parser.add_argument("--workers", type=int, default=crawler.MAX_WORKERS, help="crawler threads")
+    parser.add_argument("--client-embed", action="store_true", help="embed chunks here instead of in Weaviate")
+    parser.add_argument("--no-memory", action="store_true", help="don't trace memory, it slows the stages down")
+    parser.add_argument("--verbose", action="store_true", help="show what the stages print")
+    parser.add_argument("--output", default="benchmark_pipeline.json", help="JSON file the results are written to")
+    parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="share (0-1) a number may get worse by before --compare calls it a regression")
+    args = parser.parse_args()
+
+    settings = {key: value for key, value in vars(args).items()
+                if key not in ("verbose", "output", "compare", "tolerance")}
+    results = {
+        "commit": git_commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "settings": settings,
+    }
+    output_path = os.path.abspath(args.output)
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    ready = multiprocessing.Queue()
+    stubs = multiprocessing.Process(target=serve_stubs, args=(settings, ready), daemon=True)
+    stubs.start()
+    endpoints = ready.get(timeout=60)
+    host_port = endpoints["site"][len("http://"):]
+    crawler.DOMAIN = host_port
+    ollama_client.OLLAMA_URL = endpoints["ollama"]
+    conversation.ANSWER_CACHE = AnswerCache(0)   # Every question is answered, like the first time it is asked
+    print(f"Synthetic site: {args.pages} pages, {endpoints['site_bytes'] / 2 ** 20:.1f} MB of HTML")
+
+    # Files the stages write (knowledge_version.json, the vector cache...) go to a scratch directory
+    workdir = tempfile.mkdtemp(prefix="benchmark_pipeline_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    client = None
+    try:
+        stages = Stages(trace_memory=not args.no_memory, verbose=args.verbose)
+
+        def crawl(latencies):
+            pages = list(crawler.crawl(f"{endpoints['site']}/", max_workers=args.workers,
+                                       extractor=timed_extractor(latencies)))
+            return pages, len(pages)
+        pages = stages.run("crawl", "pages", "page", crawl)
+
+        def clean(latencies):
+            cleaned = list(drop_duplicates(timed(clean_pages(pages), latencies)))
+            return cleaned, len(latencies)
+        pages = stages.run("clean", "pages", "page", clean)
+
+        facts = ContactFacts()
+        def chunk(latencies):
+            chunks = []
+            for page_chunks in timed((chunk_page(page) for page in pages), latencies):
+                chunks.extend(facts.collect(page_chunks))
+            return chunks, len(chunks)
+        chunks = stages.run("chunk", "chunks", "page", chunk)
+        conversation.CONTACT_FACTS = facts
+        results["corpus"] = {"pages": len(pages), "chunks": len(chunks),
+                             "text_mb": round(sum(len(c["text"]) for c in chunks) / 2 ** 20, 2)}
+        del pages
+
+        client = weaviate.connect_to_local(port=endpoints["weaviate_port"], grpc_port=endpoints["weaviate_grpc_port"],
+                                           skip_init_checks=True)
+        knowledge = client.collections.use(conversation.COLLECTION)
+
+        def import_stage(latencies):
+            embedder = None
+            if args.client_embed:
+                from vector_cache import CachedEmbedder, VectorCache
+                embedder = CachedEmbedder(VectorCache(os.path.join(workdir, "vector_cache")))
+            importer = BulkImporter(knowledge, dead_letter_path=os.path.join(workdir, "dead_letter.jsonl"))
+            count = import_chunks(knowledge, chunks, embedder, importer)
+            latencies.extend(importer.stats["latencies"])
+            return count, count
+        stages.run("import", "chunks", "batch", import_stage)
+
+        def query(latencies):
+            for question in make_questions(args.questions):
+                start = time.perf_counter()
+                conversation.chat(question, [], knowledge)
+                latencies.append(time.perf_counter() - start)
+            return None, len(latencies)
+        stages.run("query", "questions", "question", query)
+
+        results["stages"] = stages.results
+    finally:
+        if client is not None:
+            client.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        stubs.kill()
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output_path}")
+
+    if previous is not None:
+        regressions = compare(previous, results, args.tolerance)
+        if regressions:
+            print(f"❌ Slower or bigger by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Compares the old query rewriting (substring pronoun check, always llama3.2) with resolve_query() against a stub
+# Ollama and StubKnowledge
+#   python benchmark_rewriting.py --latency 0.5 --search-latency 0.2
+
+# The stub LLM "rewrites" a question by returning it unchanged, so when llama3.2 is still needed the search that
+# started with the original question can always be reused - the best case for speculation.
+# For every setup it prints how many turns were rewritten, how (locally or by the LLM), how often the speculative
+# search was used, and the latency of the follow-up turns.
+
+import argparse
+import random
+import time
+
+import multi_turn_RAG_conversation as conversation
+import ollama_client
+from answer_cache import AnswerCache
+from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+
+CONVERSATIONS = [
+    ["What is the phone number for the billing office?", "What are their opening hours?", "What about admissions?"],
+    ["How do I apply for financial aid?", "Is there a deadline for it?", "Who should I contact with questions?"],
+    ["Tell me about the library", "Does it have study rooms?", "Can I book them online too?"],
+    ["Who should I talk to about housing?", "What is their email address?", "Is this office open on weekends?"],
+    ["What programs does the college offer?", "Which of them are online?", "What is the address of the main campus?"],
+    ["Hello there", "What do they charge for parking and can I pay for it with their app?"],
+]
+
+
+def legacy_needs_rewriting(query):
+    """needs_rewriting() as it was: pronouns matched anywhere, so "the" counts as "he" and "with" as "it\""""
+    query_lower = query.lower()
+    return any(word in query_lower for word in ["their", "his", "her", "its", "them", "they", "he", "she", "it",
+                                                "also", "too", "as well", "what about"])
+
+
+def run(knowledge, setup):
+    needs_rewriting, resolve_locally, reuse_similarity = (conversation.needs_rewriting, conversation.resolve_locally,
+                                                          conversation.REUSE_SIMILARITY)
+    if setup == "old":
+        conversation.needs_rewriting = legacy_needs_rewriting
+        conversation.resolve_locally = lambda query, history: None
+        conversation.REUSE_SIMILARITY = 2.0   # Never reuse
+    counts = {}
+    follow_ups = []
+    try:
+        for turns in CONVERSATIONS:
+            history = []
+            for i, question in enumerate(turns):
+                metrics = {}
+                start = time.perf_counter()
+                conversation.chat(question, history, knowledge, metrics)
+                if i:
+                    follow_ups.append(time.perf_counter() - start)
+                key = metrics["rewrite"]
+                if setup == "new" and "speculation" in metrics:
+                    key += f" ({metrics['speculation']} speculation)"
+                counts[key] = counts.get(key, 0) + 1
+    finally:
+        conversation.needs_rewriting, conversation.resolve_locally, conversation.REUSE_SIMILARITY = (
+            needs_rewriting, resolve_locally, reuse_similarity)
+    return counts, follow_ups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=500, help="chunks in the stub collection")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub seconds per LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="stub seconds per search")
+    args = parser.parse_args()
+
+    server = serve_stub_ollama(latency=args.latency)
+    ollama_client.OLLAMA_URL = stub_url(server)
+    rng = random.Random(0)
+    chunks = [{"url": f"https://example.com/page-{i}", "chunk_id": f"https://example.com/page-{i}#0",
+               "text": make_paragraph(rng)} for i in range(args.chunks)]
+    knowledge = StubKnowledge(chunks, stub_url(server), latency=args.search_latency)
+    conversation.CONTACT_FACTS = conversation.ContactFacts()   # Every extract question goes to the LLM
+    conversation.ANSWER_CACHE = AnswerCache(0)   # Both setups ask the same questions
+
+    results = {}
+    try:
+        for setup in ("old", "new"):
+            results[setup] = run(knowledge, setup)
+    finally:
+        server.shutdown()
+
+    turns = sum(len(turns) for turns in CONVERSATIONS)
+    for setup, (counts, follow_ups) in results.items():
+        print(f"{setup:>4}: {turns} turns, " + ", ".join(f"{count} {key}" for key, count in sorted(counts.items())))
+        print(f"      follow-up turns take {sum(follow_ups) / len(follow_ups):.2f}s on average, "
+              f"{sum(follow_ups):.2f}s in total")
+
+
+if __name__ == "__main__":
+    main()
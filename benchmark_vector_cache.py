@@ -0,0 +1,56 @@
+
+# Measures the client-side embedding path of import_knowledge_chunks_data.py --client-embed against a stub Ollama
+#   python benchmark_vector_cache.py --chunks 5000 --latency 0.02 --per-item-latency 0.002
+
+# Embeds the same generated chunks twice with a fresh cache directory: the first run has to call the stub,
+# the second must make zero embedding calls. Also shows what one request per object (Weaviate's module) would cost.
+
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import ollama_client
+from stub_servers import serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+from vector_cache import CachedEmbedder, VectorCache
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub seconds per request")
+    parser.add_argument("--per-item-latency", type=float, default=0.002, help="stub seconds per text embedded")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    server = serve_stub_ollama(latency=args.latency, per_item_latency=args.per_item_latency)
+    ollama_client.OLLAMA_URL = stub_url(server)
+    rng = random.Random(0)
+    texts = [make_paragraph(rng) for _ in range(args.chunks)]
+    cache_dir = tempfile.mkdtemp()
+
+    try:
+        for run in ("cold cache", "warm cache"):
+            embedder = CachedEmbedder(VectorCache(cache_dir), batch_size=args.batch_size)
+            start = time.perf_counter()
+            for i in range(0, len(texts), 100):
+                embedder(texts[i:i + 100])
+            seconds = time.perf_counter() - start
+            print(f"{run}: {seconds:6.2f}s, {embedder.calls} embed calls, {embedder.embedded} texts embedded, "
+                  f"{embedder.hits} from the cache")
+        if embedder.calls:
+            print("❌ the warm run should not have called the embedding model")
+            sys.exit(1)
+    finally:
+        shutil.rmtree(cache_dir)
+        server.shutdown()
+
+    one_by_one = args.chunks * (args.latency + args.per_item_latency)
+    print(f"one request per object (no batching, no cache) would take about {one_by_one:.2f}s on every import")
+
+
+if __name__ == "__main__":
+    main()
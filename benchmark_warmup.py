@@ -0,0 +1,93 @@
+# Time to the first words with and without model_warmup.ModelWarmer, against a stub Ollama that takes
+# --load-latency seconds to load a model and unloads it --keep-alive seconds after its last request
+#   python benchmark_warmup.py --load-latency 3 --keep-alive 4 --idle 6
+
+# Each setup starts with nothing loaded, asks a few questions one after another, waits --idle seconds (longer than
+# the keep-alive, so Ollama unloads the model) and asks again. Without the warmer the first question and the one
+# after the pause wait for llama3.2 to load; with it the models are loaded at startup and re-loaded before they
+# expire. For every question it prints the time to the first words and whether a model had to be loaded, then
+# cold and warm averages and how many times the stub loaded a model.
+
+import argparse
+import random
+import statistics
+import time
+
+import multi_turn_RAG_conversation as conversation
+import ollama_client
+from answer_cache import AnswerCache
+from model_warmup import ModelWarmer
+from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+
+QUESTIONS = ["Tell me about the library", "What services does the company offer?", "How do I apply for the program?"]
+
+
+def ask(knowledge, question):
+    metrics = {}
+    for piece in conversation.chat_stream(question, [], knowledge, metrics):
+        pass
+    return metrics
+
+
+def run(args, warm):
+    server = serve_stub_ollama(latency=args.latency, token_latency=args.token_latency, load_latency=args.load_latency,
+                               default_keep_alive=args.keep_alive)
+    ollama_client.OLLAMA_URL = stub_url(server)
+    rng = random.Random(0)
+    chunks = [{"url": f"https://example.com/page-{i}", "chunk_id": f"https://example.com/page-{i}#0",
+               "text": make_paragraph(rng)} for i in range(200)]
+    knowledge = StubKnowledge(chunks, stub_url(server))
+    warmer = None
+    if warm:
+        # Checks often enough to catch the short stub keep-alive
+        ollama_client.KEEP_ALIVE = f"{args.keep_alive}s"
+        warmer = ModelWarmer(keep_alive=f"{args.keep_alive}s", check_interval=args.keep_alive / 4,
+                             margin=args.keep_alive / 2)
+        start = time.perf_counter()
+        warmer.start()
+        print(f"   models loaded at startup in {time.perf_counter() - start:.2f}s")
+    turns = []
+    try:
+        for when in ("start", "idle"):
+            if when == "idle":
+                print(f"   ... idle for {args.idle:.0f}s")
+                time.sleep(args.idle)
+            for question in QUESTIONS:
+                metrics = ask(knowledge, question)
+                turns.append(metrics)
+                print(f"   {metrics['first_token_seconds']:6.2f}s to the first words"
+                      f"{'  (cold: a model was loaded)' if metrics.get('cold_start') else ''}  {question}")
+    finally:
+        if warmer is not None:
+            warmer.stop()
+        ollama_client.KEEP_ALIVE = None
+        server.shutdown()
+    return turns, server.calls.get("loads", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load-latency", type=float, default=3.0, help="stub seconds to load a model")
+    parser.add_argument("--keep-alive", type=float, default=4.0, help="stub seconds a model stays loaded")
+    parser.add_argument("--idle", type=float, default=6.0, help="seconds without questions in the middle")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub Ollama seconds per request")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="stub Ollama seconds per generated word")
+    args = parser.parse_args()
+    conversation.ANSWER_CACHE = AnswerCache(0)   # Every question is generated
+
+    results = {}
+    for name, warm in (("cold", False), ("warmup", True)):
+        print(f"{name}:")
+        results[name] = run(args, warm)
+
+    for name, (turns, loads) in results.items():
+        cold = [t["first_token_seconds"] for t in turns if t.get("cold_start")]
+        warm = [t["first_token_seconds"] for t in turns if not t.get("cold_start")]
+        print(f"{name:>7}: {len(cold)} cold turns" + (f" (first words after {statistics.mean(cold):.2f}s)" if cold else "")
+              + f", {len(warm)} warm" + (f" ({statistics.mean(warm):.2f}s)" if warm else "")
+              + f" | {loads} model loads")
+
+
+if __name__ == "__main__":
+    main()
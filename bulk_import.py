@@ -0,0 +1,168 @@
+
+# Import engine used by import_knowledge_chunks_data.py
+
+# Objects are sent with collection.data.insert_many in batches, several batches at a time (MAX_IN_FLIGHT).
+# The batch size adapts to how long Weaviate takes: it grows while batches come back faster than TARGET_SECONDS
+# and halves when they are slower (embedding inside Weaviate makes big batches slow).
+# Objects that fail are retried with exponential backoff. Objects still failing after MAX_RETRIES attempts are
+# written to dead_letter.jsonl instead of stopping the import. Retry them later with
+#   python import_knowledge_chunks_data.py --retry-dead-letter
+# Every few seconds the import prints objects per second and batch latency (p50/p95).
+# With a progress function it also reports how many input records are done, which is what --resume uses.
+
+import heapq
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from weaviate.classes.data import DataObject
+
+from latency_stats import percentile
+
+BATCH_SIZE = 100         # Starting batch size
+MIN_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 1000
+TARGET_SECONDS = 2.0     # Batches faster than half of this grow, slower ones shrink
+MAX_IN_FLIGHT = 4        # Batches sent at the same time
+MAX_RETRIES = 4          # Attempts after the first one before an object goes to the dead letter file
+BACKOFF_SECONDS = 1.0    # Wait before the first retry, doubled for every further attempt
+REPORT_SECONDS = 5
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+
+
+class BulkImporter:
+    """
+    Args:
+        collection: Weaviate collection to insert into
+        dead_letter_path: JSONL file that objects failing every retry are appended to
+        progress: Optional function called with the number of input objects that are done - every object before
+                  that point was inserted or dead-lettered, so an import can be resumed from there
+    """
+
+    def __init__(self, collection, batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES,
+                 dead_letter_path=DEAD_LETTER_FILE, progress=None):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self.progress = progress
+        self.stats = {"sent": 0, "inserted": 0, "retried": 0, "dead_letter": 0, "batches": 0, "latencies": []}
+        self.failed = set()   # UUIDs (str) of the objects written to the dead letter file
+
+    def insert(self, batch):
+        """Runs in a worker thread, returns (seconds, {position in batch: error message})"""
+        start = time.perf_counter()
+        try:
+            result = self.collection.data.insert_many([item["object"] for item in batch])
+            errors = {i: error.message for i, error in result.errors.items()}
+        except Exception as e:
+            # Timeouts, connection errors... the whole batch is retried
+            errors = {i: str(e) for i in range(len(batch))}
+        return time.perf_counter() - start, errors
+
+    def resize(self, seconds):
+        if seconds < TARGET_SECONDS / 2:
+            self.batch_size = min(MAX_BATCH_SIZE, int(self.batch_size * 1.5) + 1)
+        elif seconds > TARGET_SECONDS:
+            self.batch_size = max(MIN_BATCH_SIZE, self.batch_size // 2)
+
+    def dead_letter(self, item, message):
+        obj = item["object"]
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "uuid": str(obj.uuid),
+                "properties": obj.properties,
+                "vector": obj.vector,
+                "error": message,
+            }, ensure_ascii=False) + "\n")
+        self.stats["dead_letter"] += 1
+        self.failed.add(str(obj.uuid))
+
+    def run(self, objects):
+        """
+        Insert the objects, an iterable of (uuid, properties, vector or None) read lazily
+
+        Returns:
+            the stats dict: sent, inserted, retried, dead_letter, batches, latencies, objects_per_sec
+        """
+        source = iter(objects)
+        exhausted = False
+        retries = []           # Heap of (not_before, position, item)
+        running = {}
+        unfinished = set()     # Positions of input objects not yet inserted or dead-lettered
+        next_position = 0
+        reported_done = 0
+        start = last_report = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            while True:
+                # Fill the free slots, retries that are due first
+                while len(running) < self.max_in_flight:
+                    batch = []
+                    now = time.perf_counter()
+                    while retries and retries[0][0] <= now and len(batch) < self.batch_size:
+                        batch.append(heapq.heappop(retries)[2])
+                    while not exhausted and len(batch) < self.batch_size:
+                        try:
+                            uuid, properties, vector = next(source)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        batch.append({
+                            "position": next_position,
+                            "attempt": 0,
+                            "object": DataObject(properties=properties, uuid=uuid, vector=vector),
+                        })
+                        unfinished.add(next_position)
+                        next_position += 1
+                    if not batch:
+                        break
+                    self.stats["sent"] += len(batch)
+                    running[pool.submit(self.insert, batch)] = batch
+
+                if not running:
+                    if exhausted and not retries:
+                        break
+                    time.sleep(max(0.0, retries[0][0] - time.perf_counter()))  # Only retries left, wait for them
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = running.pop(future)
+                    seconds, errors = future.result()
+                    self.stats["batches"] += 1
+                    self.stats["latencies"].append(seconds)
+                    self.resize(seconds)
+                    for i, item in enumerate(batch):
+                        if i not in errors:
+                            self.stats["inserted"] += 1
+                            unfinished.discard(item["position"])
+                        elif item["attempt"] < self.max_retries:
+                            item["attempt"] += 1
+                            self.stats["retried"] += 1
+                            backoff = BACKOFF_SECONDS * 2 ** (item["attempt"] - 1)
+                            heapq.heappush(retries, (time.perf_counter() + backoff, item["position"], item))
+                        else:
+                            self.dead_letter(item, errors[i])
+                            unfinished.discard(item["position"])
+
+                done_upto = min(unfinished) if unfinished else next_position
+                if self.progress and done_upto != reported_done:
+                    reported_done = done_upto
+                    self.progress(done_upto)
+
+                now = time.perf_counter()
+                if now - last_report >= REPORT_SECONDS:
+                    last_report = now
+                    self.print_stats(now - start, len(retries))
+
+        self.stats["seconds"] = time.perf_counter() - start
+        self.stats["objects_per_sec"] = self.stats["inserted"] / self.stats["seconds"] if self.stats["seconds"] else 0.0
+        return self.stats
+
+    def print_stats(self, seconds, waiting_retries=0):
+        latencies = self.stats["latencies"][-200:]
+        print(f"📦 {self.stats['inserted']} inserted, {self.stats['inserted'] / seconds:.0f} objects/sec | "
+              f"batch {self.batch_size}, latency p50 {percentile(latencies, 50):.2f}s p95 {percentile(latencies, 95):.2f}s | "
+              f"{waiting_retries} waiting to retry, {self.stats['dead_letter']} dead-lettered")
@@ -0,0 +1,341 @@
+
+# HTTP chat service: the chatbot from multi_turn_RAG_conversation.py for many users at once
+# Every session has its own conversation history. All sessions share one Weaviate client (with a pool of
+# connections) and the pooled Ollama session in ollama_client.py. The collection config is read once at startup.
+
+#   python chat_service.py --port 8000
+#   curl -X POST localhost:8000/chat -d '{"message": "What is the phone number of the office?"}'
+# The reply holds a session_id, send it with the next message to continue the same conversation.
+
+#   POST   /chat                  {"message": ..., "session_id": optional} -> {"session_id", "answer", "seconds", "metrics"}
+#   POST   /chat/stream           same request, the answer comes back as newline separated JSON while it is generated:
+#                                 {"response": "next words"} ... then {"done": true, "session_id", "metrics"}
+#                                 metrics has first_token_seconds (time to first token), see chat_stream()
+#   GET    /sessions/{session_id} the session's conversation memory: history (the recent turns), summaries of the
+#                                 older ones, entities and count (turns so far)
+#   DELETE /sessions/{session_id} forget a session
+#   GET    /health                number of sessions and turns being answered, answer cache hits and misses, turns
+#                                 that had to wait for a model to load (cold_starts) and the model warm-ups
+#   GET    /metrics               histograms of the seconds spent in every step of a turn, prompt tokens and tokens
+#                                 per second, in the Prometheus text format (with --metrics or --trace, see tracing.py)
+
+# chat() is blocking, so turns run in a pool of MAX_CONCURRENT_TURNS threads. Turns of one session run one after
+# another, turns of different sessions at the same time. Sessions unused for SESSION_TTL seconds are dropped.
+# Every session's history is a ConversationMemory (conversation_memory.py) kept within --memory-tokens. With
+# --sessions-db sessions.db it is also saved after every turn, so a session dropped from memory or lost in a restart
+# is loaded again when its session_id comes back.
+# load_test_chat.py runs many conversations against it using stub backends.
+# --backend local searches the in-process index of local_index.py instead of Weaviate.
+# llama3.2 and nomic-embed-text are loaded at startup and kept loaded (model_warmup.py, --keep-alive, --no-warmup).
+# --trace traces.jsonl writes every step of every turn to that file, the metrics of a reply then include its trace_id.
+
+# Install these packages: pip install aiohttp
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import multi_turn_RAG_conversation
+import ollama_client
+from answer_cache import ANSWER_CACHE_SIZE, AnswerCache
+from conversation_memory import MEMORY_TOKENS, ConversationMemory, SessionDB
+from extract_engine import STRATEGIES, ExtractEngine
+from local_index import INDEX_DIR, LocalKnowledge
+from model_warmup import KEEP_ALIVE, ModelWarmer
+from multi_turn_RAG_conversation import COLLECTION, chat, chat_stream, connect
+from tracing import Tracer
+
+MAX_CONCURRENT_TURNS = 16
+SESSION_TTL = 30 * 60   # Seconds
+MAX_SESSIONS = 10000
+
+KNOWLEDGE = web.AppKey("knowledge", object)
+SESSIONS = web.AppKey("sessions", object)
+EXECUTOR = web.AppKey("executor", ThreadPoolExecutor)
+STATS = web.AppKey("stats", dict)
+WARMER = web.AppKey("warmer", object)
+
+
+class Session:
+    def __init__(self, history=None, memory_tokens=None):
+        self.history = history if history is not None else ConversationMemory(budget=memory_tokens)
+        self.lock = asyncio.Lock()   # One turn at a time per conversation
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """
+    Sessions by id, least recently used first, so expired ones are found at the front
+
+    Args:
+        db: Optional conversation_memory.SessionDB the histories are saved to and loaded from
+        memory_tokens: Token budget of new histories
+        executor: Where the (blocking) db calls run, off the event loop - the default executor if None
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, db=None, memory_tokens=None, executor=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.db = db
+        self.memory_tokens = memory_tokens
+        self.executor = executor
+        self.sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    async def get(self, session_id, create=False):
+        self.expire()
+        session = self.sessions.get(session_id)
+        if session is None:
+            history = None
+            if self.db:
+                history = await asyncio.get_running_loop().run_in_executor(self.executor, self.db.load, session_id)
+            # Another request for the session may have created it while the db was read
+            session = self.sessions.get(session_id)
+            if session is None:
+                if history is None and not create:
+                    return None
+                session = self.sessions[session_id] = Session(history, self.memory_tokens)
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+        self.sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def save(self, session_id, session):
+        """Write the session's history to the db, if there is one (blocking, call it from the executor)"""
+        if self.db:
+            self.db.save(session_id, session.history)
+
+    async def delete(self, session_id):
+        deleted = self.sessions.pop(session_id, None) is not None
+        if self.db:
+            deleted = await asyncio.get_running_loop().run_in_executor(self.executor, self.db.delete,
+                                                                       session_id) or deleted
+        return deleted
+
+    def expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_used >= cutoff or session.lock.locked():
+                break
+            del self.sessions[session_id]
+
+
+async def read_message(request):
+    """(message, session_id) from the request body, a new session_id if it has none"""
+    try:
+        body = await request.json()
+        message = body["message"].strip()
+    except (ValueError, KeyError, AttributeError):
+        raise web.HTTPBadRequest(text='expected JSON like {"message": "...", "session_id": "..."}')
+    if not message:
+        raise web.HTTPBadRequest(text="empty message")
+    return message, body.get("session_id") or uuid.uuid4().hex
+
+
+async def handle_chat(request):
+    message, session_id = await read_message(request)
+    app = request.app
+    session = await app[SESSIONS].get(session_id, create=True)
+    metrics = {}
+
+    def turn():
+        answer = chat(message, session.history, app[KNOWLEDGE], metrics)
+        app[SESSIONS].save(session_id, session)
+        return answer
+
+    async with session.lock:
+        start = time.perf_counter()
+        app[STATS]["active_turns"] += 1
+        try:
+            answer = await asyncio.get_running_loop().run_in_executor(app[EXECUTOR], turn)
+        finally:
+            app[STATS]["active_turns"] -= 1
+    app[STATS]["cold_starts"] += bool(metrics.get("cold_start"))
+    return web.json_response({"session_id": session_id, "answer": answer, "seconds": time.perf_counter() - start,
+                              "metrics": metrics})
+
+
+async def handle_chat_stream(request):
+    message, session_id = await read_message(request)
+    app = request.app
+    session = await app[SESSIONS].get(session_id, create=True)
+    loop = asyncio.get_running_loop()
+    pieces = asyncio.Queue()
+    cancelled = threading.Event()
+    metrics = {}
+
+    def generate():
+        # Runs in the executor, hands every piece of the answer over to the event loop
+        try:
+            stream = chat_stream(message, session.history, app[KNOWLEDGE], metrics)
+            for piece in stream:
+                if cancelled.is_set():
+                    stream.close()   # Stops the generation in Ollama, the turn is not remembered
+                    return
+                loop.call_soon_threadsafe(pieces.put_nowait, piece)
+            app[SESSIONS].save(session_id, session)
+        finally:
+            loop.call_soon_threadsafe(pieces.put_nowait, None)
+
+    # Prepared when the first piece is ready, so a turn that fails before answering gets an error status
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    async with session.lock:
+        app[STATS]["active_turns"] += 1
+        done = loop.run_in_executor(app[EXECUTOR], generate)
+        try:
+            while (piece := await pieces.get()) is not None:
+                if not response.prepared:
+                    await response.prepare(request)
+                await response.write(json.dumps({"response": piece}).encode("utf-8") + b"\n")
+            await done   # Raises what chat_stream raised
+        finally:
+            app[STATS]["active_turns"] -= 1
+            if not done.done():
+                # The client went away (write failed or the handler was cancelled): stop the turn, and wait for it
+                # so the next turn of the session doesn't start while this one still writes to the history
+                cancelled.set()
+                try:
+                    await done
+                except Exception as e:
+                    print(f"Stream for session {session_id} ended after the client left: {e}")
+    app[STATS]["cold_starts"] += bool(metrics.get("cold_start"))
+    if not response.prepared:
+        await response.prepare(request)
+    await response.write(json.dumps({"done": True, "session_id": session_id, "metrics": metrics}).encode("utf-8") + b"\n")
+    await response.write_eof()
+    return response
+
+
+async def handle_get_session(request):
+    session = await request.app[SESSIONS].get(request.match_info["session_id"])
+    if session is None:
+        raise web.HTTPNotFound(text="unknown session")
+    history = session.history
+    return web.json_response({"session_id": request.match_info["session_id"], "history": list(history),
+                              "summaries": history.summaries, "entities": history.entities, "count": history.count})
+
+
+async def handle_delete_session(request):
+    if not await request.app[SESSIONS].delete(request.match_info["session_id"]):
+        raise web.HTTPNotFound(text="unknown session")
+    return web.json_response({"deleted": request.match_info["session_id"]})
+
+
+async def handle_health(request):
+    app = request.app
+    warmer = app[WARMER]
+    return web.json_response({"sessions": len(app[SESSIONS]), "active_turns": app[STATS]["active_turns"],
+                              "answer_cache": multi_turn_RAG_conversation.ANSWER_CACHE.stats(),
+                              "cold_starts": app[STATS]["cold_starts"],
+                              "warmup": warmer.stats() if warmer is not None else None})
+
+
+async def handle_metrics(request):
+    tracer = multi_turn_RAG_conversation.TRACER
+    if not tracer.enabled:
+        raise web.HTTPNotFound(text="tracing is off, start the service with --metrics or --trace")
+    return web.Response(body=tracer.prometheus().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+def make_app(knowledge, max_concurrent_turns=MAX_CONCURRENT_TURNS, session_ttl=SESSION_TTL, sessions_db=None,
+             memory_tokens=MEMORY_TOKENS, warmer=None):
+    """
+    Args:
+        knowledge: The KnowledgeChunk collection (or stub_servers.StubKnowledge) passed to chat()
+        max_concurrent_turns: Turns answered at the same time, the rest wait
+        session_ttl: Seconds a session is kept in memory after its last message
+        sessions_db: SQLite file to save the sessions to, None to keep them in memory only
+        memory_tokens: Token budget of every session's conversation memory
+        warmer: Optional model_warmup.ModelWarmer, started with the app and stopped with it
+    """
+    app = web.Application()
+    app[KNOWLEDGE] = knowledge
+    db = SessionDB(sessions_db, budget=memory_tokens) if sessions_db else None
+    # The db is read in the loop's default executor, app[EXECUTOR] may be busy with turns
+    app[SESSIONS] = SessionStore(ttl=session_ttl, db=db, memory_tokens=memory_tokens)
+    app[EXECUTOR] = ThreadPoolExecutor(max_workers=max_concurrent_turns, thread_name_prefix="chat")
+    app[STATS] = {"active_turns": 0, "cold_starts": 0}
+    app[WARMER] = warmer
+    app.router.add_post("/chat", handle_chat)
+    app.router.add_post("/chat/stream", handle_chat_stream)
+    app.router.add_get("/sessions/{session_id}", handle_get_session)
+    app.router.add_delete("/sessions/{session_id}", handle_delete_session)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+
+    async def shutdown_executor(app):
+        app[EXECUTOR].shutdown(wait=False, cancel_futures=True)
+        if db is not None:
+            db.close()
+    app.on_cleanup.append(shutdown_executor)
+
+    if warmer is not None:
+        async def start_warmer(app):
+            # Loading the models takes seconds, don't hold up the event loop meanwhile
+            await asyncio.get_running_loop().run_in_executor(app[EXECUTOR], warmer.start)
+
+        async def stop_warmer(app):
+            warmer.stop()
+        app.on_startup.append(start_warmer)
+        app.on_cleanup.append(stop_warmer)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT_TURNS,
+                        help="turns answered at the same time")
+    parser.add_argument("--extract-strategy", choices=STRATEGIES, default=multi_turn_RAG_conversation.EXTRACT_ENGINE.strategy,
+                        help="how extract mode runs the generations for the top chunks (see extract_engine.py)")
+    parser.add_argument("--context-tokens", type=int, default=multi_turn_RAG_conversation.CONTEXT_TOKENS,
+                        help="token budget for the chunks in guidance and information prompts (see context_packer.py)")
+    parser.add_argument("--answer-cache-size", type=int, default=ANSWER_CACHE_SIZE,
+                        help="answers kept for repeated questions, 0 for none (see answer_cache.py)")
+    parser.add_argument("--backend", choices=["weaviate", "local"], default="weaviate",
+                        help="search Weaviate, or the in-process index built by local_index.py")
+    parser.add_argument("--local-index", default=INDEX_DIR, help="directory of the local index")
+    parser.add_argument("--trace", help="JSONL file to write the steps of every turn to (see tracing.py)")
+    parser.add_argument("--metrics", action="store_true", help="serve step histograms at GET /metrics")
+    parser.add_argument("--memory-tokens", type=int, default=MEMORY_TOKENS,
+                        help="token budget for a session's history in rewrite prompts (see conversation_memory.py)")
+    parser.add_argument("--sessions-db", help="SQLite file to save sessions to, e.g. sessions.db")
+    parser.add_argument("--keep-alive", default=KEEP_ALIVE,
+                        help="how long Ollama keeps the models loaded after a request, e.g. 30m (see model_warmup.py)")
+    parser.add_argument("--no-warmup", action="store_true", help="don't load the models at startup or keep them loaded")
+    args = parser.parse_args()
+    multi_turn_RAG_conversation.EXTRACT_ENGINE = ExtractEngine(args.extract_strategy)
+    multi_turn_RAG_conversation.CONTEXT_TOKENS = args.context_tokens
+    multi_turn_RAG_conversation.ANSWER_CACHE = AnswerCache(args.answer_cache_size)
+    multi_turn_RAG_conversation.TRACER = Tracer(args.trace, metrics=args.metrics)
+
+    if args.backend == "local":
+        knowledge = LocalKnowledge(args.local_index)
+    else:
+        client = connect(pool_size=args.max_concurrent)
+        knowledge = client.collections.use(COLLECTION)
+    warmer = None
+    if not args.no_warmup:
+        ollama_client.KEEP_ALIVE = args.keep_alive
+        warmer = ModelWarmer(keep_alive=args.keep_alive)
+    app = make_app(knowledge, args.max_concurrent, sessions_db=args.sessions_db, memory_tokens=args.memory_tokens,
+                   warmer=warmer)
+    if args.backend != "local":
+        async def close_client(app):
+            client.close()
+        app.on_cleanup.append(close_client)
+    print(knowledge.config.get())  # Once at startup instead of on every turn
+    web.run_app(app, host=args.host, port=args.port)
@@ -0,0 +1,207 @@
+
+# Index of contact details found in the chunks: email addresses, phone numbers, street addresses and opening hours
+# Built while chunking (Chunk_cleaned_text.py, run_pipeline.py) and saved to contact_facts.json
+
+# Extract mode questions ("what is the phone number for billing?") are answered from it in milliseconds instead of
+# having llama3.2 read the top chunks. Each fact keeps the sentence it is in (and the one before) and the urls it was
+# found on. A question is matched against that text, so "billing" finds the number next to the word billing.
+# If nothing matches, chat() falls back to the LLM.
+
+import json
+import os
+import re
+
+CONTACT_FACTS_FILE = "contact_facts.json"
+CONTEXT_CHARS = 300   # At most this much text before and after a fact is kept to match questions against
+MAX_CONTEXTS = 20     # Contexts kept per fact, a fact on every page (a footer phone number) only needs a few
+
+_DAY = r"(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?"
+_TIME = r"\d{1,2}(?::\d{2})?\s*(?:[ap]\.?\s?m\.?)?|noon|midnight"
+_STREET_TYPES = (r"Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Drive|Dr|Lane|Ln|Way|Court|Ct|Place|Pl|Parkway|Pkwy|"
+                 r"Highway|Hwy|Square|Sq|Terrace|Circle")
+
+PATTERNS = {
+    "email": re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b"),
+    "phone": re.compile(
+        r"(?<![\w.])(?:\+?1[\s.-]?)?(?:\(\d{3}\)\s?|\d{3}[\s.-])\d{3}[\s.-]\d{4}(?:\s*(?:ext\.?|x)\s*\d{1,5})?(?![\d])"
+        r"|(?<![\w.])\+\d{1,3}(?:[\s.-]\d{1,4}){2,5}(?![\d])"
+    ),
+    "address": re.compile(
+        rf"\b\d{{1,6}}\s+(?:[A-Z0-9][\w.'-]*\s+){{0,5}}(?:{_STREET_TYPES})\b\.?"
+        r"(?:,?\s+(?:Suite|Ste|Unit|Room|Rm|Floor)\.?\s*#?\w+)?"
+        r"(?:,\s*[A-Z][\w .'-]*?,?\s+(?:[A-Z]{2}|[A-Z][a-z]+)\s+\d{5}(?:-\d{4})?)?"
+    ),
+    "hours": re.compile(
+        rf"\b{_DAY}(?:\s*(?:-|–|to|through|thru|&|and|,)\s*{_DAY})*[\s,:]*(?:from\s+)?"
+        rf"(?:{_TIME})\s*(?:-|–|to|until)\s*(?:{_TIME})"
+        r"|\bopen 24 hours\b",
+        re.IGNORECASE,
+    ),
+}
+
+# Words in an extract question that say which kinds of fact it wants
+KIND_WORDS = {
+    "email": ["email", "e-mail"],
+    "phone": ["phone", "call", "telephone", "fax"],
+    "address": ["address", "locat", "where"],
+    "hours": ["hours", "open", "close"],
+}
+GENERAL_KINDS = {"contact": ["phone", "email"], "office": ["address", "phone"]}
+# Matched at the start of a word, so "locat" finds location and located but "address" isn't found in "mail"
+_KIND_PATTERNS = {kind: re.compile(r"\b(?:" + "|".join(map(re.escape, keys)) + ")", re.IGNORECASE)
+                  for kind, keys in KIND_WORDS.items()}
+_GENERAL_PATTERNS = {word: re.compile(rf"\b{word}", re.IGNORECASE) for word in GENERAL_KINDS}
+_EMAIL_ADDRESS = re.compile(r"\be-?mail\s+address", re.IGNORECASE)   # Asks for an email, not a street address
+
+STOPWORDS = set("""a an and are at be by can do does for from how i in is it me my of on or our the their there
+to what when where which who with you your number""".split())
+_QUERY_WORDS = {word for words in KIND_WORDS.values() for word in words} | set(GENERAL_KINDS)
+
+
+def words(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower())) - STOPWORDS
+
+
+def fact_key(kind, value):
+    """Same key for the same fact written differently, e.g. (555) 123-4567 and 555.123.4567"""
+    if kind == "phone":
+        return re.sub(r"\D", "", value)
+    return " ".join(value.lower().split())
+
+
+_SENTENCE_END = re.compile(r"[.!?]\s+(?=[A-Z0-9\"'(])|\n")
+
+
+def context(text, start, end):
+    """The sentence holding text[start:end], and the sentence before it"""
+    before = text[max(0, start - CONTEXT_CHARS):start]
+    boundaries = [m.end() for m in _SENTENCE_END.finditer(before)]
+    begin = boundaries[-2] if len(boundaries) >= 2 else 0
+    after = text[end:end + CONTEXT_CHARS]
+    stop = _SENTENCE_END.search(after)
+    return before[begin:] + text[start:end] + (after[:stop.start() + 1] if stop else after)
+
+
+def find_facts(text):
+    """Yield (kind, value, context) for every contact detail in text"""
+    for kind, pattern in PATTERNS.items():
+        for match in pattern.finditer(text):
+            value = " ".join(match.group().split())
+            if value.endswith(".") and not value.lower().endswith(("a.m.", "p.m.")):
+                value = value[:-1]   # Full stop of the sentence
+            yield kind, value, context(text, match.start(), match.end()).strip()
+
+
+def wanted_kinds(q):
+    """The kinds of fact q asks for, e.g. only email for 'what is the email address of the registrar?'"""
+    q = _EMAIL_ADDRESS.sub("email", q)
+    kinds = [kind for kind, pattern in _KIND_PATTERNS.items() if pattern.search(q)]
+    if not kinds:
+        for word, general in GENERAL_KINDS.items():
+            if _GENERAL_PATTERNS[word].search(q):
+                kinds.extend(kind for kind in general if kind not in kinds)
+    return kinds
+
+
+class ContactFacts:
+    """
+    Contact facts by (kind, key)
+
+    Each fact is {"kind", "value", "urls": pages it appears on, "contexts": [{"url", "text"}, ...]} - the same
+    opening hours can be on several pages, each with its own sentence saying what they are for
+    """
+
+    def __init__(self, facts=None):
+        self.facts = {}
+        for fact in facts or []:
+            self.facts[(fact["kind"], fact_key(fact["kind"], fact["value"]))] = fact
+        self._words = {}
+
+    def __len__(self):
+        return len(self.facts)
+
+    @classmethod
+    def load(cls, path=CONTACT_FACTS_FILE):
+        """The saved index, or an empty one if there is none"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["facts"])
+
+    def save(self, path=CONTACT_FACTS_FILE):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"facts": list(self.facts.values())}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def add(self, url, text):
+        for kind, value, around in find_facts(text):
+            fact = self.facts.setdefault((kind, fact_key(kind, value)),
+                                         {"kind": kind, "value": value, "urls": [], "contexts": []})
+            if url not in fact["urls"]:
+                fact["urls"].append(url)
+            if len(fact["contexts"]) < MAX_CONTEXTS and not any(c["text"] == around for c in fact["contexts"]):
+                fact["contexts"].append({"url": url, "text": around})
+        self._words.clear()
+
+    def forget_urls(self, urls):
+        """Drop what was found on these pages, before adding them again or when they were removed"""
+        urls = set(urls)
+        for key, fact in list(self.facts.items()):
+            fact["urls"] = [url for url in fact["urls"] if url not in urls]
+            fact["contexts"] = [c for c in fact["contexts"] if c["url"] not in urls]
+            if not fact["urls"]:
+                del self.facts[key]
+        self._words.clear()
+
+    def collect(self, chunks):
+        """Add the facts of every chunk passing through, yielding the chunks unchanged"""
+        seen = set()
+        for chunk in chunks:
+            if chunk["url"] not in seen:
+                seen.add(chunk["url"])
+                self.forget_urls([chunk["url"]])   # The page changed, its old facts may be gone
+            self.add(chunk["url"], chunk["text"])
+            yield chunk
+
+    def context_words(self, key):
+        """[(words of the context text, words of its url), ...] for each of the fact's contexts"""
+        if key not in self._words:
+            self._words[key] = [(words(c["text"]), words(c["url"])) for c in self.facts[key]["contexts"]]
+        return self._words[key]
+
+    def lookup(self, q):
+        """
+        The best fact of each kind q asks for
+
+        Facts are ranked by how many of the question's topic words are in one of their contexts, then in that
+        context's url, then by the number of pages they appear on. If the question names a topic, at least one of
+        its words must match.
+
+        Returns:
+            [(fact, url of the best matching context), ...]
+        """
+        topic = {word for word in words(q) if not any(word.startswith(key) for key in _QUERY_WORDS)}
+        found = []
+        for kind in wanted_kinds(q):
+            best = None
+            for key, fact in self.facts.items():
+                if key[0] != kind:
+                    continue
+                for context, (text_words, url_words) in zip(fact["contexts"], self.context_words(key)):
+                    score = (len(topic & text_words), len(topic & url_words), len(fact["urls"]))
+                    if topic and not (score[0] or score[1]):
+                        continue
+                    if best is None or score > best[0]:
+                        best = (score, fact, context["url"])
+            if best is not None:
+                found.append(best[1:])
+        return found
+
+    def answer(self, q):
+        """Answer in the extract prompt's format (the fact, then Source: url), or None if nothing was found"""
+        found = self.lookup(q)
+        if not found:
+            return None
+        lines = [fact["value"] for fact, url in found]
+        return "\n".join(lines) + f"\n\nSource: {found[0][1]}"
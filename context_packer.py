@@ -0,0 +1,134 @@
+
+# Context packing for the grouped prompts of multi_turn_RAG_conversation.py (guidance and information modes)
+
+# The top 8 chunks often include neighbours from the same page, and neighbouring chunks share the 150 characters
+# carried over by the chunker (Chunk_cleaned_text.chunk_text). Sent as they are, the prompt repeats that text, and on a
+# CPU-only Ollama reading the prompt is most of the time to the first word. pack() turns the chunks into passages:
+#   - chunks of one page that overlap are merged into one passage, in page order, the overlap kept once
+#   - a passage whose text is already in a better ranked one (the same footer on every page) is dropped
+#   - passages are added best ranked first until the token budget is used, the one that doesn't fit is cut to the
+#     sentences that do, starting from its best ranked chunk
+# Each passage is sent with its url once, so the LLM can still cite it.
+
+from Chunk_cleaned_text import approx_token_count, sentence_split
+
+CONTEXT_TOKENS = 1500   # Budget for the chunks in a grouped prompt, the task and question come on top
+MIN_OVERLAP = 20        # Characters two chunks must share to count as neighbours
+
+
+def passage_text(url, text):
+    """How a passage appears in the prompt"""
+    return f"url: {url}\ntext: {text}"
+
+
+def overlap(a, b):
+    """Length of the longest end of a that b starts with, 0 if it is shorter than MIN_OVERLAP"""
+    head = b[:MIN_OVERLAP]
+    if len(head) < MIN_OVERLAP:
+        return 0
+    start = a.find(head, max(0, len(a) - len(b)))
+    while start != -1:
+        if b.startswith(a[start:]):
+            return len(a) - start
+        start = a.find(head, start + 1)
+    return 0
+
+
+def merge_neighbours(chunks):
+    """
+    Merge overlapping chunks of the same page
+
+    Args:
+        chunks: [(rank, url, text), ...]
+
+    Returns:
+        [{"url", "text", "ranks", "offsets"}, ...] one passage per run of neighbouring chunks, best ranked first.
+        ranks are the ranks of its chunks in page order, offsets where each of them starts in the text
+    """
+    by_url = {}
+    for chunk in chunks:
+        by_url.setdefault(chunk[1], []).append(chunk)
+
+    passages = []
+    for url, page in by_url.items():
+        # Pair each chunk with the one continuing it, largest overlaps first, every chunk in at most one pair each way
+        pairs = sorted(((overlap(a[2], b[2]), a, b) for a in page for b in page if a is not b), key=lambda p: -p[0])
+        following = {}   # rank -> (overlap, chunk that continues it)
+        followed = set()
+        for shared, a, b in pairs:
+            if shared and a[0] not in following and b[0] not in followed:
+                following[a[0]] = (shared, b)
+                followed.add(b[0])
+
+        merged = set()
+        for chunk in page:
+            if chunk[0] in followed:
+                continue
+            ranks, offsets, text = [chunk[0]], [0], chunk[2]
+            while chunk[0] in following:
+                shared, chunk = following[chunk[0]]
+                ranks.append(chunk[0])
+                offsets.append(len(text) - shared)
+                text += chunk[2][shared:]
+            passages.append({"url": url, "text": text, "ranks": ranks, "offsets": offsets})
+            merged.update(ranks)
+        # Whatever is left is a loop of chunks continuing each other (repeated text), keep them as they are
+        passages.extend({"url": url, "text": chunk[2], "ranks": [chunk[0]], "offsets": [0]}
+                        for chunk in page if chunk[0] not in merged)
+    return sorted(passages, key=lambda passage: min(passage["ranks"]))
+
+
+def trim(text, url, tokens, count_tokens):
+    """The first sentences of text that fit in tokens (counted with the url), or None if not even one does"""
+    kept = []
+    for sentence in sentence_split(text):
+        if count_tokens(passage_text(url, " ".join(kept + [sentence]))) > tokens:
+            break
+        kept.append(sentence)
+    return " ".join(kept) if kept else None
+
+
+def pack(objects, budget=CONTEXT_TOKENS, count_tokens=approx_token_count):
+    """
+    Passages for a grouped prompt from the retrieved chunks
+
+    Args:
+        objects: Retrieved objects (with .properties url and text), best match first
+        budget: Tokens the passages may use together, None for no limit
+        count_tokens: Function text -> number of tokens
+
+    Returns:
+        (passages, stats) - passages like merge_neighbours returns them, best ranked first. stats has chunks,
+        passages, merged (chunks merged into a neighbour), duplicates, trimmed, dropped, tokens_before (the chunks as
+        they were), tokens and tokens_saved
+    """
+    chunks = [(rank, obj.properties["url"], obj.properties["text"]) for rank, obj in enumerate(objects)]
+    tokens_before = sum(count_tokens(passage_text(url, text)) for rank, url, text in chunks)
+    merged = merge_neighbours(chunks)
+
+    packed = []
+    stats = {"chunks": len(chunks), "merged": len(chunks) - len(merged), "duplicates": 0, "trimmed": 0, "dropped": 0}
+    used = 0
+    for passage in merged:
+        if any(passage["text"] in kept["text"] for kept in packed):
+            stats["duplicates"] += 1
+            continue
+        tokens = count_tokens(passage_text(passage["url"], passage["text"]))
+        if budget is not None and used + tokens > budget:
+            best = passage["ranks"].index(min(passage["ranks"]))
+            start = passage["offsets"][best]
+            text = trim(passage["text"][start:], passage["url"], budget - used, count_tokens)
+            if text is None:
+                stats["dropped"] += 1
+                continue
+            kept = [(rank, offset - start) for rank, offset in zip(passage["ranks"][best:], passage["offsets"][best:])
+                    if offset - start < len(text)]
+            passage = dict(passage, text=text, ranks=[rank for rank, offset in kept],
+                           offsets=[offset for rank, offset in kept])
+            tokens = count_tokens(passage_text(passage["url"], text))
+            stats["trimmed"] += 1
+        packed.append(passage)
+        used += tokens
+
+    stats.update(passages=len(packed), tokens_before=tokens_before, tokens=used, tokens_saved=tokens_before - used)
+    return packed, stats
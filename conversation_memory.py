@@ -0,0 +1,162 @@
+
+# Conversation memory with a token budget, for multi_turn_RAG_conversation.py and chat_service.py
+
+# The history used to be the last 5 turns as they were, and rewrite_query() pasted the last 3 of them into its prompt
+# with the full answers, so a rewrite took longer the longer the earlier answers were. ConversationMemory keeps:
+#   - the latest RECENT_TURNS turns, their answers cut to ANSWER_TOKENS in the rewrite prompt
+#   - a one line summary of each older turn (the question and the start of its answer), the last MAX_SUMMARIES of them
+#   - the entities the questions were about (query_rewriter.extract_entities), most recent first, so a pronoun can
+#     still be resolved after the turn that named its entity was summarized
+# Older turns are summarized, and the oldest summaries dropped, until prompt_text() fits in the budget (MEMORY_TOKENS).
+# Summaries are made without the LLM, so remembering a turn costs no extra call.
+# ConversationMemory is a list of the recent turns, code written for the plain history list keeps working with it.
+
+# SessionDB saves memories to a SQLite file (sessions.db), one row of JSON per session, so conversations survive a
+# restart of the chatbot or the service. Loading one is a single primary key lookup.
+#   python multi_turn_RAG_conversation.py --session alice
+#   python chat_service.py --sessions-db sessions.db
+
+import json
+import sqlite3
+import threading
+import time
+
+from Chunk_cleaned_text import approx_token_count, sentence_split
+
+MEMORY_TOKENS = 400     # Budget for the conversation in a rewrite prompt: entities, summaries and recent turns
+RECENT_TURNS = 3        # Turns shown as they were (answers cut to ANSWER_TOKENS), older ones are summarized
+ANSWER_TOKENS = 60
+SUMMARY_TOKENS = 30
+MAX_SUMMARIES = 5
+MAX_ENTITIES = 8
+SESSIONS_DB = "sessions.db"
+
+
+def truncate(text, tokens):
+    """text cut after the word that reaches about tokens tokens (approx_token_count), "..." marks the cut"""
+    if approx_token_count(text) <= tokens:
+        return text
+    kept, used = [], 0
+    for word in text.split():
+        used += approx_token_count(word)
+        if used > tokens:
+            break
+        kept.append(word)
+    return " ".join(kept) + " ..."
+
+
+def summarize(turn):
+    """One line for an older turn: its question and the first sentence of its answer"""
+    sentences = sentence_split(turn.get("assistant") or "")
+    return truncate(f"{turn['user']} -> {sentences[0] if sentences else ''}", SUMMARY_TOKENS)
+
+
+def prompt_text(conversation_history):
+    """
+    The conversation as rewrite_query() shows it to the LLM
+
+    Works for a ConversationMemory and for a plain list of turns (which has no entities or summaries)
+    """
+    parts = []
+    entities = getattr(conversation_history, "entities", None)
+    if entities:
+        parts.append(f"Mentioned earlier: {'; '.join(entities)}\n\n")
+    summaries = getattr(conversation_history, "summaries", None)
+    if summaries:
+        parts.append("Earlier turns:\n" + "".join(f"- {summary}\n" for summary in summaries) + "\n")
+    for turn in conversation_history[-RECENT_TURNS:]:
+        parts.append(f"User: {turn['user']}\nAssistant: {truncate(turn.get('assistant') or '', ANSWER_TOKENS)}\n\n")
+    return "".join(parts)
+
+
+class ConversationMemory(list):
+    """
+    The recent turns of a conversation (dicts with user, assistant and entities), within a token budget
+
+    append() adds a turn and compacts the memory to the budget, so it can be passed to chat() as conversation_history.
+
+    Args:
+        turns, summaries, entities: What to start from (see to_dict)
+        budget: Tokens prompt_text() may take, MEMORY_TOKENS by default. The latest turn is always kept.
+        count: Turns remembered so far, including the summarized and dropped ones
+    """
+
+    def __init__(self, turns=(), summaries=(), entities=(), budget=None, count=None):
+        super().__init__(turns)
+        self.summaries = list(summaries)
+        self.entities = list(entities)
+        self.budget = MEMORY_TOKENS if budget is None else budget
+        self.count = len(self) if count is None else count
+
+    def append(self, turn):
+        super().append(turn)
+        self.count += 1
+        entities = turn.get("entities") or []
+        self.entities = (entities + [e for e in self.entities if e not in entities])[:MAX_ENTITIES]
+        self.compact()
+
+    def tokens(self):
+        return approx_token_count(prompt_text(self))
+
+    def compact(self):
+        while len(self) > RECENT_TURNS:
+            self.summaries.append(summarize(self.pop(0)))
+        del self.summaries[:-MAX_SUMMARIES]
+        # Over the budget the oldest summaries go first, then the older of the recent turns are summarized too
+        while self.tokens() > self.budget:
+            if self.summaries:
+                self.summaries.pop(0)
+            elif len(self) > 1:
+                self.summaries.append(summarize(self.pop(0)))
+            else:
+                break
+
+    def to_dict(self):
+        return {"turns": list(self), "summaries": self.summaries, "entities": self.entities, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data, budget=None):
+        return cls(data.get("turns", ()), data.get("summaries", ()), data.get("entities", ()), budget,
+                   data.get("count"))
+
+
+class SessionDB:
+    """
+    Conversation memories by session id in a SQLite file, safe to use from several threads
+
+    Args:
+        path: The SQLite file, created if missing
+        budget: Token budget of the memories it loads (see ConversationMemory)
+    """
+
+    def __init__(self, path=SESSIONS_DB, budget=None):
+        self.path = path
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")   # Saving a turn doesn't make readers wait
+            self._db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                             "(session_id TEXT PRIMARY KEY, updated REAL NOT NULL, memory TEXT NOT NULL)")
+
+    def load(self, session_id):
+        """The session's ConversationMemory, None if it was never saved"""
+        with self._lock:
+            row = self._db.execute("SELECT memory FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return None if row is None else ConversationMemory.from_dict(json.loads(row[0]), self.budget)
+
+    def save(self, session_id, memory):
+        data = json.dumps(memory.to_dict(), ensure_ascii=False)
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO sessions (session_id, updated, memory) VALUES (?, ?, ?) "
+                             "ON CONFLICT(session_id) DO UPDATE SET updated = excluded.updated, memory = excluded.memory",
+                             (session_id, time.time(), data))
+
+    def delete(self, session_id):
+        """True if the session was saved"""
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -2,13 +2,26 @@
 # Creates the empty "collections" which are the containers that will hold the data that was chunked in a previous step
 # Also configures the LLM and embedding model to use for vectorization
 # By including url as a collections property, the chatbot will be able to include links to where it got its information in its responses
+# content_hash lets import_knowledge_chunks_data.py --sync tell which chunks changed since the last import
+# --profile index_profile.json sets up the vector index (HNSW settings and compression) found by tune_vector_index.py,
+# without it Weaviate's defaults are used
+
+import argparse
 
 import weaviate
 from weaviate.classes.config import Property, DataType, Configure
 
+from index_profile import PROFILE_FILE, load_profile, vector_index_config
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--profile", help=f"vector index profile to use, e.g. {PROFILE_FILE} from tune_vector_index.py")
+args = parser.parse_args()
+profile = load_profile(args.profile) if args.profile else None
+
 client = weaviate.connect_to_local()
 
 # Uncomment this line if you are needing to REIMPORT data
+# (not needed to update the data, see import_knowledge_chunks_data.py --sync)
 # client.collections.delete("KnowledgeChunk")
 
 # Create a new collection for your RAG documents
@@ -18,10 +31,12 @@ knowledge_chunks = client.collections.create(
         Property(name="url", data_type=DataType.TEXT),
         Property(name="chunk_id", data_type=DataType.TEXT),
         Property(name="text", data_type=DataType.TEXT),
+        Property(name="content_hash", data_type=DataType.TEXT, skip_vectorization=True),
     ],
     vector_config=Configure.Vectors.text2vec_ollama(
         api_endpoint="http://host.docker.internal:11434",  #"http://host.docker.internal:11434" if using Docker, or "http://localhost:11434 if not using docker"
         model="nomic-embed-text",
+        vector_index_config=vector_index_config(profile) if profile else None,
     ),
     generative_config=Configure.Generative.ollama(
         api_endpoint="http://host.docker.internal:11434",
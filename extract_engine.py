@@ -0,0 +1,185 @@
+
+# Extract mode without paying for every generation, used by multi_turn_RAG_conversation.extract_answer()
+
+# generate.hybrid(single_prompt=...) has the LLM read each of the top 3 chunks and the answer is the first one that
+# is not "not in my data", so all 3 generations are paid for even when the top chunk had the answer.
+# Here Weaviate only returns the chunks and the generations run against Ollama directly:
+#   sequential   in rank order, stopping at the first real answer (least work, best on a CPU-only Ollama)
+#   parallel     all at once, the rest are stopped as soon as the answer is known (fastest when Ollama can run
+#                several generations at the same time, see OLLAMA_NUM_PARALLEL)
+#   weaviate     the original generate.hybrid single_prompt call, for comparison
+# Every strategy picks the same answer. Generations are streamed so a stopped one ends mid-answer: closing the
+# connection makes Ollama stop generating too.
+# Each generation is an extract_chunk span with the token counts Ollama reports (tracing.generation_stats).
+# benchmark_extract.py compares the strategies against stub backends.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import ollama_client
+from tracing import Tracer, generation_stats
+
+STRATEGIES = ("sequential", "parallel", "weaviate")
+STRATEGY = "sequential"
+NOT_FOUND = "not in my data"   # What the extract prompt tells the LLM to say when the chunk has no answer
+NO_CHUNKS = "This information is not in my data"   # The answer when the search found no chunks at all
+MAX_WORKERS = 32               # Generations running at the same time for all turns together (parallel strategy)
+NO_TRACER = Tracer()           # Tracing off, when run() is not given a tracer
+
+
+def fill_prompt(template, properties):
+    """Put a chunk's properties into the prompt, like single_prompt does with {text} and {url}"""
+    for name, value in properties.items():
+        template = template.replace("{" + name + "}", str(value))
+    return template
+
+
+def is_answer(text):
+    return NOT_FOUND not in text
+
+
+def generate_until(prompt, cancelled, options=None, done=None):
+    """
+    Generate with Ollama, giving up as soon as cancelled (a threading.Event) is set
+
+    done (optional dict) gets the last part of the generation, with Ollama's counts and timings
+
+    Returns:
+        The generated text, or None if it was cancelled
+    """
+    stream = ollama_client.generate_stream(prompt, model="llama3.2", options=options)
+    pieces = []
+    try:
+        for part in stream:
+            if cancelled.is_set():
+                return None
+            pieces.append(part["response"])
+            if part.get("done") and done is not None:
+                done.update(part)
+    finally:
+        stream.close()  # Closes the connection when stopped early
+    return "".join(pieces)
+
+
+class ExtractEngine:
+    """
+    Args:
+        strategy: "sequential", "parallel" or "weaviate" (see the top of this file)
+        generate: Function (prompt, cancelled event, options, done dict) -> text or None, generate_until by default
+    """
+
+    def __init__(self, strategy=STRATEGY, generate=generate_until, max_workers=MAX_WORKERS):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown extract strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+        self.strategy = strategy
+        self.generate = generate
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="extract")
+            return self._pool
+
+    def run(self, prompts, options=None, timings=None, tracer=NO_TRACER):
+        """
+        Answer from the first prompt (in rank order) whose generation is a real answer
+
+        Args:
+            prompts: One filled in extract prompt per retrieved chunk, best match first
+            options: Ollama options, e.g. {"temperature": 0.01}
+            timings: Optional list, gets one dict per chunk: rank, status (answer, not_found, cancelled or
+                     skipped), seconds spent on it and what Ollama reported for it (prompt_tokens,
+                     tokens_per_sec, cold... see tracing.generation_stats)
+            tracer: Tracer the extract_chunk spans go to
+
+        Returns:
+            (rank, text) - the first real answer, or the top chunk's "not in my data" reply if none had one
+
+        Raises:
+            ValueError: If there are no prompts or one of them is empty (answer with NO_CHUNKS instead)
+        """
+        timings = timings if timings is not None else []
+        if not prompts:
+            raise ValueError("no extract prompts, there were no chunks to read")
+        for rank, prompt in enumerate(prompts):
+            if not prompt or not prompt.strip():
+                raise ValueError(f"extract prompt {rank} is empty")
+        if self.strategy == "parallel":
+            return self.run_parallel(prompts, options, timings, tracer)
+
+        never = threading.Event()
+        first = None
+        for rank, prompt in enumerate(prompts):
+            text, seconds, stats = self.timed(rank, prompt, never, options, tracer)
+            found = is_answer(text)
+            timings.append({"rank": rank, "status": "answer" if found else "not_found", "seconds": seconds, **stats})
+            if found:
+                timings.extend({"rank": r, "status": "skipped", "seconds": 0.0} for r in range(rank + 1, len(prompts)))
+                return rank, text
+            if first is None:
+                first = text
+        return 0, first
+
+    def run_parallel(self, prompts, options, timings, tracer):
+        cancelled = threading.Event()
+        start = time.perf_counter()
+        # tracer.bind: the extract_chunk spans belong to the caller's span
+        futures = {self.pool.submit(tracer.bind(self.timed), rank, prompt, cancelled, options, tracer): rank
+                   for rank, prompt in enumerate(prompts)}
+        results = [None] * len(prompts)   # (text, seconds, stats) per rank once finished
+        chosen = None
+        pending = set(futures)
+        try:
+            while pending and chosen is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures[future]] = future.result()
+                # The answer is known once a real answer has come back and every better ranked chunk had none
+                for rank, result in enumerate(results):
+                    if result is None:
+                        break
+                    if is_answer(result[0]):
+                        chosen = rank
+                        break
+        except BaseException:
+            # One generation failed, the others would only keep Ollama busy
+            self.cancel(cancelled, pending)
+            raise
+
+        stopped_after = 0.0
+        if chosen is not None and pending:
+            self.cancel(cancelled, pending)
+            stopped_after = time.perf_counter() - start
+        for rank, result in enumerate(results):
+            if result is not None:
+                text, seconds, stats = result
+                timings.append({"rank": rank, "status": "answer" if is_answer(text) else "not_found", "seconds": seconds,
+                                **stats})
+            else:
+                timings.append({"rank": rank, "status": "cancelled", "seconds": stopped_after})
+
+        if chosen is None:
+            return 0, results[0][0]
+        return chosen, results[chosen][0]
+
+    @staticmethod
+    def cancel(cancelled, pending):
+        cancelled.set()
+        for future in pending:
+            future.cancel()   # Not started yet, or stops at its next token
+
+    def timed(self, rank, prompt, cancelled, options, tracer):
+        """Generate for one chunk in an extract_chunk span, returns (text, seconds, generation_stats)"""
+        done = {}
+        start = time.perf_counter()
+        with tracer.span("extract_chunk", rank=rank) as span:
+            text = self.generate(prompt, cancelled, options, done)
+            stats = generation_stats(done)
+            span.update(stats)
+            span["status"] = "cancelled" if text is None else "answer" if is_answer(text) else "not_found"
+        return text, time.perf_counter() - start, stats
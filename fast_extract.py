@@ -0,0 +1,127 @@
+
+# Fast page extraction for Website_crawl_scrape.py - use it with: python Website_crawl_scrape.py --extractor fast
+
+# Parses pages with lxml (a C parser, many times faster than BeautifulSoup's html.parser) and removes the
+# site chrome while the page is still a DOM tree: <nav>, <header>, <footer>, <script> etc. are dropped
+# before any text is taken from the page, instead of guessing which lines were menus afterwards.
+# It also learns text blocks that repeat across many pages (sidebars, "share this page" boxes...) and drops those too.
+
+# Install these packages: pip install lxml
+
+import hashlib
+import json
+import threading
+from collections import Counter
+
+from lxml import etree, html as lxml_html
+
+# Elements that never hold content we want the chatbot to know about
+DROP_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "form", "nav", "header", "footer", "aside")
+
+BOILERPLATE_FILE = "boilerplate_blocks.json"
+BOILERPLATE_MIN_PAGES = 5      # A block seen on this many pages is treated as site chrome
+BOILERPLATE_MAX_TRACKED = 200_000  # Forget blocks only seen once when more than this many are tracked
+
+
+def block_hash(block):
+    return hashlib.blake2b(block.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class BoilerplateFilter:
+    """Counts how many pages each text block appears on and drops blocks that are on too many pages"""
+
+    def __init__(self, min_pages=BOILERPLATE_MIN_PAGES, known=()):
+        self.min_pages = min_pages
+        self.counts = Counter({h: min_pages for h in known})
+        self.dropped = 0
+        self.lock = threading.Lock()  # The crawler extracts pages from several threads
+
+    def filter(self, blocks, keep=()):
+        """Blocks not repeated on too many pages, blocks whose index is in keep are never counted or dropped"""
+        hashes = [None if i in keep else block_hash(block) for i, block in enumerate(blocks)]
+        with self.lock:
+            for h in set(hashes) - {None}:
+                self.counts[h] += 1
+            repeated = {h for h in hashes if self.counts[h] >= self.min_pages}
+            if len(self.counts) > BOILERPLATE_MAX_TRACKED:
+                self.counts = Counter({h: n for h, n in self.counts.items() if n > 1})
+        kept = [block for block, h in zip(blocks, hashes) if h not in repeated]
+        self.dropped += len(blocks) - len(kept)
+        return kept
+
+    def known_blocks(self):
+        return sorted(h for h, n in self.counts.items() if n >= self.min_pages)
+
+
+def load_boilerplate(path=BOILERPLATE_FILE, min_pages=BOILERPLATE_MIN_PAGES):
+    """A BoilerplateFilter that already knows the blocks learned by the last crawl"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return BoilerplateFilter(min_pages, json.load(f))
+    except FileNotFoundError:
+        return BoilerplateFilter(min_pages)
+
+def save_boilerplate(boilerplate, path=BOILERPLATE_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(boilerplate.known_blocks(), f)
+
+
+def text_blocks(root):
+    """Stripped text nodes in document order (like itertext), plus the indexes of the ones that are link text"""
+    blocks = []
+    link_blocks = set()
+    link_depth = 0
+    for event, el in etree.iterwalk(root, events=("start", "end", "comment", "pi")):
+        if event == "start":
+            link_depth += el.tag == "a"
+            text = el.text
+        else:
+            if event == "end":
+                link_depth -= el.tag == "a"
+            # The tail is text after the element's end tag (or comment), so it belongs to the parent
+            text = el.tail if el is not root else None
+        text = text.strip() if text else ""
+        if text:
+            if link_depth:
+                link_blocks.add(len(blocks))
+            blocks.append(text)
+    return blocks, link_blocks
+
+
+def extract(content, boilerplate=None):
+    """
+    Extract the main content and the links from a page
+
+    Args:
+        content: The page HTML (bytes or str)
+        boilerplate: Optional BoilerplateFilter to drop blocks repeated across pages
+
+    Returns:
+        (text, hrefs) - text has one block per line like BeautifulSoup's get_text(separator="\\n", strip=True)
+    """
+    try:
+        tree = lxml_html.document_fromstring(content)
+    except (etree.ParserError, ValueError):
+        return "", []
+
+    # Links first - the nav and footer links are still needed to find the rest of the site
+    hrefs = tree.xpath("//a/@href")
+
+    main = tree.find(".//main")
+    root = main if main is not None else tree
+    etree.strip_elements(root, *DROP_TAGS, with_tail=False)
+    etree.strip_elements(root, etree.Comment, with_tail=False)
+
+    blocks, link_blocks = text_blocks(root)
+    if boilerplate is not None:
+        # Link labels ("Page 12") are often also a page's heading, so they are not learned as boilerplate.
+        # Menus full of links are already gone with <nav>/<header>/<footer>.
+        blocks = boilerplate.filter(blocks, keep=link_blocks)
+    return "\n".join(blocks), hrefs
+
+
+def make_extractor(boilerplate=None):
+    """Extractor for Website_crawl_scrape.crawl(), takes a response and returns (text, hrefs)"""
+    def extract_response(response):
+        return extract(response.content, boilerplate)
+    return extract_response
@@ -1,29 +1,279 @@
 
 # Import data from previously gathered, cleaned, and chunked JSON file into the newly made collections
 
-import weaviate
+# Works with .json or .jsonl files (see pipeline_io.py), for example:
+#   python import_knowledge_chunks_data.py chunked_pages.jsonl
+# import_chunks() can also be imported and given chunks straight from the chunking step
+
+# Every object gets a UUID made from its chunk_id and a hash of its text, so importing the same chunk twice
+# overwrites it instead of adding a copy. To update an existing collection without deleting it, use --sync:
+#   python import_knowledge_chunks_data.py --sync
+# Only new and changed chunks are sent (and embedded), chunks that are no longer in the file are deleted. A page's old
+# objects are only deleted once all of its new chunks were inserted, none of them in dead_letter.jsonl.
+# After an incremental crawl (Website_crawl_scrape.py --incremental) the file only holds the changed pages, so add
+#   --removed removed_pages.json
+# Then only objects from the pages in the file or in removed_pages.json are touched, the rest is left alone.
+
+# --client-embed embeds the chunks here instead of letting Weaviate call Ollama once per object: texts are sent to
+# Ollama's /api/embed in batches and the vectors are kept in vector_cache/ (see vector_cache.py). Re-creating the
+# collection and importing again then makes no embedding calls for text that has not changed.
+# Use the same choice for every import, vectors made by Weaviate's module also include the collection name and urls.
+
+# Objects are sent by bulk_import.py: several batches at once, batch size adjusted to Weaviate's speed, failed objects
+# retried with backoff and finally written to dead_letter.jsonl instead of stopping the import. Re-send those with
+#   python import_knowledge_chunks_data.py --retry-dead-letter
+# How far the import got is kept in import_progress.json. If it was interrupted, carry on from there with
+#   python import_knowledge_chunks_data.py chunked_pages.jsonl --resume
+# A few objects before that point may be sent again, they keep their UUID so they overwrite rather than duplicate.
+# Every import that changes the collection rewrites knowledge_version.json, which empties the chatbot's answer cache
+# (see answer_cache.py).
+
+import argparse
+import hashlib
+import itertools
 import json
+import os
+import shutil
+
+import weaviate
+from weaviate.classes.query import Filter
+from weaviate.util import generate_uuid5
+
+from answer_cache import bump_knowledge_version
+from bulk_import import BulkImporter, DEAD_LETTER_FILE
+from pipeline_io import read_records
+
+DELETE_BATCH_SIZE = 1000
+PROGRESS_FILE = "import_progress.json"
+VECTOR_NAME = "default"   # Name Weaviate gives the vector set up in create_knowledge_chunks_collection.py
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
 
-client = weaviate.connect_to_local()
-knowledge_chunks = client.collections.use("KnowledgeChunk")
+def chunk_uuid(chunk_id, text_hash):
+    """Same chunk_id and text always give the same UUID, changed text gives a new one"""
+    return generate_uuid5({"chunk_id": chunk_id, "content_hash": text_hash})
 
-with open("chunked_pages.json", "r", encoding="utf-8") as f:
-    chunks = json.load(f)
+def chunk_object(chunk):
+    """(uuid, properties) for a chunk record"""
+    text_hash = content_hash(chunk["text"])
+    properties = {
+        "url": chunk["url"],
+        "chunk_id": chunk["chunk_id"],
+        "text": chunk["text"],
+        "content_hash": text_hash,
+    }
+    return chunk_uuid(chunk["chunk_id"], text_hash), properties
 
-with knowledge_chunks.batch.fixed_size(batch_size=100) as batch:
+
+def with_vectors(chunks, embedder, batch_size):
+    """Yield (chunk, vector) pairs, embedding batch_size chunks at a time, or (chunk, None) without an embedder"""
+    if embedder is None:
+        for chunk in chunks:
+            yield chunk, None
+        return
+
+    batch = []
     for chunk in chunks:
-        batch.add_object(
-            {
-                "url": chunk["url"],
-                "chunk_id": chunk["chunk_id"],
-                "text": chunk["text"],
-            }
-        )
-        if batch.number_errors > 10:
-            print("Batch import stopped due to excessive errors.")
-            break
-
-if knowledge_chunks.batch.failed_objects:
-    print(f"Failed imports: {len(knowledge_chunks.batch.failed_objects)}")
-
-client.close()
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            yield from zip(batch, embedder([c["text"] for c in batch]))
+            batch = []
+    if batch:
+        yield from zip(batch, embedder([c["text"] for c in batch]))
+
+
+def import_chunks(knowledge_chunks, chunks, embedder=None, importer=None):
+    """
+    Add chunks (any iterable, including a generator) to the collection, returns how many were inserted
+
+    With an embedder (e.g. vector_cache.CachedEmbedder) the vectors are computed here and sent with the objects,
+    otherwise Weaviate's text2vec-ollama module embeds every object.
+    importer is an optional bulk_import.BulkImporter, to change its settings or follow its progress.
+    """
+    importer = importer or BulkImporter(knowledge_chunks)
+    batch_size = getattr(embedder, "batch_size", 100)
+
+    def objects():
+        for chunk, vector in with_vectors(chunks, embedder, batch_size):
+            uuid, properties = chunk_object(chunk)
+            yield uuid, properties, None if vector is None else {VECTOR_NAME: vector}
+
+    stats = importer.run(objects())
+    importer.print_stats(stats["seconds"])
+    if stats["dead_letter"]:
+        print(f"Failed imports: {stats['dead_letter']} (written to {importer.dead_letter_path})")
+    if stats["inserted"]:
+        bump_knowledge_version()
+    return stats["inserted"]
+
+
+def retry_dead_letter(knowledge_chunks, path=DEAD_LETTER_FILE):
+    """Send the objects in the dead letter file again, the ones that still fail end up in a new dead letter file"""
+    if not os.path.exists(path):
+        return 0
+    retrying = path + ".retrying"
+    shutil.move(path, retrying)
+    with open(retrying, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    stats = BulkImporter(knowledge_chunks, dead_letter_path=path).run(
+        (record["uuid"], record["properties"], record["vector"]) for record in records
+    )
+    os.remove(retrying)
+    if stats["inserted"]:
+        bump_knowledge_version()
+    return stats["inserted"]
+
+
+def load_progress(input_path):
+    """How many records of input_path an earlier import got through"""
+    try:
+        with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
+            progress = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+    return progress["done"] if progress.get("input") == os.path.abspath(input_path) else 0
+
+def save_progress(input_path, done):
+    tmp = PROGRESS_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "done": done}, f)
+    os.replace(tmp, PROGRESS_FILE)
+
+
+def existing_objects(knowledge_chunks):
+    """{uuid: (chunk_id, url)} of every object in the collection"""
+    return {
+        str(obj.uuid): (obj.properties.get("chunk_id"), obj.properties.get("url"))
+        for obj in knowledge_chunks.iterator(return_properties=["chunk_id", "url"])
+    }
+
+
+def delete_objects(knowledge_chunks, uuids):
+    uuids = list(uuids)
+    for i in range(0, len(uuids), DELETE_BATCH_SIZE):
+        knowledge_chunks.data.delete_many(where=Filter.by_id().contains_any(uuids[i:i + DELETE_BATCH_SIZE]))
+
+
+def sync_chunks(knowledge_chunks, chunks, removed_urls=None, embedder=None, importer=None):
+    """
+    Make the collection match the chunks, only sending what changed
+
+    Changed text gets a new chunk_id (and UUID), so a chunk sent for a page that had objects replaces one of them:
+    per page, as many sent chunks as old objects that went away are counted as changed, the rest as new or deleted.
+    Old objects are only deleted when every chunk sent for their page was inserted. If some went to the dead letter
+    file, the page's old objects stay until a later sync (or --retry-dead-letter and a sync) replaces them.
+
+    Args:
+        knowledge_chunks: The collection
+        chunks: Chunk records (any iterable, including a generator)
+        removed_urls: None if chunks is the whole corpus - every object not in it is deleted.
+                      Otherwise chunks only covers some pages (an incremental crawl) and removed_urls lists the
+                      pages that were removed; only objects from those pages and the pages in chunks are deleted.
+        embedder: Optional embedder, see import_chunks
+        importer: Optional bulk_import.BulkImporter, see import_chunks
+
+    Returns:
+        dict with the number of new, changed, unchanged and deleted chunks, and of old objects kept because their
+        replacements failed (kept_for_retry)
+    """
+    remote = existing_objects(knowledge_chunks)
+    importer = importer or BulkImporter(knowledge_chunks)
+    stats = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0, "kept_for_retry": 0}
+    kept = set()
+    local_urls = set()
+    sent = {}   # url -> UUIDs of the chunks sent for it
+
+    def to_send():
+        for chunk in chunks:
+            local_urls.add(chunk["url"])
+            uuid, properties = chunk_object(chunk)
+            if uuid in remote:
+                kept.add(uuid)
+                stats["unchanged"] += 1
+                continue
+            sent.setdefault(chunk["url"], []).append(str(uuid))
+            yield chunk
+
+    import_chunks(knowledge_chunks, to_send(), embedder, importer)
+
+    stale = {}   # url -> UUIDs of its objects that are not in the chunks any more
+    for uuid in set(remote) - kept:
+        stale.setdefault(remote[uuid][1], []).append(uuid)
+    if removed_urls is not None:
+        touched = local_urls | set(removed_urls)
+        stale = {url: uuids for url, uuids in stale.items() if url in touched}
+
+    deleting = []
+    for url in set(sent) | set(stale):
+        old, new = stale.get(url, []), sent.get(url, [])
+        changed = min(len(old), len(new))
+        stats["changed"] += changed
+        stats["new"] += len(new) - changed
+        if any(uuid in importer.failed for uuid in new):
+            stats["kept_for_retry"] += len(old)
+        else:
+            stats["deleted"] += len(old) - changed
+            deleting.extend(old)
+    delete_objects(knowledge_chunks, deleting)
+    if deleting:
+        bump_knowledge_version()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", nargs="?", default="chunked_pages.json")
+    parser.add_argument("--sync", action="store_true",
+                        help="only send new/changed chunks and delete the ones that are gone")
+    parser.add_argument("--removed", help="removed_pages.json from an incremental crawl - implies --sync for just those pages")
+    parser.add_argument("--client-embed", action="store_true",
+                        help="embed in batches here, with the on-disk vector cache, instead of in Weaviate")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"skip the records an interrupted import already sent (recorded in {PROGRESS_FILE})")
+    parser.add_argument("--retry-dead-letter", action="store_true",
+                        help=f"send the objects in {DEAD_LETTER_FILE} again instead of importing a file")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="batches sent at the same time")
+    args = parser.parse_args()
+
+    embedder = None
+    if args.client_embed:
+        from vector_cache import CachedEmbedder, VectorCache
+        embedder = CachedEmbedder(VectorCache())
+
+    client = weaviate.connect_to_local()
+    knowledge_chunks = client.collections.use("KnowledgeChunk")
+
+    if args.retry_dead_letter:
+        count = retry_dead_letter(knowledge_chunks)
+        print(f"Imported {count} objects from {DEAD_LETTER_FILE}")
+    elif args.sync or args.removed:
+        removed_urls = None
+        if args.removed:
+            with open(args.removed, "r", encoding="utf-8") as f:
+                removed_urls = json.load(f)
+        stats = sync_chunks(knowledge_chunks, read_records(args.input_path), removed_urls, embedder)
+        print(f"Synced {args.input_path}: {stats['new']} new, {stats['changed']} changed, "
+              f"{stats['unchanged']} unchanged, {stats['deleted']} deleted")
+        if stats["kept_for_retry"]:
+            print(f"{stats['kept_for_retry']} old objects kept, their replacements are in {DEAD_LETTER_FILE} "
+                  f"(the next --sync sends them again)")
+        print(f"Embedding calls saved: {stats['unchanged']} of {stats['new'] + stats['changed'] + stats['unchanged']}")
+    else:
+        skip = load_progress(args.input_path) if args.resume else 0
+        if skip:
+            print(f"Resuming {args.input_path} after {skip} records")
+        importer = BulkImporter(knowledge_chunks, max_in_flight=args.max_in_flight,
+                                progress=lambda done: save_progress(args.input_path, skip + done))
+        chunks = itertools.islice(read_records(args.input_path), skip, None)
+        count = import_chunks(knowledge_chunks, chunks, embedder, importer)
+        print(f"Imported {count} chunks from {args.input_path}")
+        if os.path.exists(PROGRESS_FILE):
+            os.remove(PROGRESS_FILE)   # Finished, a later --resume starts from the beginning
+
+    if embedder is not None:
+        print(f"Embedding: {embedder.hits} texts from the cache, {embedder.embedded} embedded "
+              f"in {embedder.calls} calls to Ollama")
+
+    client.close()
@@ -0,0 +1,88 @@
+# Vector index settings of the KnowledgeChunk collection: the HNSW graph and how its vectors are compressed
+# tune_vector_index.py measures a grid of profiles and saves the best one to index_profile.json,
+#   python create_knowledge_chunks_collection.py --profile index_profile.json
+# then creates the collection with it.
+
+# A profile is a dict, every key is optional (a missing one keeps Weaviate's default):
+#   ef                size of the candidate list of a search: higher finds more of the true nearest chunks, slower
+#                     (-1, the default, lets Weaviate pick it from the query's limit)
+#   max_connections   links of each vector in the graph (default 32): higher is better recall and more memory
+#   ef_construction   candidate list while adding vectors (default 128): higher is a better graph and a slower import
+#   quantizer         "pq", "bq" or "sq" keeps the vectors compressed in memory, the full vectors stay on disk
+#                     and rescore the best candidates. None (or "none") keeps full float32 vectors in memory.
+#   segments          pq: bytes per vector, must divide the vector's dimensions
+#   training_limit    pq/sq: vectors to train the compression on before it starts (Weaviate's default is 100000,
+#                     a smaller collection is never compressed)
+
+import json
+
+from weaviate.classes.config import Configure
+
+PROFILE_FILE = "index_profile.json"
+QUANTIZERS = ("none", "pq", "bq", "sq")
+PROFILE_KEYS = {"ef", "max_connections", "ef_construction", "quantizer", "segments", "training_limit"}
+DEFAULT_MAX_CONNECTIONS = 32
+
+
+def check_profile(profile):
+    unknown = set(profile) - PROFILE_KEYS
+    if unknown:
+        raise ValueError(f"Unknown index profile settings: {', '.join(sorted(unknown))}")
+    if (profile.get("quantizer") or "none") not in QUANTIZERS:
+        raise ValueError(f"Unknown quantizer: {profile['quantizer']} (expected one of {', '.join(QUANTIZERS)})")
+    return profile
+
+
+def load_profile(path=PROFILE_FILE):
+    """The profile saved by save_profile() (or a file holding only the profile dict)"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return check_profile(data.get("profile", data))
+
+
+def save_profile(profile, measured=None, path=PROFILE_FILE):
+    """Write the profile, with what tune_vector_index.py measured for it"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"profile": check_profile(profile), "measured": measured or {}}, f, indent=2)
+
+
+def quantizer_config(profile):
+    quantizer = profile.get("quantizer") or "none"
+    if quantizer == "pq":
+        return Configure.VectorIndex.Quantizer.pq(segments=profile.get("segments"),
+                                                  training_limit=profile.get("training_limit"))
+    if quantizer == "bq":
+        return Configure.VectorIndex.Quantizer.bq()
+    if quantizer == "sq":
+        return Configure.VectorIndex.Quantizer.sq(training_limit=profile.get("training_limit"))
+    return None
+
+
+def vector_index_config(profile):
+    """Configure.VectorIndex.hnsw() for the profile, to pass as vector_index_config= of Configure.Vectors"""
+    check_profile(profile)
+    return Configure.VectorIndex.hnsw(ef=profile.get("ef"), max_connections=profile.get("max_connections"),
+                                      ef_construction=profile.get("ef_construction"),
+                                      quantizer=quantizer_config(profile))
+
+
+def estimated_memory(profile, count, dimensions):
+    """
+    Rough bytes Weaviate keeps in memory for count vectors: the (compressed) vectors plus the graph's links
+
+    Vectors take 4 bytes per dimension, 1 with sq, 1 bit with bq and `segments` bytes with pq. Each vector also has
+    about 2 * max_connections links of 8 bytes on the graph's bottom layer (the layers above add a few percent).
+    Collections smaller than the training limit are not compressed yet by pq/sq.
+    """
+    quantizer = profile.get("quantizer") or "none"
+    trained = count >= (profile.get("training_limit") or 100000)
+    if quantizer == "pq" and trained:
+        vector_bytes = profile.get("segments") or dimensions // 4
+    elif quantizer == "bq":
+        vector_bytes = dimensions / 8
+    elif quantizer == "sq" and trained:
+        vector_bytes = dimensions
+    else:
+        vector_bytes = 4 * dimensions
+    links = 2 * (profile.get("max_connections") or DEFAULT_MAX_CONNECTIONS) * 8
+    return int(count * (vector_bytes + links))
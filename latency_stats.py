@@ -0,0 +1,17 @@
+# Percentiles of latencies and other timings, shared by the import, tracing, load test and benchmark scripts
+
+def percentile(values, p):
+    """
+    Nearest rank percentile, the value below which p percent of values fall
+
+    Args:
+        values: Numbers in any order
+        p: 0-100, e.g. 50 for the median or 95
+
+    Returns:
+        The percentile, or 0.0 if there are no values
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
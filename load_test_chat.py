@@ -0,0 +1,175 @@
+# Load test for chat_service.py: many simulated users, each holding a multi-turn conversation
+#   python load_test_chat.py --sessions 50 --turns 4
+# By default the service is started here with stub backends (stub_servers.py: a stub Ollama and an in-memory
+# StubKnowledge collection), so nothing else has to be running. To test a real running service instead:
+#   python load_test_chat.py --url http://127.0.0.1:8000
+
+# Reports turns per second and turn latency (p50/p95/max), compares the wall time with answering the same turns
+# one after another, and checks that every session kept its own history.
+# With --stream the answers come from /chat/stream and the time to the first words is reported as well.
+# The answer cache of the started service is off unless --answer-cache-size is given, so every turn does the full work.
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+import multi_turn_RAG_conversation
+import ollama_client
+from answer_cache import AnswerCache
+from chat_service import make_app
+from latency_stats import percentile
+from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+
+# Every conversation walks through these, starting at a random question
+QUESTIONS = [
+    "What is the phone number of the main office?",
+    "What are their opening hours?",
+    "Who should I contact about a billing question?",
+    "How do I apply for the program?",
+    "What services does the company offer?",
+    "Does it also offer training?",
+    "What is the email address for support?",
+    "Tell me about the history of the organisation.",
+]
+
+
+async def send_streamed(http, url, body, first_words):
+    """Post to /chat/stream, note when the first words arrive, return the final line"""
+    sent = time.perf_counter()
+    async with http.post(f"{url}/chat/stream", json=body) as response:
+        response.raise_for_status()
+        first = None
+        async for line in response.content:
+            reply = json.loads(line)
+            if first is None and reply.get("response"):
+                first = time.perf_counter() - sent
+    first_words.append(first if first is not None else time.perf_counter() - sent)
+    return reply
+
+
+async def conversation(http, url, turns, rng, latencies, errors, first_words=None):
+    """One user: turns messages in a row in the same session, returns the session_id"""
+    session_id = None
+    start = rng.randrange(len(QUESTIONS))
+    for turn in range(turns):
+        message = QUESTIONS[(start + turn) % len(QUESTIONS)]
+        body = {"message": message, "session_id": session_id}
+        sent = time.perf_counter()
+        try:
+            if first_words is not None:
+                reply = await send_streamed(http, url, body, first_words)
+            else:
+                async with http.post(f"{url}/chat", json=body) as response:
+                    response.raise_for_status()
+                    reply = await response.json()
+        except aiohttp.ClientError as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - sent)
+        session_id = reply["session_id"]
+    return session_id
+
+
+async def run_load(url, sessions, turns, seed=0, first_words=None):
+    rng = random.Random(seed)
+    latencies = []
+    errors = []
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=600)) as http:
+        start = time.perf_counter()
+        session_ids = await asyncio.gather(*[
+            conversation(http, url, turns, random.Random(rng.random()), latencies, errors, first_words)
+            for _ in range(sessions)
+        ])
+        seconds = time.perf_counter() - start
+
+        # Every session must hold its own turns, and only those
+        mixed_up = 0
+        for session_id in session_ids:
+            if session_id is None:
+                continue
+            async with http.get(f"{url}/sessions/{session_id}") as response:
+                memory = await response.json()
+            if memory["count"] != turns or not memory["history"]:
+                mixed_up += 1
+    return seconds, latencies, errors, mixed_up
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="running chat_service.py to test, instead of starting one with stub backends")
+    parser.add_argument("--sessions", type=int, default=50, help="simulated users talking at the same time")
+    parser.add_argument("--turns", type=int, default=4, help="messages per user")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream and measure time to first words")
+    parser.add_argument("--max-concurrent", type=int, default=16, help="turns the started service answers at once")
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks in the stub collection")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="stub seconds per search")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub Ollama seconds per request")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="stub Ollama seconds per generated word")
+    parser.add_argument("--answer-cache-size", type=int, default=0, help="answer cache of the started service")
+    args = parser.parse_args()
+
+    runner = server = None
+    url = args.url
+    if url is None:
+        server = serve_stub_ollama(latency=args.latency, token_latency=args.token_latency)
+        ollama_client.OLLAMA_URL = stub_url(server)   # For rewrite_query
+        rng = random.Random(0)
+        chunks = [
+            {"url": f"https://example.com/page-{i // 4}", "chunk_id": f"https://example.com/page-{i // 4}#{i % 4}",
+             "text": make_paragraph(rng)}
+            for i in range(args.chunks)
+        ]
+        knowledge = StubKnowledge(chunks, stub_url(server), latency=args.search_latency)
+        print(knowledge.config.get())
+        multi_turn_RAG_conversation.ANSWER_CACHE = AnswerCache(args.answer_cache_size)
+        runner = web.AppRunner(make_app(knowledge, args.max_concurrent))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        url = f"http://{host}:{port}"
+
+    try:
+        # One user alone first, to know what a turn costs without any waiting
+        _, single_latencies, _, _ = await run_load(url, 1, args.turns, seed=1)
+        first_words = [] if args.stream else None
+        seconds, latencies, errors, mixed_up = await run_load(url, args.sessions, args.turns, first_words=first_words)
+        async with aiohttp.ClientSession() as http:
+            async with http.get(f"{url}/health") as response:
+                cache = (await response.json()).get("answer_cache", {})
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        if server is not None:
+            server.shutdown()
+
+    print(f"{args.sessions} sessions x {args.turns} turns: {len(latencies)} answered, {len(errors)} errors "
+          f"in {seconds:.2f}s ({len(latencies) / seconds:.1f} turns/sec)")
+    print(f"Turn latency: p50 {percentile(latencies, 50):.3f}s  p95 {percentile(latencies, 95):.3f}s  "
+          f"max {max(latencies, default=0):.3f}s")
+    if first_words:
+        print(f"First words after: p50 {percentile(first_words, 50):.3f}s  p95 {percentile(first_words, 95):.3f}s")
+    single_turn = sum(single_latencies) / max(1, len(single_latencies))
+    print(f"A single user's turn takes {single_turn:.3f}s, one turn at a time this load would take "
+          f"{single_turn * len(latencies):.2f}s ({single_turn * len(latencies) / seconds:.1f}x slower)")
+    if cache.get("hits") or cache.get("semantic_hits") or cache.get("misses"):
+        print(f"Answer cache: {cache['hits']} hits, {cache['semantic_hits']} paraphrase hits, {cache['misses']} misses "
+              f"({cache['hit_rate']:.0%} hit rate)")
+    if errors:
+        print(f"First error: {errors[0]}")
+    if mixed_up:
+        print(f"{mixed_up} sessions have the wrong number of turns in their history")
+    if errors or mixed_up:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,229 @@
+
+# Search the chunks without Weaviate: an index on disk, searched inside the chatbot's own process
+# For small sites, where running the Weaviate container just to search a few thousand chunks is not worth it
+
+# Build it from the chunking step's output (embeddings come from Ollama through the vector cache, see vector_cache.py,
+# so building again only embeds chunks whose text changed):
+#   python local_index.py chunked_pages.json
+# Then chat with it instead of Weaviate:
+#   python multi_turn_RAG_conversation.py --backend local
+#   python chat_service.py --backend local
+
+# local_index/ holds vectors.f32 (the unit length embeddings, one row per chunk, read through a memory map),
+# chunks.jsonl (url, chunk_id and text of each row) and meta.json. The BM25 inverted index is built from chunks.jsonl
+# when the index is opened.
+# LocalKnowledge has the parts of the KnowledgeChunk collection chat() uses. query.hybrid() scores every chunk by
+# cosine similarity and by BM25 (k1 1.2, b 0.75, English stopwords removed, like Weaviate), takes the best
+# CANDIDATES of each, scales both scores to 0-1 and adds them up as alpha * vector + (1 - alpha) * bm25. This is
+# Weaviate's relative score fusion, so alpha means the same as in generate.hybrid: 1 is vector search only,
+# 0 keyword search only.
+# benchmark_local_index.py compares it with Weaviate.
+
+# Install these packages: pip install numpy requests
+
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+
+import ollama_client
+from answer_cache import bump_knowledge_version
+from extract_engine import fill_prompt
+from pipeline_io import read_records
+
+INDEX_DIR = "local_index"
+CANDIDATES = 100   # Results taken from each of the vector and keyword searches before they are fused
+K1 = 1.2
+B = 0.75
+EMBED_BATCH_SIZE = 64
+# Weaviate's "en" stopwords preset
+STOPWORDS = set("""a an and are as at be but by for if in into is it no not of on or such that the their then there
+these they this to was will with""".split())
+
+
+def tokenize(text):
+    """Lowercase words, like Weaviate's word tokenization"""
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+
+def normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def build(chunks, embedder, path=INDEX_DIR, batch_size=EMBED_BATCH_SIZE):
+    """
+    Write the index for chunks (any iterable of chunk records) to path, replacing the one there
+
+    Args:
+        embedder: Function list of texts -> list of vectors, e.g. vector_cache.CachedEmbedder
+
+    Returns:
+        Number of chunks indexed
+    """
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    count = 0
+    dim = None
+    with open(os.path.join(tmp, "vectors.f32"), "wb") as vectors_file, \
+            open(os.path.join(tmp, "chunks.jsonl"), "w", encoding="utf-8") as chunks_file:
+        def write(batch):
+            vectors = normalized(embedder([c["text"] for c in batch]))
+            vectors_file.write(vectors.tobytes())
+            for c in batch:
+                chunks_file.write(json.dumps({"url": c["url"], "chunk_id": c["chunk_id"], "text": c["text"]},
+                                             ensure_ascii=False) + "\n")
+            return vectors.shape[1]
+
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            count += 1
+            if len(batch) == batch_size:
+                dim = write(batch)
+                batch = []
+        if batch:
+            dim = write(batch)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": count, "dim": dim, "model": ollama_client.EMBED_MODEL}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    bump_knowledge_version()   # Cached answers came from the old chunks
+    return count
+
+
+def relative_scores(scores):
+    """Scores scaled to 0-1, the lowest becomes 0 and the highest 1 (all 1 if they are equal)"""
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def top(scores, k):
+    """Indexes of the k highest scores, highest first"""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class LocalKnowledge:
+    """
+    The index in path, with the parts of the KnowledgeChunk collection chat() uses: config.get(),
+    query.hybrid(query, limit, alpha, return_properties, vector) and
+    generate.hybrid(query, limit, alpha, single_prompt or grouped_task, generative_provider)
+
+    Objects have properties (url, chunk_id, text), a uuid (the row number) and metadata.score.
+    Generation goes to ollama_client.OLLAMA_URL, the generative_provider settings are ignored.
+
+    Args:
+        path: Directory written by build()
+        embed: Function query -> vector, the same embedding model the chunks were embedded with
+    """
+
+    def __init__(self, path=INDEX_DIR, embed=None):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.chunks = list(read_records(os.path.join(path, "chunks.jsonl")))
+        count = len(self.chunks)
+        self.vectors = (np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r",
+                                  shape=(count, self.meta["dim"])) if count else np.zeros((0, 1), dtype=np.float32))
+        self.embed = embed or (lambda query: ollama_client.embed([query])[0])
+
+        # BM25 inverted index over the url and text of every chunk
+        postings = {}
+        self.lengths = np.zeros(count, dtype=np.float32)
+        for row, chunk in enumerate(self.chunks):
+            terms = Counter(tokenize(chunk["url"] + " " + chunk["text"]))
+            self.lengths[row] = sum(terms.values())
+            for term, tf in terms.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(row)
+                postings[term][1].append(tf)
+        self.postings = {term: (np.array(rows, dtype=np.int64), np.array(tfs, dtype=np.float32))
+                         for term, (rows, tfs) in postings.items()}
+        self.average_length = float(self.lengths.mean()) if count else 1.0
+
+        self.query = SimpleNamespace(hybrid=self.query_hybrid)
+        self.generate = SimpleNamespace(hybrid=self.generate_hybrid)
+        self.config = SimpleNamespace(get=lambda: {"name": f"KnowledgeChunk (local index in {path})", **self.meta})
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def bm25(self, query):
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            rows, tf = self.postings[term]
+            idf = math.log(1 + (len(self.chunks) - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * self.lengths[rows] / self.average_length))
+        return scores
+
+    def search(self, query, limit, alpha=0.5, vector=None):
+        """[(row, fused score), ...] best first, vector is the query's embedding if it was made already"""
+        fused = {}
+        if alpha < 1:
+            scores = self.bm25(query)
+            rows = top(scores, CANDIDATES)
+            rows = rows[scores[rows] > 0]   # Only chunks with at least one of the words
+            if len(rows):
+                for row, score in zip(rows, relative_scores(scores[rows])):
+                    fused[row] = fused.get(row, 0.0) + (1 - alpha) * float(score)
+        if alpha > 0 and len(self.chunks):
+            scores = self.vectors @ normalized(self.embed(query) if vector is None else vector)
+            rows = top(scores, CANDIDATES)
+            for row, score in zip(rows, relative_scores(scores[rows])):
+                fused[row] = fused.get(row, 0.0) + alpha * float(score)
+        return sorted(fused.items(), key=lambda item: -item[1])[:limit]
+
+    def objects(self, results):
+        return [SimpleNamespace(uuid=int(row), properties=dict(self.chunks[row]), metadata=SimpleNamespace(score=score))
+                for row, score in results]
+
+    def query_hybrid(self, query, limit=3, alpha=0.5, return_properties=None, vector=None):
+        return SimpleNamespace(objects=self.objects(self.search(query, limit, alpha, vector)))
+
+    def generate_hybrid(self, query, limit=3, alpha=0.5, single_prompt=None, grouped_task=None,
+                        generative_provider=None):
+        objects = self.objects(self.search(query, limit, alpha))
+        for obj in objects:
+            obj.generated = None
+            if single_prompt:
+                obj.generated = ollama_client.generate(fill_prompt(single_prompt, obj.properties))["response"]
+        generative = None
+        if grouped_task:
+            context = "\n\n".join(f"url: {obj.properties['url']}\ntext: {obj.properties['text']}" for obj in objects)
+            generative = SimpleNamespace(text=ollama_client.generate(f"{grouped_task}\n\nContext:\n{context}")["response"])
+        return SimpleNamespace(objects=objects, generative=generative)
+
+
+if __name__ == "__main__":
+    from vector_cache import CachedEmbedder, VectorCache
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", nargs="?", default="chunked_pages.json")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--query", help="search the index after building it")
+    args = parser.parse_args()
+
+    embedder = CachedEmbedder(VectorCache())
+    count = build(read_records(args.input_path), embedder, args.index_dir)
+    print(f"Indexed {count} chunks from {args.input_path} in {args.index_dir}/")
+    print(f"Embedding: {embedder.hits} texts from the cache, {embedder.embedded} embedded "
+          f"in {embedder.calls} calls to Ollama")
+    if args.query:
+        for obj in LocalKnowledge(args.index_dir).query.hybrid(args.query, limit=5).objects:
+            print(f"{obj.metadata.score:.3f} {obj.properties['chunk_id']}")
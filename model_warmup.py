@@ -0,0 +1,138 @@
+
+# Keeps llama3.2 and nomic-embed-text loaded in Ollama, so no question has to wait for a model to load
+
+# Ollama unloads a model KEEP_ALIVE after its last request (5 minutes by default), and the next request then waits
+# several seconds for it to load again, inside rewrite_query() or the generation. ModelWarmer:
+#   - loads both models when the chatbot starts (an empty generate request and a one word embedding)
+#   - sends keep_alive with every request of this process (ollama_client.KEEP_ALIVE), so they stay loaded that long
+#   - every CHECK_INTERVAL seconds asks Ollama which models are loaded (GET /api/ps) and loads again the ones that
+#     are gone or unload within REWARM_MARGIN. Requests without keep_alive (Weaviate's text2vec-ollama and
+#     generative-ollama modules) reset a model to Ollama's default, this catches those too.
+# A request that loaded its model reports a load_duration, generations that took longer than COLD_LOAD_SECONDS to
+# load are marked cold (tracing.generation_stats). chat() and chat_stream() put cold_start in their metrics, and
+# chat_service.py's /metrics has the time to the first token of cold and warm turns apart.
+
+#   python multi_turn_RAG_conversation.py --keep-alive 1h
+#   python chat_service.py --no-warmup
+#   python model_warmup.py          warm both models once and print how long loading took
+
+import argparse
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+import ollama_client
+from tracing import COLD_LOAD_SECONDS
+
+KEEP_ALIVE = "30m"
+CHECK_INTERVAL = 30    # Seconds between looks at the loaded models
+REWARM_MARGIN = 60     # Seconds before a model would unload that it is loaded again
+
+
+def expiry(model, running):
+    """Unix time the model unloads according to /api/ps, None if it is not loaded"""
+    for entry in running:
+        name = entry.get("name") or entry.get("model") or ""
+        if name == model or (":" not in model and name.split(":")[0] == model):
+            try:
+                return datetime.fromisoformat(entry["expires_at"]).timestamp()
+            except (KeyError, ValueError):
+                return float("inf")   # Loaded, for how long is unknown
+    return None
+
+
+class ModelWarmer:
+    """
+    Loads the models at start() and keeps them loaded from a background thread until stop()
+
+    Args:
+        models: {model: "generate" or "embed"}, how to load it
+        keep_alive: Sent with the warm-up requests, e.g. "30m" (see ollama_client.keep_alive_seconds)
+        check_interval: Seconds between looks at /api/ps
+        margin: Seconds before a model unloads that it is loaded again
+    """
+
+    def __init__(self, models=None, keep_alive=KEEP_ALIVE, check_interval=CHECK_INTERVAL, margin=REWARM_MARGIN):
+        self.models = models or {ollama_client.LLM_MODEL: "generate", ollama_client.EMBED_MODEL: "embed"}
+        self.keep_alive = keep_alive
+        self.check_interval = check_interval
+        self.margin = margin
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.warmed = {}   # model -> {"warmups", "loads" (warm-ups that found it unloaded), "load_seconds", "at"}
+
+    def warm(self, model):
+        """Load the model (a no-op for Ollama if it is loaded) and reset its keep_alive, returns seconds spent loading"""
+        try:
+            if self.models[model] == "embed":
+                result = ollama_client.embed_response(["warm up"], model=model, keep_alive=self.keep_alive)
+            else:
+                result = ollama_client.generate("", model=model, keep_alive=self.keep_alive)
+        except requests.RequestException as e:
+            print(f"Warming up {model} failed: {e}")
+            return None
+        load_seconds = result.get("load_duration", 0) / 1e9
+        with self._lock:
+            stats = self.warmed.setdefault(model, {"warmups": 0, "loads": 0})
+            stats["warmups"] += 1
+            stats["loads"] += load_seconds > COLD_LOAD_SECONDS
+            stats["load_seconds"] = load_seconds
+            stats["at"] = time.time()
+        return load_seconds
+
+    def warm_all(self):
+        """{model: seconds spent loading it}"""
+        return {model: self.warm(model) for model in self.models}
+
+    def check(self):
+        """Load again the models that are not loaded or unload within the margin"""
+        try:
+            running = ollama_client.running_models()
+        except requests.RequestException:
+            running = None
+        now = time.time()
+        for model in self.models:
+            if running is None:
+                # No /api/ps to ask: warm up again halfway through the keep_alive
+                last = self.warmed.get(model, {}).get("at", 0)
+                due = now - last >= ollama_client.keep_alive_seconds(self.keep_alive) / 2
+            else:
+                until = expiry(model, running)
+                due = until is None or until - now < self.margin
+            if due:
+                self.warm(model)
+
+    def start(self):
+        """Warm the models now (blocking) and keep them warm in a daemon thread, returns the warm-up load seconds"""
+        loaded = self.warm_all()
+        self._thread = threading.Thread(target=self._run, name="model-warmer", daemon=True)
+        self._thread.start()
+        return loaded
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:   # Keep the thread alive, the next check tries again
+                print(f"Model warm-up check failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {"keep_alive": self.keep_alive, "models": {model: dict(stats) for model, stats in self.warmed.items()}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keep-alive", default=KEEP_ALIVE)
+    args = parser.parse_args()
+    for model, seconds in ModelWarmer(keep_alive=args.keep_alive).warm_all().items():
+        if seconds is not None:
+            print(f"{model}: loaded in {seconds:.2f}s" if seconds > COLD_LOAD_SECONDS else f"{model}: already loaded")
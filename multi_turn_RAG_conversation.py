@@ -1,12 +1,76 @@
 # This expands on RAG_example.py with prompt modes, prompt engineering, and
 # multi-turn conversation with memory
 
+# Run it to chat in the terminal. chat() keeps no state of its own, the caller passes in the conversation history
+# and the collection, so chat_service.py can use it to serve many conversations at once.
+
+# With --stream the answer is printed word by word as llama3.2 writes it: chat_stream() only asks Weaviate for the
+# chunks (query.hybrid) and then streams the answer straight from Ollama, instead of waiting for generate.hybrid
+# to return the whole answer. Extract mode is not streamed, its answers are short.
+
+# Extract mode first looks the question up in contact_facts.json (emails, phone numbers, addresses and opening hours
+# found while chunking, see contact_facts.py). Only when nothing is found there does the LLM read the top chunks,
+# stopping once one of them gave an answer (extract_engine.py), choose how with
+# --extract-strategy sequential|parallel|weaviate
+
+# Follow-up questions are rewritten without the LLM when the earlier turns make it clear what they refer to
+# (query_rewriter.py). When llama3.2 does have to rewrite one, the search already starts with the original question
+# and its results are kept if the rewrite hardly changed it (resolve_query).
+
+# Guidance and information answers are generated from the top 8 chunks after context packing (context_packer.py):
+# neighbouring chunks of a page are merged without their shared overlap and the context is kept within
+# --context-tokens, so llama3.2 has less prompt to read before it can start answering.
+
+# Answers are cached (answer_cache.py): the same question, or one with nearly the same embedding, in the same mode is
+# answered without a search or a generation until the collection is imported again. --answer-cache-size 0 turns it off.
+
+# --backend local searches local_index/ inside this process instead of Weaviate (see local_index.py).
+
+# The conversation history is a ConversationMemory (conversation_memory.py): the latest turns, summaries of the older
+# ones and the entities they were about, within --memory-tokens, so rewrite prompts stay the same size however long
+# the answers were. --session NAME saves it to sessions.db and picks the conversation up again on the next start.
+
+# At startup llama3.2 and nomic-embed-text are loaded into Ollama and kept loaded (model_warmup.py), so the first
+# question doesn't wait for them. --keep-alive sets for how long after the last request, --no-warmup turns it off.
+# metrics then has cold_start: True when an LLM call of the turn still had to load its model.
+
+# --trace traces.jsonl records how long every step of every turn took (tracing.py), with the prompt tokens and tokens
+# per second Ollama reports. metrics then has the turn's trace_id.
+
+import argparse
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
 import weaviate
 from weaviate.classes.generate import GenerativeConfig
 from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.config import ConnectionConfig
+
+import ollama_client
+from answer_cache import ANSWER_CACHE_SIZE, AnswerCache
+from contact_facts import ContactFacts
+from context_packer import CONTEXT_TOKENS, pack, passage_text
+from conversation_memory import MEMORY_TOKENS, SESSIONS_DB, ConversationMemory, SessionDB, prompt_text
+from extract_engine import NO_CHUNKS, STRATEGIES, ExtractEngine, fill_prompt
+from local_index import INDEX_DIR, LocalKnowledge
+from model_warmup import KEEP_ALIVE, ModelWarmer
+from query_rewriter import extract_entities, has_pronoun, is_follow_up, resolve_locally, similarity
+from tracing import Tracer, generation_stats
+
+COLLECTION = "KnowledgeChunk"
+MAX_HISTORY = 5   # Turns kept in a conversation history that is a plain list instead of a ConversationMemory
+
+EXTRACT_ENGINE = ExtractEngine()
+CONTACT_FACTS = ContactFacts.load()
+ANSWER_CACHE = AnswerCache()
+TRACER = Tracer()   # Off, see tracing.py
+
+REWRITE_TIMEOUT = 15       # Seconds to wait for an LLM rewrite before searching with the original question
+REUSE_SIMILARITY = 0.8     # Search results for the original question are kept if the rewrite is at least this similar
+SPECULATIVE_SEARCHES = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative")
 
 
 
@@ -70,22 +134,22 @@ def get_information_prompt(q):
 
 #---QUERY REWRITING FOR MEMORY------------------------------------------------------------------------------------------
 
-def rewrite_query(current_query, conversation_history):
+def rewrite_query(current_query, conversation_history, metrics=None):
     """
     Rewrite query to be standalone using conversation context
 
     Args:
         current_query: The user's current question
-        conversation_history: List of dicts with 'user' and 'assistant' keys
+        conversation_history: ConversationMemory or list of dicts with 'user' and 'assistant' keys
+        metrics: Optional dict, gets rewrite_prompt_tokens (counted by Ollama)
 
     Returns:
         Rewritten standalone query
     """
 
-    # Format conversation history
-    history_text = ""
-    for turn in conversation_history[-3:]:  # Last 3 turns to keep it focused
-        history_text += f"User: {turn['user']}\nAssistant: {turn['assistant']}\n\n"
+    # Format conversation history: entities, summaries and the last turns with shortened answers, within the
+    # memory's token budget (see conversation_memory.py)
+    history_text = prompt_text(conversation_history)
 
     prompt = f"""Previous conversation:
         {history_text}
@@ -106,18 +170,24 @@ def rewrite_query(current_query, conversation_history):
         Rewritten question:"""
 
     # Call Ollama - Just Ollama because it doesn't need context from the database to rewrite the query
-    response = requests.post(
-        "http://localhost:11434/api/generate",
-        json={
-            "model": "llama3.2",  # or whatever model is being used
-            "prompt": prompt,
-            "stream": False,
-            "temperature": 0.1  # Low temp for consistent rewrites
-        }
-    )
-
-    result = response.json()
+    try:
+        with TRACER.span("rewrite_query") as span:
+            result = ollama_client.generate(
+                prompt,
+                model="llama3.2",  # or whatever model is being used
+                options={"temperature": 0.1},  # Low temp for consistent rewrites
+                timeout=REWRITE_TIMEOUT,
+            )
+            span.update(generation_stats(result))
+        if metrics is not None:
+            metrics["rewrite_prompt_tokens"] = result.get("prompt_eval_count")
+            note_cold_start(metrics, result)
+    except requests.RequestException as e:
+        print(f"Query rewrite failed ({e}), using the original query")
+        return current_query
     rewritten = result['response'].strip()
+    if not rewritten:
+        return current_query
 
     # Clean up common issues
     if rewritten.startswith('"') and rewritten.endswith('"'):
@@ -130,56 +200,77 @@ def rewrite_query(current_query, conversation_history):
 def needs_rewriting(query):
     """
     Check if query contains pronouns or is a follow-up question
+
+    Whole words only, so "with" does not count as "it" and "this" does not count as "his"
     """
-    pronouns = ["their", "his", "her", "its", "them", "they", "he", "she", "it"]
-    follow_up_words = ["also", "too", "as well", "what about"]
+    return has_pronoun(query) or is_follow_up(query)
 
-    query_lower = query.lower()
 
-    # Check for pronouns
-    if any(pronoun in query_lower for pronoun in pronouns):
-        return True
+def resolve_query(user_query, conversation_history, knowledge, metrics=None):
+    """
+    Make a follow-up question standalone, as cheaply as possible
+
+    1. Questions that do not need it are left alone
+    2. query_rewriter.resolve_locally() replaces pronouns with what the earlier turns were about
+    3. Otherwise llama3.2 rewrites it (rewrite_query). Meanwhile the original question is already searched, and those
+       results are used if the rewrite routes to the same mode and is at least REUSE_SIMILARITY similar
 
-    # Check for follow-up indicators
-    if any(word in query_lower for word in follow_up_words):
-        return True
+    metrics (optional dict) gets rewrite (none, local or llm), and for llm rewrites rewrite_seconds,
+    rewrite_prompt_tokens and speculation (used or discarded)
 
-    return False
+    Returns:
+        (standalone query, the retrieved chunks if they can be reused, otherwise None)
+    """
+    metrics = metrics if metrics is not None else {}
+    with TRACER.span("needs_rewriting") as span:
+        needed = bool(conversation_history) and needs_rewriting(user_query)
+        span["needed"] = needed
+    if not needed:
+        metrics["rewrite"] = "none"
+        return user_query, None
+
+    print(f"Original query: {user_query}")
+    with TRACER.span("resolve_locally") as span:
+        rewritten = resolve_locally(user_query, conversation_history)
+        span["resolved"] = rewritten is not None
+    if rewritten is not None:
+        metrics["rewrite"] = "local"
+        print(f"Rewritten query: {rewritten}")
+        return rewritten, None
+
+    metrics["rewrite"] = "llm"
+    q, prompt_mode, mode, temp, a = route_query(user_query, announce=False)
+    search = SPECULATIVE_SEARCHES.submit(TRACER.bind(retrieve), knowledge, q, prompt_mode, a, speculative=True)
+    start = time.perf_counter()
+    rewritten = rewrite_query(user_query, conversation_history, metrics)
+    metrics["rewrite_seconds"] = time.perf_counter() - start
+    print(f"Rewritten query: {rewritten}")
+
+    if route_query(rewritten, announce=False)[1] == prompt_mode and similarity(user_query, rewritten) >= REUSE_SIMILARITY:
+        try:
+            objects = search.result()
+        except Exception as e:   # The real search runs again below
+            print(f"Speculative search failed: {e}")
+        else:
+            metrics["speculation"] = "used"
+            return rewritten, objects
+    search.cancel()
+    metrics["speculation"] = "discarded"
+    return rewritten, None
 
 
 
 #---RETRIEVAL AUGEMENTED GENERATION-------------------------------------------------------------------------------------
 
-client = weaviate.connect_to_local(
-    # port=8080,
-    # grpc_port=50051,
-    additional_config=AdditionalConfig(
-        timeout=Timeout(init=30, query=60, insert=120)  # Values in seconds
-    )
-)
-
-# Initialize conversation storage
-conversation_history = []
-def chat(user_query):
+def route_query(user_query, announce=True):
     """
-    Main chat function with memory
+    Keyword Router
 
-    Args:
-        user_query: The user's current question
-        prompt_modes: List of string prompts that determine the mode of the bot
+    announce=False does not print the mode, for routing a question only to look ahead
 
     Returns:
-        answer: the chatbots response
+        (lowercased query, prompt mode name, prompt, temperature, hybrid search alpha)
     """
-
-    answer = None
-    # Step 1: Check if we need to rewrite
-    if conversation_history and needs_rewriting(user_query):
-        print(f"Original query: {user_query}")
-        user_query = rewrite_query(user_query, conversation_history)
-        print(f"Rewritten query: {user_query}")
-
-    # Keyword Router
     q = user_query
     q= q.lower()
     prompt_mode = ""
@@ -188,98 +279,384 @@ def chat(user_query):
         prompt_mode = "extract"
         temp = 0.01
         a = 0.05
-        print("MODE = EXTRACT")
+        if announce:
+            print("MODE = EXTRACT")
     elif any(k in q for k in ["who should", "who do i", "how do i"]):
         mode = get_guidance_prompt(q) # guidance
         prompt_mode = "guidance"
         temp = 0.2
         a = 0.25
-        print("MODE = GUIDANCE")
+        if announce:
+            print("MODE = GUIDANCE")
     else:
         mode = get_information_prompt(q) # information
         prompt_mode = "information"
         temp = 0.2
         a = 0.25
-        print("MODE = INFORMATION")
+        if announce:
+            print("MODE = INFORMATION")
 
+    return q, prompt_mode, mode, temp, a
 
-    # EXTRACT MODE
-    # needs specific information, therefore single_prompt is used instead of grouped_task so that information can be
-    # extracted exactly from a specific chunk and the correct URL associated with that specific chunk can be returned
-    if prompt_mode == "extract":
 
-        knowledge = client.collections.use("KnowledgeChunk")
-        print(knowledge.config.get())
-
-        response = knowledge.generate.hybrid(
-            query=q,
-            limit=3,
-            alpha=a,
-            single_prompt=mode,
-            generative_provider=GenerativeConfig.ollama(  # Configure the Ollama generative integration
-                api_endpoint="http://host.docker.internal:11434",  # If NOT using Docker you might need: http://ollama:11434
-                model="llama3.2",  # The model to use
-                temperature=temp,
-            ),
-        )
+def retrieve(knowledge, q, prompt_mode, a, speculative=False, vector=None):
+    """
+    The chunks chat() would search for: the top 3 for extract mode, the top 8 for the others
 
-        valid_response = False
-        # Find the first chunk that has a real answer
-        for obj in response.objects:
-            # print(json.dumps(obj.properties, indent=2))
-            # print(obj.generated)
-            if "not in my data" not in obj.generated:
-                answer = obj.generated # If the bot determines there is an appropriate response, this is it
-                valid_response=True
-                break
-        if valid_response == False:
-            answer = response.objects[0].generated # If no appropriate answer is found, this returns a "not found" response
+    speculative: Searched with the original question while it is being rewritten (only marks the trace span)
+    vector: The embedding of q if it was made already (AnswerCache.query_vector), otherwise the search embeds q
+    """
+    limit = 3 if prompt_mode == "extract" else 8
+    with TRACER.span("retrieve", mode=prompt_mode, limit=limit, alpha=a, speculative=speculative,
+                     embedded=vector is not None) as span:
+        objects = knowledge.query.hybrid(query=q, vector=vector, limit=limit, alpha=a,
+                                         return_properties=["url", "text"]).objects
+        span["chunks"] = len(objects)
+    return objects
 
 
-    # other prompt modes can use grouped_task to produce a response based on aggregated retrieval
-    else:
-        knowledge = client.collections.use("KnowledgeChunk")
-        print(knowledge.config.get())
-
-        response = knowledge.generate.hybrid(
-            query=q,
-            limit=8,
-            alpha=a,
-            grouped_task=mode,
-            generative_provider=GenerativeConfig.ollama(  # Configure the Ollama generative integration
-                api_endpoint="http://host.docker.internal:11434",  # If NOT using Docker you might need: http://ollama:11434
-                model="llama3.2",  # The model to use
-                temperature=temp
-            ),
-        )
-        answer = response.generative.text
+def grouped_prompt(task, passages):
+    """The task followed by the passages (dicts with url and text), like generate.hybrid(grouped_task=task) does"""
+    context = "\n\n".join(passage_text(passage["url"], passage["text"]) for passage in passages)
+    return f"{task}\n\nContext:\n{context}"
+
+
+def packed_prompt(task, objects, metrics=None):
+    """
+    grouped_prompt() for the retrieved chunks, packed into CONTEXT_TOKENS by context_packer.pack()
+
+    metrics (optional dict) gets context: the packing stats, including tokens_saved
+    """
+    passages, stats = pack(objects, CONTEXT_TOKENS)
+    print(f"Context: {stats['chunks']} chunks -> {stats['passages']} passages, "
+          f"{stats['tokens']} tokens ({stats['tokens_saved']} saved)")
+    if metrics is not None:
+        metrics["context"] = stats
+    return grouped_prompt(task, passages)
+
+
+def note_cold_start(metrics, result):
+    """Set metrics["cold_start"] if the Ollama call (its response dict) had to load its model first"""
+    metrics["cold_start"] = metrics.get("cold_start", False) or generation_stats(result).get("cold", False)
 
 
+def remember(conversation_history, user_query, answer):
     # Step 4: Store responses in conversation history
     conversation_history.append({
         "user": user_query,
-        "assistant": answer
+        "assistant": answer,
+        "entities": extract_entities(user_query),  # What the next turn's pronouns may refer to
     })
 
-    # Keep only last 5 turns to avoid context getting too long
-    if len(conversation_history) > 5:
+    # A ConversationMemory summarizes older turns itself, of a plain list keep only last 5 turns to avoid context
+    # getting too long
+    if not isinstance(conversation_history, ConversationMemory) and len(conversation_history) > MAX_HISTORY:
         conversation_history.pop(0)
 
+
+def connect(pool_size=20):
+    """
+    Weaviate client for chat(), one is enough for the whole process
+
+    Args:
+        pool_size: HTTP connections kept open to Weaviate, at least the number of turns answered at the same time
+    """
+    return weaviate.connect_to_local(
+        # port=8080,
+        # grpc_port=50051,
+        additional_config=AdditionalConfig(
+            connection=ConnectionConfig(session_pool_connections=pool_size, session_pool_maxsize=pool_size),
+            timeout=Timeout(init=30, query=60, insert=120)  # Values in seconds
+        )
+    )
+
+
+def extract_answer(knowledge, q, mode, temp, a, metrics=None, objects=None):
+    """
+    Run the extract prompt on each of the top chunks, the answer is the first one that found something
+
+    metrics (optional dict) gets extract_chunks: rank, status, seconds and Ollama's counts (prompt_tokens,
+    tokens_per_sec...) of each chunk's generation, and cold_start if one of them had to load llama3.2
+    objects: The top chunks if they were already retrieved (see resolve_query)
+    """
+    if EXTRACT_ENGINE.strategy != "weaviate":
+        if objects is None:
+            objects = retrieve(knowledge, q, "extract", a, vector=ANSWER_CACHE.query_vector("extract", q))
+        if not objects:
+            return NO_CHUNKS
+        timings = []
+        rank, answer = EXTRACT_ENGINE.run([fill_prompt(mode, obj.properties) for obj in objects],
+                                          options={"temperature": temp}, timings=timings, tracer=TRACER)
+        if metrics is not None:
+            metrics["extract_chunks"] = timings
+            # Like note_cold_start, for the generations of every chunk
+            metrics["cold_start"] = metrics.get("cold_start", False) or any(t.get("cold", False) for t in timings)
+        return answer
+
+    response = knowledge.generate.hybrid(
+        query=q,
+        limit=3,
+        alpha=a,
+        single_prompt=mode,
+        generative_provider=GenerativeConfig.ollama(  # Configure the Ollama generative integration
+            api_endpoint="http://host.docker.internal:11434",  # If NOT using Docker you might need: http://ollama:11434
+            model="llama3.2",  # The model to use
+            temperature=temp,
+        ),
+    )
+
+    valid_response = False
+    # Find the first chunk that has a real answer
+    for obj in response.objects:
+        # print(json.dumps(obj.properties, indent=2))
+        # print(obj.generated)
+        if "not in my data" not in obj.generated:
+            answer = obj.generated # If the bot determines there is an appropriate response, this is it
+            valid_response=True
+            break
+    if not response.objects:
+        return NO_CHUNKS
+    if valid_response == False:
+        answer = response.objects[0].generated # If no appropriate answer is found, this returns a "not found" response
+    return answer
+
+
+def answer_extract(knowledge, q, mode, temp, a, metrics=None, objects=None):
+    """
+    Extract mode answer: from the contact facts index if it has one, otherwise from the answer cache or the LLM
+    (extract_answer)
+    """
+    metrics = metrics if metrics is not None else {}
+    answer = CONTACT_FACTS.answer(q)
+    metrics["contact_facts"] = answer is not None
+    if answer is None:
+        answer = ANSWER_CACHE.get("extract", q, metrics)
+    if answer is None:
+        with TRACER.span("extract", strategy=EXTRACT_ENGINE.strategy) as span:
+            answer = extract_answer(knowledge, q, mode, temp, a, metrics, objects)
+            span["generations"] = len(metrics.get("extract_chunks", []))
+        ANSWER_CACHE.put("extract", q, answer)
+    return answer
+
+
+def chat(user_query, conversation_history, knowledge, metrics=None, objects=None):
+    """
+    Main chat function with memory
+
+    Args:
+        user_query: The user's current question
+        conversation_history: ConversationMemory (or list of dicts with 'user' and 'assistant' keys), this turn is
+                              added to it
+        knowledge: The KnowledgeChunk collection (client.collections.use(COLLECTION))
+        metrics: Optional dict, gets the mode, how the query was rewritten (see resolve_query), answer_cache (see
+                 AnswerCache.get), in extract mode contact_facts (True if answered from the index) and
+                 extract_chunks (see extract_answer), otherwise context (see packed_prompt) and prompt_tokens
+                 (counted by Ollama), cold_start (see note_cold_start) and trace_id when tracing is on
+        objects: The chunks retrieve() found for user_query if they were searched for already (batch_questions.py
+                 searches once for identical questions), only used when the question is not rewritten
+
+    Returns:
+        answer: the chatbots response
+    """
+    metrics = metrics if metrics is not None else {}
+    with TRACER.span("turn", stream=False) as turn:
+        if turn.trace_id:
+            metrics["trace_id"] = turn.trace_id
+        answer = None
+        # Step 1: Check if we need to rewrite
+        original = user_query
+        user_query, found = resolve_query(user_query, conversation_history, knowledge, metrics)
+        if found is not None or user_query != original:
+            objects = found
+
+        q, prompt_mode, mode, temp, a = route_query(user_query)
+        metrics["mode"] = prompt_mode
+
+        # EXTRACT MODE
+        # needs specific information, therefore single_prompt is used instead of grouped_task so that information can
+        # be extracted exactly from a specific chunk and the correct URL associated with that specific chunk can be
+        # returned
+        if prompt_mode == "extract":
+            answer = answer_extract(knowledge, q, mode, temp, a, metrics, objects)
+
+
+        # other prompt modes produce a response based on aggregated retrieval, like grouped_task does. The chunks are
+        # packed first (see packed_prompt), so the prompt is generated with Ollama directly instead of generate.hybrid
+        else:
+            answer = ANSWER_CACHE.get(prompt_mode, q, metrics)
+            if answer is None:
+                if objects is None:
+                    objects = retrieve(knowledge, q, prompt_mode, a, vector=ANSWER_CACHE.query_vector(prompt_mode, q))
+                prompt = packed_prompt(mode, objects, metrics)
+                with TRACER.span("generate", mode=prompt_mode, stream=False) as span:
+                    result = ollama_client.generate(prompt, model="llama3.2", options={"temperature": temp})
+                    span.update(generation_stats(result))
+                answer = result["response"]
+                metrics["prompt_tokens"] = result.get("prompt_eval_count")
+                note_cold_start(metrics, result)
+                ANSWER_CACHE.put(prompt_mode, q, answer)
+
+
+        remember(conversation_history, user_query, answer)
+        turn["metrics"] = dict(metrics)
     return answer
 
 
+def chat_stream(user_query, conversation_history, knowledge, metrics=None):
+    """
+    Like chat(), but yields the answer in pieces as Ollama generates it
 
+    Args:
+        user_query: The user's current question
+        conversation_history: ConversationMemory (or list of dicts with 'user' and 'assistant' keys), this turn is
+                              added to it
+        knowledge: The KnowledgeChunk collection
+        metrics: Optional dict, filled with mode, rewrite (see resolve_query), answer_cache, retrieval_seconds,
+                 context (see packed_prompt), first_token_seconds (time to first token, counted from the start of the turn),
+                 total_seconds, prompt_tokens, tokens and tokens_per_sec, cold_start (see note_cold_start) and
+                 trace_id when tracing is on
+    """
+    metrics = metrics if metrics is not None else {}
+    with TRACER.span("turn", stream=True) as turn:
+        if turn.trace_id:
+            metrics["trace_id"] = turn.trace_id
+        try:
+            yield from stream_turn(user_query, conversation_history, knowledge, metrics)
+        finally:
+            turn["metrics"] = dict(metrics)
 
 
+def stream_turn(user_query, conversation_history, knowledge, metrics):
+    """The body of chat_stream(), inside its turn span"""
+    start = time.perf_counter()
 
-# Test unlimited convo
-test = ""
-while test != "end":
-    print("=" * 50)
-    test = input()
-    print(chat(test))
+    user_query, objects = resolve_query(user_query, conversation_history, knowledge, metrics)
 
-client.close()  # Free up resources
+    q, prompt_mode, mode, temp, a = route_query(user_query)
+    metrics["mode"] = prompt_mode
+    if prompt_mode == "extract":
+        # One short answer picked from several generations, nothing to stream
+        answer = answer_extract(knowledge, q, mode, temp, a, metrics, objects)
+        metrics["first_token_seconds"] = metrics["total_seconds"] = time.perf_counter() - start
+        remember(conversation_history, user_query, answer)
+        yield answer
+        return
+
+    answer = ANSWER_CACHE.get(prompt_mode, q, metrics)
+    if answer is not None:
+        metrics["first_token_seconds"] = metrics["total_seconds"] = time.perf_counter() - start
+        remember(conversation_history, user_query, answer)
+        yield answer
+        return
+
+    if objects is None:
+        objects = retrieve(knowledge, q, prompt_mode, a, vector=ANSWER_CACHE.query_vector(prompt_mode, q))
+    metrics["retrieval_seconds"] = time.perf_counter() - start
+
+    pieces = []
+    prompt = packed_prompt(mode, objects, metrics)
+    with TRACER.span("generate", mode=prompt_mode, stream=True) as span:
+        for part in ollama_client.generate_stream(prompt, model="llama3.2", options={"temperature": temp}):
+            if part["response"]:
+                if not pieces:
+                    metrics["first_token_seconds"] = time.perf_counter() - start
+                    span["first_token_seconds"] = metrics["first_token_seconds"]
+                pieces.append(part["response"])
+                yield part["response"]
+            if part.get("done"):
+                metrics["prompt_tokens"] = part.get("prompt_eval_count")
+                metrics["tokens"] = part.get("eval_count", 0)
+                if part.get("eval_duration"):
+                    metrics["tokens_per_sec"] = part["eval_count"] / (part["eval_duration"] / 1e9)
+                note_cold_start(metrics, part)
+                span.update(generation_stats(part))
+                span["cold_start"] = metrics["cold_start"]   # Of the whole turn, the rewrite may have loaded llama3.2
+    metrics["total_seconds"] = time.perf_counter() - start
+
+    answer = "".join(pieces)
+    ANSWER_CACHE.put(prompt_mode, q, answer)
+    remember(conversation_history, user_query, answer)
+
+
+
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stream", action="store_true", help="print answers word by word as they are generated")
+    parser.add_argument("--extract-strategy", choices=STRATEGIES, default=EXTRACT_ENGINE.strategy,
+                        help="how extract mode runs the generations for the top chunks (see extract_engine.py)")
+    parser.add_argument("--context-tokens", type=int, default=CONTEXT_TOKENS,
+                        help="token budget for the chunks in guidance and information prompts (see context_packer.py)")
+    parser.add_argument("--answer-cache-size", type=int, default=ANSWER_CACHE_SIZE,
+                        help="answers kept for repeated questions, 0 for none (see answer_cache.py)")
+    parser.add_argument("--backend", choices=["weaviate", "local"], default="weaviate",
+                        help="search Weaviate, or the in-process index built by local_index.py")
+    parser.add_argument("--local-index", default=INDEX_DIR, help="directory of the local index")
+    parser.add_argument("--trace", help="JSONL file to write the steps of every turn to (see tracing.py)")
+    parser.add_argument("--memory-tokens", type=int, default=MEMORY_TOKENS,
+                        help="token budget for the conversation in rewrite prompts (see conversation_memory.py)")
+    parser.add_argument("--session", help="name of a conversation to continue and save after every turn")
+    parser.add_argument("--sessions-db", default=SESSIONS_DB, help="SQLite file --session is saved in")
+    parser.add_argument("--keep-alive", default=KEEP_ALIVE,
+                        help="how long Ollama keeps the models loaded after a request, e.g. 30m (see model_warmup.py)")
+    parser.add_argument("--no-warmup", action="store_true", help="don't load the models at startup or keep them loaded")
+    args = parser.parse_args()
+    EXTRACT_ENGINE = ExtractEngine(args.extract_strategy)
+    CONTEXT_TOKENS = args.context_tokens
+    ANSWER_CACHE = AnswerCache(args.answer_cache_size)
+    TRACER = Tracer(args.trace)
+
+    client = None
+    if args.backend == "local":
+        knowledge = LocalKnowledge(args.local_index)
+    else:
+        client = connect()
+        knowledge = client.collections.use(COLLECTION)
+    print(knowledge.config.get())  # Once, not on every turn
+
+    warmer = None
+    if not args.no_warmup:
+        ollama_client.KEEP_ALIVE = args.keep_alive
+        warmer = ModelWarmer(keep_alive=args.keep_alive)
+        for model, seconds in warmer.start().items():
+            if seconds is not None:
+                print(f"{model} loaded ({seconds:.1f}s), kept for {args.keep_alive}")
+
+    # Test unlimited convo
+    sessions = None
+    conversation_history = None
+    if args.session:
+        sessions = SessionDB(args.sessions_db, budget=args.memory_tokens)
+        conversation_history = sessions.load(args.session)
+        if conversation_history is not None:
+            print(f"Continuing session {args.session} ({conversation_history.count} turns so far)")
+    if conversation_history is None:
+        conversation_history = ConversationMemory(budget=args.memory_tokens)
+    test = ""
+    while test != "end":
+        print("=" * 50)
+        test = input()
+        if args.stream:
+            metrics = {}
+            for piece in chat_stream(test, conversation_history, knowledge, metrics):
+                print(piece, end="", flush=True)
+            print(f"\n(first words after {metrics['first_token_seconds']:.2f}s, "
+                  f"answer complete after {metrics['total_seconds']:.2f}s"
+                  f"{', a model had to be loaded' if metrics.get('cold_start') else ''})")
+        else:
+            print(chat(test, conversation_history, knowledge))
+        if sessions is not None:
+            sessions.save(args.session, conversation_history)
+
+    if sessions is not None:
+        sessions.close()
+    if warmer is not None:
+        warmer.stop()
+    if client is not None:
+        client.close()  # Free up resources
+    TRACER.close()
 
 
 
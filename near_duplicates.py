@@ -0,0 +1,132 @@
+
+# Near-duplicate detection for pages and chunks, used by Clean_raw_text.py and Chunk_cleaned_text.py
+# with --near-dup-threshold
+
+# Exact duplicate removal misses pages that only differ in a date, a breadcrumb or a session ID.
+# Here every text gets a MinHash signature (made from its overlapping 5 word "shingles"). Two signatures agree in
+# roughly the same share of positions as the two texts share shingles (their Jaccard similarity).
+# Signatures are split into bands and indexed (locality sensitive hashing), so only texts sharing a band are
+# compared instead of every pair - a lookup stays fast however many texts have been added.
+
+import json
+import re
+import zlib
+import random
+
+NUM_PERM = 64                 # Signature length, more is more accurate but slower
+SHINGLE_SIZE = 5              # Words per shingle
+DEFAULT_THRESHOLD = 0.9       # Estimated Jaccard similarity above which texts count as duplicates
+REPORT_FILE = "near_duplicates_report.json"
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Set of 32 bit hashes of the overlapping word n-grams in text"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def choose_bands(threshold, num_perm):
+    """Bands x rows = num_perm, picked so texts at about the threshold similarity start to share a band"""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH index of texts
+
+    Args:
+        threshold: Estimated Jaccard similarity (0-1) at or above which a text is a duplicate of one already added
+        num_perm: MinHash signature length
+        seed: Seed for the hash permutations - the same seed always gives the same signatures
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self.perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self.bands, self.rows = choose_bands(threshold, num_perm)
+        self.buckets = [{} for _ in range(self.bands)]
+        self.signatures = {}
+        self.clusters = {}  # key kept -> [(duplicate key, similarity), ...]
+
+    def signature(self, text):
+        hashes = shingles(text)
+        if not hashes:
+            return None
+        return tuple(min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in self.perms)
+
+    def similarity(self, sig_a, sig_b):
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / self.num_perm
+
+    def add(self, key, text):
+        """
+        Add text unless it is a near duplicate
+
+        Returns:
+            (key of the text it duplicates, similarity) or None if it is new and was added
+        """
+        sig = self.signature(text)
+        if sig is None:
+            return None
+
+        band_keys = [sig[i * self.rows:(i + 1) * self.rows] for i in range(self.bands)]
+        checked = set()
+        for bucket, band_key in zip(self.buckets, band_keys):
+            for candidate in bucket.get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                similarity = self.similarity(sig, self.signatures[candidate])
+                if similarity >= self.threshold:
+                    self.clusters.setdefault(candidate, []).append((key, similarity))
+                    return candidate, similarity
+
+        self.signatures[key] = sig
+        for bucket, band_key in zip(self.buckets, band_keys):
+            bucket.setdefault(band_key, []).append(key)
+        return None
+
+    def report(self):
+        """Clusters of removed texts, biggest first"""
+        clusters = [
+            {"kept": kept, "removed": [{"key": key, "similarity": round(sim, 3)} for key, sim in removed]}
+            for kept, removed in self.clusters.items()
+        ]
+        return sorted(clusters, key=lambda cluster: -len(cluster["removed"]))
+
+
+def drop_near_duplicates(records, index, key="url", stats=None):
+    """Yield the records whose text is not a near duplicate of an earlier record's text"""
+    stats = stats if stats is not None else {}
+    stats["near_duplicates"] = 0
+    for record in records:
+        if index.add(record[key], record["text"]) is None:
+            yield record
+        else:
+            stats["near_duplicates"] += 1
+
+
+def save_report(index, path=REPORT_FILE, level="page"):
+    """Write the removed clusters to the report file, one section per level (page, chunk)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        report = {}
+    report[level] = {"threshold": index.threshold, "clusters": index.report()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
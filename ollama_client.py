@@ -0,0 +1,104 @@
+
+# Calls straight to Ollama (not through Weaviate), sharing one pooled requests session
+# so connections to Ollama are kept alive between calls
+# KEEP_ALIVE, when set, is sent with every request: how long Ollama keeps the model loaded afterwards (see model_warmup.py)
+
+# Install these packages: pip install requests
+
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OLLAMA_URL = "http://localhost:11434"   # Ollama on this machine - Weaviate in Docker reaches it at host.docker.internal
+EMBED_MODEL = "nomic-embed-text"
+LLM_MODEL = "llama3.2"
+TIMEOUT = 120  # Seconds
+KEEP_ALIVE = None   # e.g. "30m", None leaves it to Ollama (5 minutes unless OLLAMA_KEEP_ALIVE says otherwise)
+
+_session = None
+
+def get_session():
+    """The shared session, created on first use"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def with_keep_alive(body, keep_alive=None):
+    keep_alive = KEEP_ALIVE if keep_alive is None else keep_alive
+    if keep_alive is not None:
+        body["keep_alive"] = keep_alive
+    return body
+
+
+def keep_alive_seconds(keep_alive):
+    """Seconds a keep_alive value stands for: a number of seconds or a duration like "30m", negative is forever"""
+    if isinstance(keep_alive, str):
+        units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        unit = next((u for u in ("ms", "s", "m", "h") if keep_alive.endswith(u)), None)
+        seconds = float(keep_alive[:-len(unit)]) * units[unit] if unit else float(keep_alive)
+    else:
+        seconds = float(keep_alive)
+    return float("inf") if seconds < 0 else seconds
+
+
+def embed(texts, model=EMBED_MODEL, base_url=None, keep_alive=None):
+    """Embed a list of texts with one request to Ollama's /api/embed, returns one vector per text"""
+    return embed_response(texts, model, base_url, keep_alive)["embeddings"]
+
+
+def embed_response(texts, model=EMBED_MODEL, base_url=None, keep_alive=None):
+    """Like embed(), but returns the whole response dict (embeddings, load_duration...)"""
+    response = get_session().post(
+        f"{base_url or OLLAMA_URL}/api/embed",
+        json=with_keep_alive({"model": model, "input": list(texts)}, keep_alive),
+        timeout=TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def generate(prompt, model=LLM_MODEL, options=None, base_url=None, timeout=TIMEOUT, keep_alive=None):
+    """
+    One complete (not streamed) answer from Ollama's /api/generate, returns the response dict
+
+    An empty prompt only loads the model
+    """
+    response = get_session().post(
+        f"{base_url or OLLAMA_URL}/api/generate",
+        json=with_keep_alive({"model": model, "prompt": prompt, "stream": False, "options": options or {}}, keep_alive),
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def generate_stream(prompt, model=LLM_MODEL, options=None, base_url=None, timeout=TIMEOUT):
+    """
+    Stream an answer from Ollama's /api/generate
+
+    Yields the response dicts as they arrive, each with the next piece of text in "response".
+    The last one has "done": True and Ollama's counts and timings (eval_count, eval_duration...)
+    """
+    with get_session().post(
+        f"{base_url or OLLAMA_URL}/api/generate",
+        json=with_keep_alive({"model": model, "prompt": prompt, "stream": True, "options": options or {}}),
+        timeout=timeout,
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def running_models(base_url=None):
+    """The models Ollama has loaded (GET /api/ps): dicts with name, expires_at (ISO 8601), size_vram..."""
+    response = get_session().get(f"{base_url or OLLAMA_URL}/api/ps", timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json().get("models", [])
@@ -0,0 +1,39 @@
+
+# Reading and writing the files passed between the pipeline steps (crawl, clean, chunk, import)
+
+# Files ending in .jsonl have one JSON record per line. They are read and written one record at a time,
+# so a step never needs the whole file in memory and records can be passed straight on to the next step.
+# Files ending in .json hold one JSON list, like the pages.json files the scripts have always used.
+
+import json
+
+
+def read_records(path):
+    """Yield the records in a .jsonl or .json file"""
+    if str(path).endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def write_records(path, records):
+    """Write records (any iterable, including a generator) to a .jsonl or .json file, returns how many were written"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        if str(path).endswith(".jsonl"):
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        else:
+            # Same layout as json.dump(..., indent=2), but written one record at a time
+            f.write("[")
+            for record in records:
+                item = json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+                f.write(("," if count else "") + "\n  " + item)
+                count += 1
+            f.write("\n]" if count else "]")
+    return count
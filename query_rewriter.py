@@ -0,0 +1,144 @@
+
+# Cheap query rewriting for multi_turn_RAG_conversation.py
+
+# Follow-up questions ("what are their opening hours?") need the thing they refer to before they can be searched.
+# Asking llama3.2 to rewrite them costs a full LLM call, so simple cases are resolved here first:
+#   - every turn remembers the entities it talked about (the billing office, Springfield Campus...)
+#   - it, its, they, them and their (matched as whole words, so "with" does not count) are replaced by the latest
+#     entity. That is an office, a place or a topic, never a person, so he, she, him, his and her go to the LLM
+#   - "also", "too" and "as well" mark a follow-up only at the end of the question ("... parking too?", not "too high")
+#   - "what about admissions?" repeats the previous question with the new entity
+# Only when none of that works does chat() fall back to the LLM (rewrite_query).
+
+import re
+
+PRONOUNS = {
+    "possessive": ["their", "its"],
+    "subject": ["they", "them", "it"],
+    "personal": ["he", "him", "his", "she", "her"],   # Always rewritten by the LLM
+}
+FOLLOW_UP_WORDS = ["what about", "how about"]
+ENDING_FOLLOW_UP_WORDS = ["also", "too", "as well"]   # Only a follow-up at the end of the question
+MAX_PRONOUNS = 2   # More than this and it is not clear they all mean the same thing, leave it to the LLM
+
+_POSSESSIVE_RE = re.compile(r"\b(?:" + "|".join(PRONOUNS["possessive"]) + r")\b(?=\s+\w)", re.IGNORECASE)
+_PRONOUN_RE = re.compile(r"\b(?:" + "|".join(sum(PRONOUNS.values(), [])) + r")\b", re.IGNORECASE)
+_LOCAL_PRONOUN_RE = re.compile(r"\b(?:" + "|".join(PRONOUNS["possessive"] + PRONOUNS["subject"]) + r")\b",
+                               re.IGNORECASE)
+_PERSONAL_RE = re.compile(r"\b(?:" + "|".join(PRONOUNS["personal"]) + r")\b", re.IGNORECASE)
+_ENDING = r"\b(?:" + "|".join(w.replace(" ", r"\s+") for w in ENDING_FOLLOW_UP_WORDS) + r")\b(?=\s*[?.!]*\s*$)"
+_FOLLOW_UP_RE = re.compile(r"\b(?:" + "|".join(w.replace(" ", r"\s+") for w in FOLLOW_UP_WORDS) + r")\b|" + _ENDING,
+                           re.IGNORECASE)
+_WHAT_ABOUT_RE = re.compile(r"^\s*(?:and\s+)?(?:what|how)\s+about\s+(.+?)\s*[?.!]*\s*$", re.IGNORECASE)
+# "which of them ..." picks from a group named earlier, not from the latest entity
+_PARTITIVE_RE = re.compile(r"\b(?:which|any|all|some|each|none|one|many|most|both)\s+of\s+(?:them|their)\b",
+                           re.IGNORECASE)
+_ALSO_RE = re.compile(r"\s*" + _ENDING, re.IGNORECASE)
+
+_STOP = r"(?:for|of|about|at|in|from|with|on|to|and|or|is|are|do|does|the|a|an)"
+_VERBS = r"(?:have|has|offer|offers|provide|provides|accept|need|require|allow|cost|charge|open|close|take|get|do)"
+# "... for the billing office?" - the words after the last preposition
+_AFTER_PREPOSITION_RE = re.compile(
+    r"\b(?:for|of|about|at|in|from|with|on)\s+((?:the\s+|a\s+|an\s+)?(?:(?!" + _STOP + r"\b)[\w'&-]+\s*){1,4})",
+    re.IGNORECASE,
+)
+# "does the company offer ..." - the subject of a question
+_SUBJECT_RE = re.compile(
+    r"\b(?:does|do|did|can|will|has|have)\s+(the\s+[\w'&-]+(?:\s+(?!(?:" + _STOP + "|" + _VERBS + r")\b)[\w'&-]+)?)\s+\w+",
+    re.IGNORECASE,
+)
+# Names written with capitals in the middle of a sentence, e.g. Springfield Campus
+_NAME_RE = re.compile(r"(?<![.?!]\s)(?<!^)\b[A-Z][\w&-]*(?:\s+[A-Z][\w&-]*)*")
+
+_CONTENT_WORDS_STOP = set("""a an and are be can could do does for from how i in is it me my of on or our please
+tell the their them they to what when where which who why will with you your""".split())
+
+
+def has_pronoun(query):
+    return _PRONOUN_RE.search(query) is not None
+
+
+def is_follow_up(query):
+    return _FOLLOW_UP_RE.search(query) is not None
+
+
+def extract_entities(text):
+    """Things a question is about, most specific first"""
+    entities = []
+    for match in _NAME_RE.finditer(text):
+        name = match.group().strip()
+        if name.lower() not in _CONTENT_WORDS_STOP and name not in entities:
+            entities.append(name)
+    for pattern in (_AFTER_PREPOSITION_RE, _SUBJECT_RE):
+        matches = list(pattern.finditer(text))
+        if matches:
+            phrase = matches[-1].group(1).strip(" ?.!,")
+            if phrase and not _PRONOUN_RE.fullmatch(phrase) and phrase not in entities:
+                entities.append(phrase)
+    return entities
+
+
+def possessive(entity):
+    return entity + ("'" if entity.endswith("s") else "'s")
+
+
+def latest_entity(conversation_history):
+    for turn in reversed(conversation_history):
+        entities = turn.get("entities")
+        if entities is None:
+            entities = extract_entities(turn["user"])
+        if entities:
+            return entities[0]
+    # A ConversationMemory also remembers the entities of the turns it summarized
+    tracked = getattr(conversation_history, "entities", None)
+    return tracked[0] if tracked else None
+
+
+def resolve_locally(query, conversation_history):
+    """
+    Rewrite a follow-up question using the entities of earlier turns, without an LLM
+
+    Returns:
+        The standalone question, or None if it could not be done with confidence
+    """
+    entity = latest_entity(conversation_history)
+    if entity is None:
+        return None
+
+    what_about = _WHAT_ABOUT_RE.match(query)
+    if what_about:
+        # Ask the previous question again about something else
+        previous = conversation_history[-1]["user"]
+        if entity not in previous:
+            return None
+        return re.sub(re.escape(possessive(entity)) + "|" + re.escape(entity),
+                      lambda m: possessive(what_about.group(1)) if m.group() != entity else what_about.group(1),
+                      previous, count=1)
+
+    if _PERSONAL_RE.search(query):
+        return None
+    pronouns = _LOCAL_PRONOUN_RE.findall(query)
+    if len(pronouns) > MAX_PRONOUNS or _PARTITIVE_RE.search(query):
+        return None
+    if pronouns:
+        resolved = _POSSESSIVE_RE.sub(lambda m: possessive(entity), query)
+        return _LOCAL_PRONOUN_RE.sub(entity, resolved)
+
+    if is_follow_up(query):
+        if extract_entities(query):
+            return _ALSO_RE.sub("", query)   # Names its own subject, the "also" does not matter for the search
+        stripped = _ALSO_RE.sub("", query).rstrip(" ?.!")
+        return f"{stripped} for {entity}?"
+    return None
+
+
+def content_words(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower())) - _CONTENT_WORDS_STOP
+
+
+def similarity(a, b):
+    """Share of content words two questions have in common (0-1)"""
+    words_a, words_b = content_words(a), content_words(b)
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
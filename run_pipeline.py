@@ -0,0 +1,116 @@
+
+# Runs the data preparation steps in one process: crawl -> clean -> chunk -> import
+# Each page is passed from one step to the next as soon as it is ready, no intermediate files are written.
+# While one page is being imported, the next pages are still being crawled.
+
+#   python run_pipeline.py                                  crawl BASE_URL (set in Website_crawl_scrape.py) and import
+#   python run_pipeline.py --input crawl_log.jsonl          start from a crawl log or pages file instead of crawling
+#   python run_pipeline.py --output chunked_pages.jsonl     write the chunks to a file instead of importing them
+
+#   python run_pipeline.py --incremental --sync             only crawl, embed and update what changed on the website
+
+# The KnowledgeChunk collection must already exist (create_knowledge_chunks_collection.py) unless --output is used
+
+import argparse
+
+import Website_crawl_scrape as crawler
+from Clean_raw_text import clean_pages, drop_duplicates
+from Chunk_cleaned_text import chunk_pages
+from contact_facts import CONTACT_FACTS_FILE, ContactFacts
+from near_duplicates import NearDuplicateIndex, REPORT_FILE, drop_near_duplicates, save_report
+from pipeline_io import read_records, write_records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", help="pages file (.json or .jsonl) to use instead of crawling")
+    parser.add_argument("--output", help="chunks file (.json or .jsonl) to write instead of importing into Weaviate")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"only process pages that changed since the crawl recorded in {crawler.MANIFEST_FILE}")
+    parser.add_argument("--near-dup-threshold", type=float,
+                        help="drop pages and chunks at least this similar (0-1) to an earlier one, e.g. 0.9")
+    parser.add_argument("--sync", action="store_true",
+                        help="only send new/changed chunks to Weaviate and delete the ones that are gone")
+    parser.add_argument("--client-embed", action="store_true",
+                        help="embed in batches here, with the on-disk vector cache, instead of in Weaviate")
+    args = parser.parse_args()
+
+    manifest = None
+    crawl_stats = {}
+    if args.input:
+        pages = read_records(args.input)
+    else:
+        manifest = crawler.load_manifest() if args.incremental else {}
+        pages = crawler.crawl(crawler.BASE_URL, crawl_stats, manifest=manifest)
+
+    # Pages removed from the website are dropped by clean_pages, note them first for --sync
+    removed_urls = []
+    def note_removed(pages):
+        for page in pages:
+            if page.get("status") == "removed":
+                removed_urls.append(page["url"])
+            yield page
+
+    clean_stats = {}
+    chunk_stats = {}
+    pages = drop_duplicates(clean_pages(note_removed(pages)), clean_stats)
+    if args.near_dup_threshold:
+        page_index = NearDuplicateIndex(args.near_dup_threshold)
+        chunk_index = NearDuplicateIndex(args.near_dup_threshold)
+        pages = drop_near_duplicates(pages, page_index, key="url", stats=clean_stats)
+    chunks = chunk_pages(pages)
+    if args.near_dup_threshold:
+        chunks = drop_near_duplicates(chunks, chunk_index, key="chunk_id", stats=chunk_stats)
+    # An incremental crawl only has the changed pages, so the facts of the other pages are kept
+    partial = args.incremental and not args.input
+    facts = ContactFacts.load() if partial else ContactFacts()
+    chunks = facts.collect(chunks)
+
+    if args.output:
+        count = write_records(args.output, chunks)
+        print(f"✅ Wrote {count} chunks to {args.output}")
+    else:
+        import weaviate
+        from import_knowledge_chunks_data import import_chunks, sync_chunks
+
+        embedder = None
+        if args.client_embed:
+            from vector_cache import CachedEmbedder, VectorCache
+            embedder = CachedEmbedder(VectorCache())
+
+        client = weaviate.connect_to_local()
+        try:
+            knowledge_chunks = client.collections.use("KnowledgeChunk")
+            if args.sync:
+                # A full crawl or input file is the whole corpus, an incremental crawl only holds the changes
+                sync_stats = sync_chunks(knowledge_chunks, chunks, removed_urls if partial else None, embedder)
+            else:
+                count = import_chunks(knowledge_chunks, chunks, embedder)
+        finally:
+            client.close()
+        if args.sync:
+            print(f"✅ Synced KnowledgeChunk: {sync_stats['new']} new, {sync_stats['changed']} changed, "
+                  f"{sync_stats['unchanged']} unchanged (embedding calls saved), {sync_stats['deleted']} deleted"
+                  + (f", {sync_stats['kept_for_retry']} old objects kept until their replacements import"
+                     if sync_stats["kept_for_retry"] else ""))
+        else:
+            print(f"✅ Imported {count} chunks into KnowledgeChunk")
+        if embedder is not None:
+            print(f"🧮 {embedder.hits} vectors from the cache, {embedder.embedded} embedded in {embedder.calls} calls")
+
+    facts.forget_urls(removed_urls)
+    facts.save()
+    print(f"📇 {len(facts)} contact facts in {CONTACT_FACTS_FILE}")
+    print(f"🧹 Removed {clean_stats.get('duplicates', 0)} duplicate pages")
+    if args.near_dup_threshold:
+        save_report(page_index, level="page")
+        save_report(chunk_index, level="chunk")
+        print(f"🧹 Removed {clean_stats['near_duplicates']} near duplicate pages and "
+              f"{chunk_stats['near_duplicates']} near duplicate chunks (clusters in {REPORT_FILE})")
+    if manifest is not None:
+        crawler.save_manifest(manifest)
+        print(f"🌐 Crawled {crawl_stats['pages']} pages ({crawl_stats['pages_per_sec']:.1f} pages/sec)")
+
+
+if __name__ == "__main__":
+    main()
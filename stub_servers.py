@@ -0,0 +1,587 @@
+
+# Local stand-ins for the services the scripts talk to, for benchmarks and for trying things without a GPU
+# Nothing here is used when the chatbot runs normally
+
+#   server = serve_stub_ollama(latency=0.05)      # then point ollama_client.OLLAMA_URL at stub_url(server)
+#   ...
+#   server.shutdown()
+
+# The stub Ollama answers /api/embed with made up but repeatable vectors (the same text always gets the same vector)
+# and /api/generate with made up words, and counts every request so tests can check how many calls were made.
+# Extract prompts (the ones offering "not in my data") get that reply for a share of prompts (not_found_rate).
+# With load_latency, a request for a model that isn't loaded waits that long first, like Ollama loading it, and the
+# model stays loaded for the request's keep_alive (GET /api/ps lists the loaded models).
+# StubKnowledge stands in for the KnowledgeChunk collection in multi_turn_RAG_conversation.chat(): it searches
+# chunks held in memory and generates through the stub Ollama, so chat() can run without Weaviate.
+# The stub Weaviate is for code that goes through the weaviate client itself (imports, benchmark_pipeline.py): it
+# answers the REST calls the v4 client makes when connecting (meta, readiness, schema) and the gRPC calls it makes to
+# insert (BatchObjects) and search (Search: hybrid, bm25, near_vector and fetching objects). Objects are kept in memory and ranked
+# like local_index.py ranks chunks. Objects sent without a vector are embedded one at a time through the (stub) Ollama,
+# like the text2vec-ollama module does.
+
+import json
+import math
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import grpc
+import numpy as np
+from weaviate.proto.v1 import (batch_pb2, health_weaviate_pb2, properties_pb2, search_get_pb2,
+                               weaviate_pb2_grpc)
+
+import ollama_client
+from local_index import B, CANDIDATES, K1, normalized, relative_scores, tokenize, top
+
+EMBED_DIM = 768   # Same size as nomic-embed-text
+ANSWER_WORDS = 20 # Average words in a generated answer
+WEAVIATE_VERSION = "1.33.0"   # What the stub Weaviate reports, same as docker-compose.yml
+
+
+def fake_embedding(text, dim=EMBED_DIM):
+    """Unit vector that only depends on the text"""
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    vector = rng.standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_answer(prompt, words=ANSWER_WORDS, not_found_rate=0.0):
+    """About words words (half to one and a half times as many) that only depend on the prompt"""
+    rewrite = re.search(r"Current question:\s*(.+)", prompt)
+    if rewrite and "Rewritten question:" in prompt:
+        return rewrite.group(1).strip()   # A query rewrite that leaves the question as it was
+    if "not in my data" in prompt and zlib.crc32(prompt.encode("utf-8")) % 1000 < not_found_rate * 1000:
+        return "This information is not in my data"
+    rng = np.random.default_rng(zlib.crc32(prompt.encode("utf-8")))
+    vocabulary = re.findall(r"[a-z]+", prompt.lower()) or ["stub"]
+    length = rng.integers(words // 2, words * 3 // 2 + 1)   # Some answers are longer than others
+    return " ".join(vocabulary[i] for i in rng.integers(0, len(vocabulary), length))
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128   # Default is 5, too few for load tests opening many connections at once
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):  # Client hung up, that's fine
+            super().handle_error(request, client_address)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True   # Headers and body are written separately, don't wait 40 ms between them
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def count(self, name, n=1):
+        with self.server.lock:
+            self.server.calls[name] = self.server.calls.get(name, 0) + n
+
+    def send_json(self, data, status=200):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubOllamaHandler(StubHandler):
+    def load(self, body):
+        """Seconds spent loading the request's model (0 when it was loaded), which then stays for its keep_alive"""
+        server = self.server
+        model = body.get("model") or ""
+        now = time.time()
+        keep_alive = ollama_client.keep_alive_seconds(body.get("keep_alive", server.default_keep_alive))
+        with server.lock:
+            loaded = server.loaded.get(model, 0) > now
+            if not loaded:
+                server.calls["loads"] = server.calls.get("loads", 0) + 1
+        seconds = 0.0 if loaded else server.load_latency
+        time.sleep(seconds)
+        with server.lock:
+            server.loaded[model] = time.time() + keep_alive   # Ollama counts it from the end of the request, close enough
+        return seconds
+
+    def do_GET(self):
+        server = self.server
+        self.count(self.path)
+        if self.path == "/api/ps":
+            now = time.time()
+            with server.lock:
+                models = [{"name": model if ":" in model else f"{model}:latest", "model": model,
+                           "expires_at": datetime.fromtimestamp(min(expires, 2 ** 33), timezone.utc).isoformat()}
+                          for model, expires in server.loaded.items() if expires > now]
+            self.send_json({"models": models})
+        else:
+            self.send_json({"error": f"{self.path} not supported by the stub"}, status=404)
+
+    def do_POST(self):
+        body = self.read_json()
+        server = self.server
+        self.count(self.path)
+
+        if self.path == "/api/embed":
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            loading = self.load(body)
+            time.sleep(server.latency + server.per_item_latency * len(texts))
+            self.send_json({"model": body.get("model"), "embeddings": [fake_embedding(t, server.dim) for t in texts],
+                            "load_duration": int(loading * 1e9)})
+        elif self.path == "/api/generate":
+            loading = self.load(body)
+            # An empty prompt only loads the model, like Ollama
+            answer = fake_answer(body["prompt"], server.answer_words, server.not_found_rate) if body.get("prompt") else ""
+            words = len(answer.split())
+            prompt_words = len(body.get("prompt", "").split())
+            self.count("prompt_tokens", prompt_words)
+            reading = server.latency + server.prompt_latency * prompt_words   # Before the first token
+            final = {
+                "model": body.get("model"),
+                "done": True,
+                "prompt_eval_count": prompt_words,
+                "eval_count": words,
+                "eval_duration": int(server.token_latency * words * 1e9),
+                "load_duration": int(loading * 1e9),
+            }
+            if body.get("stream", True):   # Ollama streams unless told not to
+                self.stream_answer(answer, final, reading)
+            else:
+                time.sleep(reading + server.token_latency * words)
+                self.count("tokens", words)
+                self.send_json({**final, "response": answer})
+        else:
+            self.send_json({"error": f"{self.path} not supported by the stub"}, status=404)
+
+    def stream_answer(self, answer, final, reading):
+        """Newline separated JSON, one word at a time, like Ollama. Stops when the client hangs up"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(reading)   # Reading the prompt, before the first token
+        try:
+            for i, word in enumerate(answer.split(" ")):
+                self.send_chunk({"model": final["model"], "response": word if i == 0 else " " + word, "done": False})
+                self.count("tokens")
+                time.sleep(self.server.token_latency)
+            self.send_chunk({**final, "response": ""})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.count("cancelled")
+            self.close_connection = True
+
+    def send_chunk(self, data):
+        payload = json.dumps(data).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.flush()
+
+
+def serve_stub_ollama(latency=0.0, per_item_latency=0.0, dim=EMBED_DIM, port=0, token_latency=0.0,
+                      answer_words=ANSWER_WORDS, not_found_rate=0.0, prompt_latency=0.0, load_latency=0.0,
+                      default_keep_alive=300):
+    """
+    Start a stub Ollama in a background thread
+
+    Args:
+        latency: Seconds added to every request
+        per_item_latency: Seconds added for every text in an embed request
+        dim: Size of the returned vectors
+        token_latency: Seconds added for every word of a generated answer
+        answer_words: Average words in a generated answer
+        not_found_rate: Share (0-1) of extract prompts answered with "not in my data"
+        prompt_latency: Seconds added for every word of a generate prompt, before the first word of the answer
+        load_latency: Seconds added to a request for a model that is not loaded
+        default_keep_alive: Seconds a model stays loaded after a request without keep_alive
+
+    Returns:
+        The server - server.calls counts requests per path, generated words ("tokens"), prompt words
+        ("prompt_tokens"), generations stopped by the client ("cancelled") and model loads ("loads").
+        Call server.shutdown() when done
+    """
+    server = StubServer(("127.0.0.1", port), StubOllamaHandler)
+    server.latency = latency
+    server.per_item_latency = per_item_latency
+    server.dim = dim
+    server.token_latency = token_latency
+    server.answer_words = answer_words
+    server.not_found_rate = not_found_rate
+    server.prompt_latency = prompt_latency
+    server.load_latency = load_latency
+    server.default_keep_alive = default_keep_alive
+    server.loaded = {}   # model -> time.time() it unloads
+    server.calls = {}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stub_url(server):
+    host, port = server.server_address
+    return f"http://{host}:{port}"
+
+
+class StubKnowledge:
+    """
+    In memory stand-in for the KnowledgeChunk collection, with the parts chat() uses:
+    config.get(), query.hybrid(query, limit, alpha, vector) and
+    generate.hybrid(query, limit, alpha, single_prompt or grouped_task, generative_provider)
+
+    Objects have properties and a uuid (the chunk's index).
+
+    Search ranks chunks by how many of the query's words they contain, alpha is ignored.
+    Generation goes to the Ollama at ollama_url, the generative_provider settings are ignored.
+
+    Args:
+        chunks: Chunk records (url, chunk_id, text)
+        ollama_url: Base URL of the (stub) Ollama to generate with
+        latency: Seconds added to every search
+    """
+
+    def __init__(self, chunks, ollama_url, latency=0.0):
+        self.chunks = list(chunks)
+        self.words = [set(re.findall(r"\w+", chunk["text"].lower())) for chunk in self.chunks]
+        self.ollama_url = ollama_url
+        self.latency = latency
+        self.query = SimpleNamespace(hybrid=self.query_hybrid)
+        self.generate = SimpleNamespace(hybrid=self.generate_hybrid)
+        self.config = SimpleNamespace(get=lambda: {"name": "KnowledgeChunk (stub)", "objects": len(self.chunks)})
+
+    def search(self, query, limit):
+        time.sleep(self.latency)
+        query_words = set(re.findall(r"\w+", query.lower()))
+        ranked = sorted(range(len(self.chunks)), key=lambda i: -len(query_words & self.words[i]))
+        return ranked[:limit]
+
+    def query_hybrid(self, query, limit=3, alpha=0.5, return_properties=None, vector=None):
+        objects = [SimpleNamespace(uuid=i, properties=dict(self.chunks[i])) for i in self.search(query, limit)]
+        return SimpleNamespace(objects=objects)
+
+    def llm(self, prompt):
+        return ollama_client.generate(prompt, base_url=self.ollama_url)["response"]
+
+    def generate_hybrid(self, query, limit=3, alpha=0.5, single_prompt=None, grouped_task=None,
+                        generative_provider=None):
+        return self.generated(self.search(query, limit), single_prompt, grouped_task)
+
+    def generated(self, ids, single_prompt, grouped_task):
+        chunks = [self.chunks[i] for i in ids]
+        objects = []
+        for i, chunk in zip(ids, chunks):
+            generated = None
+            if single_prompt:
+                generated = self.llm(single_prompt.replace("{text}", chunk["text"]).replace("{url}", chunk["url"]))
+            objects.append(SimpleNamespace(uuid=i, properties=dict(chunk), generated=generated))
+        generative = None
+        if grouped_task:
+            context = "\n\n".join(f"{chunk['url']}\n{chunk['text']}" for chunk in chunks)
+            generative = SimpleNamespace(text=self.llm(f"{grouped_task}\n\n{context}"))
+        return SimpleNamespace(objects=objects, generative=generative)
+
+
+class StubCollection:
+    """
+    Objects of one collection held in memory, for the stub Weaviate
+
+    hybrid() ranks them like local_index.LocalKnowledge.search(): BM25 over the text properties and cosine similarity
+    of the vectors, each scaled to 0-1 and added up as alpha * vector + (1 - alpha) * bm25.
+    """
+
+    def __init__(self):
+        self.uuids = []        # Per row, None once the object was replaced by one with the same uuid
+        self.properties = []
+        self.vectors = []
+        self.lengths = []
+        self.postings = {}     # term -> {row: term frequency}
+        self.rows = {}         # uuid -> row
+        self._matrix = None    # (rows, unit vectors) of the objects with a vector, made again after every insert
+
+    def __len__(self):
+        return len(self.rows)
+
+    def put(self, object_uuid, properties, vector):
+        if object_uuid in self.rows:
+            self.uuids[self.rows[object_uuid]] = None
+        row = len(self.uuids)
+        self.rows[object_uuid] = row
+        self.uuids.append(object_uuid)
+        self.properties.append(properties)
+        self.vectors.append(vector)
+        terms = Counter(tokenize(" ".join(value for value in properties.values() if isinstance(value, str))))
+        self.lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[row] = tf
+        self._matrix = None
+
+    def bm25(self, query):
+        """{row: score} of the objects with at least one of the query's words"""
+        average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term, {})
+            idf = math.log(1 + (len(self.rows) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings.items():
+                if self.uuids[row] is not None:
+                    length = self.lengths[row] / average_length
+                    scores[row] = scores.get(row, 0.0) + idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length))
+        return scores
+
+    def nearest(self, vector):
+        """{row: cosine similarity} of the CANDIDATES objects closest to vector"""
+        if self._matrix is None:
+            rows = [row for row, v in enumerate(self.vectors) if v is not None and self.uuids[row] is not None]
+            self._matrix = (np.array(rows, dtype=np.int64),
+                            normalized(np.stack([self.vectors[row] for row in rows])) if rows else None)
+        rows, matrix = self._matrix
+        if matrix is None:
+            return {}
+        scores = matrix @ normalized(vector)
+        best = top(scores, CANDIDATES)
+        return dict(zip(rows[best].tolist(), scores[best].tolist()))
+
+    def hybrid(self, query, vector, limit, alpha):
+        """[(row, score), ...] best first, vector is None for a keyword search only"""
+        searches = []
+        if alpha < 1:
+            searches.append((1 - alpha, self.bm25(query)))
+        if alpha > 0 and vector is not None:
+            searches.append((alpha, self.nearest(vector)))
+        fused = {}
+        for weight, scores in searches:
+            rows = sorted(scores, key=scores.get, reverse=True)[:CANDIDATES]
+            if rows:
+                for row, score in zip(rows, relative_scores(np.array([scores[row] for row in rows]))):
+                    fused[row] = fused.get(row, 0.0) + weight * float(score)
+        return sorted(fused.items(), key=lambda item: -item[1])[:limit]
+
+    def fetch(self, after, limit):
+        """Rows of the first limit objects by uuid after the uuid after, like the client's iterator() pages"""
+        uuids = sorted(u for u in self.rows if u > after) if after else sorted(self.rows)
+        return [self.rows[u] for u in uuids[:limit]]
+
+
+def property_value(value):
+    if isinstance(value, bool):
+        return properties_pb2.Value(bool_value=value)
+    if isinstance(value, int):
+        return properties_pb2.Value(int_value=value)
+    if isinstance(value, float):
+        return properties_pb2.Value(number_value=value)
+    return properties_pb2.Value(text_value=str(value))
+
+
+def grpc_vector(obj):
+    """The vector sent with a BatchObject or a NearVector search, or None"""
+    if obj.vector_bytes:
+        return np.frombuffer(obj.vector_bytes, dtype=np.float32)
+    if obj.vectors:
+        return np.frombuffer(obj.vectors[0].vector_bytes, dtype=np.float32)
+    if obj.vector:
+        return np.array(obj.vector, dtype=np.float32)
+    return None
+
+
+class StubWeaviateServicer(weaviate_pb2_grpc.WeaviateServicer):
+    """The gRPC calls of the v4 client used by the scripts, the others answer UNIMPLEMENTED"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def embed(self, text):
+        return np.array(ollama_client.embed([text], base_url=self.server.ollama_url)[0], dtype=np.float32)
+
+    def BatchObjects(self, request, context):
+        server = self.server
+        start = time.perf_counter()
+        server.count("BatchObjects")
+        objects = []
+        for obj in request.objects:
+            properties = dict(obj.properties.non_ref_properties.items())
+            vector = grpc_vector(obj)
+            if vector is None and server.ollama_url:
+                # text2vec-ollama sends every object to Ollama on its own
+                vector = self.embed(" ".join(value for value in properties.values() if isinstance(value, str)))
+            objects.append((obj.collection, obj.uuid, properties, vector))
+        time.sleep(server.latency + server.per_object_latency * len(objects))
+        with server.lock:
+            for name, object_uuid, properties, vector in objects:
+                server.collection(name).put(object_uuid, properties, vector)
+        server.count("objects", len(objects))
+        return batch_pb2.BatchObjectsReply(took=time.perf_counter() - start)
+
+    def Search(self, request, context):
+        server = self.server
+        start = time.perf_counter()
+        server.count("Search")
+        time.sleep(server.latency)
+        query, vector, alpha = None, None, 0.0
+        if request.HasField("hybrid_search"):
+            hybrid = request.hybrid_search
+            query = hybrid.query
+            alpha = hybrid.alpha_param if hybrid.use_alpha_param else hybrid.alpha
+            vector = grpc_vector(hybrid)   # Sent by the client, or made here like text2vec-ollama does
+            if vector is None and alpha > 0 and server.ollama_url:
+                vector = self.embed(query)
+        elif request.HasField("bm25_search"):
+            query = request.bm25_search.query
+        elif request.HasField("near_vector"):
+            vector = grpc_vector(request.near_vector)
+
+        with server.lock:
+            collection = server.collection(request.collection)
+            if vector is not None and query is None:
+                # Exact search, so the stub always finds the true nearest objects (up to CANDIDATES of them)
+                nearest = collection.nearest(vector)
+                results = [(row, None) for row in sorted(nearest, key=nearest.get, reverse=True)[:request.limit or 10]]
+            elif query is None:
+                results = [(row, None) for row in collection.fetch(request.after, request.limit)]
+            else:
+                results = collection.hybrid(query, vector, request.limit or 10, alpha)
+            names = list(request.properties.non_ref_properties)
+            found = [(collection.uuids[row], collection.properties[row], score) for row, score in results]
+
+        reply = search_get_pb2.SearchReply()
+        for object_uuid, properties, score in found:
+            result = reply.results.add()
+            result.properties.target_collection = request.collection
+            for name in names or properties:
+                if name in properties:
+                    result.properties.non_ref_props.fields[name].CopyFrom(property_value(properties[name]))
+            result.metadata.id = object_uuid
+            result.metadata.id_as_bytes = uuid.UUID(object_uuid).bytes
+            if score is not None:
+                result.metadata.score = score
+                result.metadata.score_present = True
+        reply.took = time.perf_counter() - start
+        return reply
+
+
+def health_check(request, context):
+    return health_weaviate_pb2.WeaviateHealthCheckResponse(
+        status=health_weaviate_pb2.WeaviateHealthCheckResponse.SERVING)
+
+
+class StubWeaviateHandler(StubHandler):
+    """The REST endpoints the v4 client calls: meta, readiness and the schema (create, update, delete)"""
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split("?")[0]
+        self.count(path)
+        time.sleep(server.latency)
+        if path == "/v1/meta":
+            self.send_json({"hostname": "http://[::]:8080", "version": WEAVIATE_VERSION,
+                            "modules": {"generative-ollama": {}, "text2vec-ollama": {}}})
+        elif path in ("/v1/.well-known/ready", "/v1/.well-known/live"):
+            self.send_json({})
+        elif path == "/v1/schema":
+            with server.lock:
+                self.send_json({"classes": list(server.schema.values())})
+        elif path.startswith("/v1/schema/") and path[len("/v1/schema/"):] in server.schema:
+            self.send_json(server.schema[path[len("/v1/schema/"):]])
+        else:
+            self.send_json({"error": [{"message": f"{path} not supported by the stub"}]}, status=404)
+
+    def do_POST(self):
+        server = self.server
+        self.count(self.path)
+        time.sleep(server.latency)
+        if self.path == "/v1/schema":
+            body = self.read_json()
+            with server.lock:
+                server.schema[body["class"]] = body
+                server.collection(body["class"])
+            self.send_json(body)
+        else:
+            self.send_json({"error": [{"message": f"{self.path} not supported by the stub"}]}, status=404)
+
+    def do_PUT(self):
+        server = self.server
+        self.count(self.path)
+        time.sleep(server.latency)
+        name = self.path[len("/v1/schema/"):] if self.path.startswith("/v1/schema/") else None
+        if name in server.schema:
+            body = self.read_json()
+            with server.lock:
+                server.schema[name] = body
+            self.send_json(body)
+        else:
+            self.send_json({"error": [{"message": f"{self.path} not supported by the stub"}]}, status=404)
+
+    def do_DELETE(self):
+        server = self.server
+        self.count(self.path)
+        name = self.path[len("/v1/schema/"):] if self.path.startswith("/v1/schema/") else None
+        with server.lock:
+            server.schema.pop(name, None)
+            server.collections.pop(name, None)
+        self.send_json({})
+
+
+class StubWeaviateServer(StubServer):
+    def count(self, name, n=1):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + n
+
+    def collection(self, name):
+        """The collection called name, made on first use like Weaviate's auto schema (call with the lock held)"""
+        if name not in self.collections:
+            self.collections[name] = StubCollection()
+        return self.collections[name]
+
+    def shutdown(self):
+        self.grpc_server.stop(0)
+        super().shutdown()
+
+
+def serve_stub_weaviate(ollama_url=None, latency=0.0, per_object_latency=0.0, port=0, grpc_port=0):
+    """
+    Start a stub Weaviate in background threads, REST on port and gRPC on grpc_port (0 picks free ports)
+
+    Connect to it with
+        weaviate.connect_to_local(port=server.server_address[1], grpc_port=server.grpc_port, skip_init_checks=True)
+    (skip_init_checks, or the client also looks up its latest version on PyPI)
+
+    Args:
+        ollama_url: Base URL of the (stub) Ollama that embeds objects sent without a vector and hybrid queries,
+                    None for keyword search only
+        latency: Seconds added to every request
+        per_object_latency: Seconds added for every object in a batch, on top of embedding it
+
+    Returns:
+        The server - server.calls counts requests per REST path and gRPC method and the objects inserted ("objects"),
+        server.collections holds a StubCollection per collection. Call server.shutdown() when done
+    """
+    server = StubWeaviateServer(("127.0.0.1", port), StubWeaviateHandler)
+    server.ollama_url = ollama_url
+    server.latency = latency
+    server.per_object_latency = per_object_latency
+    server.calls = {}
+    server.schema = {}
+    server.collections = {}
+    server.lock = threading.Lock()
+
+    server.grpc_server = grpc.server(ThreadPoolExecutor(max_workers=16))
+    weaviate_pb2_grpc.add_WeaviateServicer_to_server(StubWeaviateServicer(server), server.grpc_server)
+    server.grpc_server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler("grpc.health.v1.Health", {
+        "Check": grpc.unary_unary_rpc_method_handler(
+            health_check,
+            request_deserializer=health_weaviate_pb2.WeaviateHealthCheckRequest.FromString,
+            response_serializer=health_weaviate_pb2.WeaviateHealthCheckResponse.SerializeToString),
+    }),))
+    server.grpc_port = server.grpc_server.add_insecure_port(f"127.0.0.1:{grpc_port}")
+    server.grpc_server.start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,144 @@
+
+# Builds a fake website and serves it from a local HTTP server
+# Used by the benchmark scripts so the crawler can be measured without touching a real website
+# synthetic_chunks() and make_queries() make chunks and known-item queries for the search benchmarks and
+# tune_vector_index.py --stub
+
+# Every page gets the same header, nav and footer (like a real site's chrome) plus a <main> section
+# with a few paragraphs of text and links to other pages of the synthetic site.
+# Inside <main> every page also has the same "share this page" box, chrome that only shows up by repeating
+
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "student program office service support application campus research community faculty staff "
+    "admission course degree center library resource contact schedule event policy department "
+    "health career advising financial aid registration housing meeting report project"
+).split()
+
+HEADER = "<header><p>President - Company</p><p>Menu | About | Programs | Contact</p></header>"
+NAV = "<nav><ul><li><a href='/'>Home</a></li><li><a href='/page0'>About</a></li></ul></nav>"
+SHARE = "<div class='share'><p>Share this page</p><p>Facebook | Twitter | Email</p></div>"
+FOOTER = "<footer><p>© 2024 Company</p><p>All rights reserved. Privacy | Terms</p></footer>"
+
+
+def make_sentence(rng, min_words=6, max_words=18):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + "."
+
+
+def make_paragraph(rng, sentences=5):
+    return " ".join(make_sentence(rng) for _ in range(sentences))
+
+
+def build_site(num_pages=200, links_per_page=5, paragraphs=4, seed=0):
+    """Return {path: html} for a site of num_pages pages linked to each other"""
+    rng = random.Random(seed)
+    site = {}
+    for i in range(num_pages):
+        # Link forward so every page is reachable from the home page, plus some random links
+        targets = {(i + 1) % num_pages}
+        targets.update(rng.randrange(num_pages) for _ in range(links_per_page - 1))
+        links = "".join(f"<li><a href='/page{t}'>Page {t}</a></li>" for t in sorted(targets))
+        body = "".join(f"<p>{make_paragraph(rng)}</p>" for _ in range(paragraphs))
+        site[f"/page{i}"] = (
+            f"<html><head><title>Page {i}</title><script>var x = {i};</script></head><body>"
+            f"{HEADER}{NAV}<main><h1>Page {i}</h1>{body}{SHARE}<ul>{links}</ul></main>{FOOTER}</body></html>"
+        )
+    site["/"] = site["/page0"]
+    return site
+
+
+def synthetic_chunks(pages, seed=0):
+    """Pages of made up words, some much more common than others like in real text, chunked like Chunk_cleaned_text"""
+    from Chunk_cleaned_text import chunk_page
+
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("bcdfghklmnprstvz") + rng.choice("aeiou") for _ in range(rng.randint(1, 4)))
+                  for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    chunks = []
+    for i in range(pages):
+        sentences = [" ".join(rng.choices(vocabulary, weights, k=rng.randint(6, 18))).capitalize() + "."
+                     for _ in range(30)]
+        chunks.extend(chunk_page({"url": f"https://example.com/page-{i}", "text": " ".join(sentences)}))
+    return chunks
+
+
+def make_queries(chunks, count, words, seed=0):
+    """[(query, chunk_id it was taken from), ...]"""
+    rng = random.Random(seed)
+    queries = []
+    for chunk in rng.sample(chunks, min(count, len(chunks))):
+        text = chunk["text"].split()
+        start = rng.randrange(max(1, len(text) - words))
+        queries.append((" ".join(text[start:start + words]), chunk["chunk_id"]))
+    return queries
+
+
+def page_version(html):
+    """Stands in for both the ETag and the sitemap <lastmod> - it changes whenever the page changes"""
+    return hashlib.md5(html.encode("utf-8")).hexdigest()[:16]
+
+
+def build_sitemap(site, host):
+    urls = "".join(
+        f"<url><loc>http://{host}{path}</loc><lastmod>{page_version(html)}</lastmod></url>"
+        for path, html in site.items() if path != "/"
+    )
+    return f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+
+
+def make_handler(site, latency=0.0):
+    """The site dict is read on every request, so pages can be edited or deleted while it is being served"""
+    class SiteHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections can be reused
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            path = self.path.split("#")[0]
+            host = self.headers.get("Host", "")
+            if path == "/sitemap.xml":
+                self.send_body(200, build_sitemap(site, host), "application/xml")
+                return
+
+            html = site.get(path)
+            if html is None:
+                self.send_body(404, "not found")
+                return
+            etag = f'"{page_version(html)}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_body(200, html, etag=etag)
+
+        def send_body(self, status, text, content_type="text/html; charset=utf-8", etag=None):
+            body = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return SiteHandler
+
+
+def serve_site(site, latency=0.0, port=0):
+    """Start serving site in a background thread, returns the server (call .shutdown() when done)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(site, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,73 @@
+import zlib
+
+import numpy as np
+
+import answer_cache
+from answer_cache import AnswerCache
+
+
+class Embedder:
+    """Bag of words embedding that counts its calls, so "library" and "billing" questions come out close"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        vector = np.ones(64, dtype=np.float32) * 8   # Mostly shared, so different topics still score high
+        for word in answer_cache.normalize(text).split():
+            vector[zlib.crc32(word.encode()) % 64] += 1
+        return vector
+
+
+def cache(tmp_path, **kwargs):
+    return AnswerCache(embed=Embedder(), version_file=str(tmp_path / "version.json"), **kwargs)
+
+
+def test_paraphrase_about_another_topic_misses_in_every_mode(tmp_path):
+    for mode in ("extract", "guidance", "information"):
+        answers = cache(tmp_path, similarity=0.9)
+        answers.put(mode, "tell me about the library", "The library answer")
+        assert answers.get(mode, "tell me about the billing") is None
+        assert answers.get(mode, "the library, tell me about it") == "The library answer"
+
+
+def test_miss_embeds_once_and_the_search_reuses_it(tmp_path):
+    answers = cache(tmp_path)
+    metrics = {}
+    assert answers.get("information", "tell me about the library", metrics) is None
+    assert metrics["answer_cache"] == "miss" and answers.embed.calls == 1
+    vector = answers.query_vector("information", "tell me about the library")
+    assert isinstance(vector, list) and len(vector) == 64
+    answers.put("information", "tell me about the library", "The library answer")
+    assert answers.embed.calls == 1
+
+
+def test_expired_answers_are_not_returned(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    answers = cache(tmp_path, ttl=10, similarity=None)
+    answers.put("information", "tell me about the library", "The library answer")
+    now[0] += 5
+    assert answers.get("information", "tell me about the library") == "The library answer"
+    now[0] += 10   # Expired, but before the next sweep
+    assert answers.get("information", "tell me about the library") is None
+    assert len(answers) == 0
+
+
+def test_real_paraphrase_hits_and_another_office_misses(tmp_path):
+    answers = cache(tmp_path, similarity=0.9)
+    answers.put("extract", "how do I reach billing?", "billing@example.com")
+    answers.put("extract", "what is the phone number of the billing office?", "(555) 123-4567")
+    metrics = {}
+    assert answers.get("extract", "billing office contact", metrics) == "billing@example.com"
+    assert metrics["answer_cache"] == "semantic_hit"
+    assert answers.get("extract", "billing office phone number") == "(555) 123-4567"
+    assert answers.get("extract", "what is the phone number of the admissions office?") is None
+    assert answers.get("extract", "admissions office contact") is None
+
+
+def test_same_subject():
+    assert answer_cache.same_subject("how do i reach billing", "billing office contact")
+    assert not answer_cache.same_subject("phone number of the billing office", "phone number of the admissions office")
+    assert not answer_cache.same_subject("where is the library", "when does the gym open")
@@ -0,0 +1,86 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+import chat_service
+import multi_turn_RAG_conversation
+import ollama_client
+from answer_cache import AnswerCache
+from stub_servers import StubKnowledge, serve_stub_ollama, stub_url
+from synthetic_site import make_paragraph
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """(base url of a running chat_service with stub backends, the stub Ollama, the app), for asyncio.run"""
+    ollama = serve_stub_ollama(token_latency=0.02, answer_words=200)
+    monkeypatch.setattr(ollama_client, "OLLAMA_URL", stub_url(ollama))
+    monkeypatch.setattr(multi_turn_RAG_conversation, "ANSWER_CACHE", AnswerCache(0))
+    rng = random.Random(0)
+    chunks = [{"url": f"https://example.com/page-{i}", "chunk_id": f"https://example.com/page-{i}#0",
+               "text": make_paragraph(rng)} for i in range(50)]
+    app = chat_service.make_app(StubKnowledge(chunks, stub_url(ollama)), sessions_db=str(tmp_path / "sessions.db"))
+    yield app, ollama
+    ollama.shutdown()
+
+
+async def started(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def test_stream_stops_when_the_client_leaves(service):
+    app, ollama = service
+
+    async def run():
+        runner, url = await started(app)
+        try:
+            async with aiohttp.ClientSession() as http:
+                async with http.post(f"{url}/chat/stream", json={"message": "Tell me about the library",
+                                                                  "session_id": "s1"}) as response:
+                    assert response.status == 200
+                    await response.content.readline()   # The first words, then hang up
+            for _ in range(100):
+                if ollama.calls.get("cancelled") and not app[chat_service.STATS]["active_turns"]:
+                    break
+                await asyncio.sleep(0.05)
+            async with aiohttp.ClientSession() as http:
+                async with http.get(f"{url}/sessions/s1") as response:
+                    return await response.json()
+        finally:
+            await runner.cleanup()
+
+    start = time.perf_counter()
+    session = asyncio.run(run())
+    assert ollama.calls.get("cancelled") == 1
+    assert app[chat_service.STATS]["active_turns"] == 0
+    assert session["count"] == 0   # The unfinished turn is not remembered
+    assert time.perf_counter() - start < 4   # Well before the 200 word answer would have finished
+
+
+def test_sessions_are_loaded_from_the_db(service):
+    app, ollama = service
+
+    async def run():
+        runner, url = await started(app)
+        try:
+            async with aiohttp.ClientSession() as http:
+                async with http.post(f"{url}/chat", json={"message": "Tell me about the library",
+                                                          "session_id": "s2"}) as response:
+                    assert response.status == 200
+                app[chat_service.SESSIONS].sessions.clear()   # As after a restart
+                async with http.get(f"{url}/sessions/s2") as response:
+                    return await response.json()
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(run())["count"] == 1
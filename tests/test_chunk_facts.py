@@ -0,0 +1,46 @@
+import json
+import os
+import runpy
+import sys
+
+from contact_facts import ContactFacts
+from pipeline_io import write_records
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Chunk_cleaned_text.py")
+PAGES = [
+    {"url": "https://example.com/billing", "text": "Email the billing office at billing@example.com."},
+    {"url": "https://example.com/library", "text": "Call the library at (555) 987-6543."},
+    {"url": "https://example.com/old", "text": "Call the old office at (555) 123-4567."},
+]
+
+
+def chunk(monkeypatch, tmp_path, pages, *options):
+    """Run Chunk_cleaned_text.py on pages in tmp_path, returns {fact value: urls} of contact_facts.json"""
+    write_records(str(tmp_path / "pages_clean.json"), pages)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", [SCRIPT, "pages_clean.json", "chunked_pages.json", *options])
+    runpy.run_path(SCRIPT, run_name="__main__")
+    return {fact["value"]: fact["urls"] for fact in ContactFacts.load().facts.values()}
+
+
+def test_full_run_rebuilds_the_facts(monkeypatch, tmp_path):
+    assert len(chunk(monkeypatch, tmp_path, PAGES)) == 3
+    assert list(chunk(monkeypatch, tmp_path, PAGES[:1])) == ["billing@example.com"]
+
+
+def test_incremental_run_keeps_the_facts_of_unchanged_pages(monkeypatch, tmp_path):
+    full = chunk(monkeypatch, tmp_path, PAGES)
+    library = [value for value, urls in full.items() if urls == ["https://example.com/library"]]
+    assert len(library) == 1
+
+    # The billing page changed, the library page did not, the old page was removed
+    with open(tmp_path / "removed_pages.json", "w", encoding="utf-8") as f:
+        json.dump(["https://example.com/old"], f)
+    changed = {"url": "https://example.com/billing", "text": "Email the billing office at accounts@example.com."}
+    facts = chunk(monkeypatch, tmp_path, [changed], "--removed", "removed_pages.json")
+    assert facts == {"accounts@example.com": ["https://example.com/billing"],
+                     library[0]: ["https://example.com/library"]}
+
+    # --incremental alone keeps everything that was not in the input
+    facts = chunk(monkeypatch, tmp_path, [PAGES[2]], "--incremental")
+    assert len(facts) == 3
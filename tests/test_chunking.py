@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from Chunk_cleaned_text import approx_token_count, chunk_ids, chunk_pages, chunk_text, legacy_chunk_text
+from synthetic_site import make_sentence
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "One sentence without an end",
+    "Short. Sentences! Ask? Then stop.",
+    "x" * 2000 + ". A sentence longer than a whole chunk comes first.",
+    "A sentence before it. " + "y" * 2000 + ". And one after.",
+    "Two  spaces.  Between\nlines. Tabs\tinside. Trailing spaces.   ",
+    "Café costs 3.50 €. Ünïcödé text! 😀 emoji? ¿Qué? Done.",
+    "...!!! ??? . . .",
+]
+
+
+def generated_text(sentences, seed):
+    rng = random.Random(seed)
+    return " ".join(make_sentence(rng) for _ in range(sentences))
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+@pytest.mark.parametrize("max_chars, overlap", [(800, 150), (100, 20), (30, 5), (5000, 150)])
+def test_same_chunks_as_legacy_on_edge_cases(text, max_chars, overlap):
+    assert chunk_text(text, max_chars, overlap) == legacy_chunk_text(text, max_chars, overlap)
+
+
+@pytest.mark.parametrize("max_chars, overlap", [(800, 150), (200, 40), (20000, 150)])
+def test_same_chunks_as_legacy_on_generated_pages(max_chars, overlap):
+    for seed in range(5):
+        text = generated_text(3000, seed)
+        assert chunk_text(text, max_chars, overlap) == legacy_chunk_text(text, max_chars, overlap)
+
+
+def test_token_sized_chunks_stay_within_the_limit():
+    text = generated_text(500, 0)
+    chunks = chunk_text(text, max_chars=200, overlap=40, count_tokens=approx_token_count)
+    assert len(chunks) > 1
+    # A chunk is at most the overlap plus sentences that fit, and every sentence here is well under 200 tokens
+    assert all(approx_token_count(chunk) <= 200 + 40 for chunk in chunks)
+
+
+def test_processes_give_the_same_chunks():
+    pages = [{"url": f"https://example.com/{i}", "text": generated_text(200, i)} for i in range(6)]
+    assert list(chunk_pages(pages, workers=2, chunksize=1)) == list(chunk_pages(pages))
+
+
+def test_chunk_ids_follow_the_text():
+    ids = chunk_ids("https://example.com/a", ["first", "second", "first"])
+    assert len(set(ids)) == 3 and ids[2] == ids[0] + "-2"
+    assert chunk_ids("https://example.com/a", ["second"]) == [ids[1]]
+    assert chunk_ids("https://example.com/a", ["x", "y"], id_scheme="index") == ["https://example.com/a#chunk0",
+                                                                                   "https://example.com/a#chunk1"]
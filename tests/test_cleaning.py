@@ -0,0 +1,68 @@
+import pytest
+
+from Clean_raw_text import (FOOTER_PATTERNS, HEADER_PATTERNS, clean_special_characters, clean_text,
+                            collapse_repeated_junk, compile_rules, is_whole_line_pattern, normalize_whitespace,
+                            preprocess_text, remove_headers_footers)
+
+EDGE_CASES = [
+    "",
+    "   \n\n\n   ",
+    "line one\r\nline two\r\n\r\n\r\n\r\nline three\r\n",
+    "Menu | About | Programs\nReal text",                       # Header at the very start
+    "Real text\nAll rights reserved.",                          # Footer at the very end, no newline after it
+    "Menu | About | Programs\r\nPresident - Company\r\nReal text\r\n© 2024 Company\r\nAll rights reserved.\r\n",
+    "Menu President of the Company",                            # Matches two header patterns (overlapping rules)
+    "President of the Company speaks\nMenu\n\nMenu item\n\n\n\nAll rights reserved. © 2024 Company",
+    "wait...... what--- ===== ok .. -- == ---",
+    "..... -----\n\n\n\n=====",
+    "café © ™ emoji 😀 ¿qué? x@y.com (a/b) \"q\" 'r' ; : !",
+    "\t leading and trailing \t",
+    ". . . - - - = = =",
+    "a b c\x0bd\x0ce",
+]
+
+# User patterns that must not change meaning when compiled: line breaks, inline flags, alternatives, backreferences
+CUSTOM_HEADERS = [r'^Menu.*$', r'^Skip to\s+content.*$', r'(?s)^BEGIN NAV.*?END NAV.*$', r'^Home\n.*$']
+CUSTOM_FOOTERS = [r'^(?i:cookie).*$', r'^(\w+) \1.*$', r'^Share|Print.*$', r'^[^a-z].*$', r'^Follow us.*$']
+CUSTOM_CASES = [
+    "Menu\nSkip to\ncontent here\nBEGIN NAV\nlinks\nEND NAV more\nHome\nwelcome\nReal text",
+    "COOKIE notice\nreal real text\nShare this Print page\n# hashtag\nFollow us on X\nReal text",
+    "Real text\nMenu | About\r\nFollow us\r\n",
+]
+
+
+def legacy(text, header_patterns, footer_patterns):
+    """preprocess_text() with other header and footer patterns"""
+    text = remove_headers_footers(text, header_patterns, footer_patterns)
+    return normalize_whitespace(collapse_repeated_junk(clean_special_characters(text)))
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_clean_text_is_byte_identical_to_preprocess_text(text):
+    assert clean_text(text) == preprocess_text(text)
+
+
+@pytest.mark.parametrize("text", EDGE_CASES + CUSTOM_CASES)
+def test_custom_patterns_keep_their_meaning(text):
+    rules = compile_rules(CUSTOM_HEADERS, CUSTOM_FOOTERS)
+    assert clean_text(text, rules) == legacy(text, CUSTOM_HEADERS, CUSTOM_FOOTERS)
+
+
+def test_only_single_line_patterns_are_merged():
+    assert all(is_whole_line_pattern(p) for p in HEADER_PATTERNS + FOOTER_PATTERNS)
+    merged = [r'^Menu.*$', r'^Follow us.*$']
+    assert all(is_whole_line_pattern(p) for p in merged)
+    assert not any(is_whole_line_pattern(p) for p in CUSTOM_HEADERS[1:] + CUSTOM_FOOTERS[:-1])
+
+
+def test_backreference_keeps_its_group():
+    # Both are ^...*$ patterns, merged into one alternation \1 would refer to the (Menu) group
+    patterns = [r'^(Menu).*$', r'^(\w+) \1.*$']
+    text = "Menu x\nreal real text\nkeep this"
+    assert clean_text(text, compile_rules(patterns, [])) == legacy(text, patterns, []) == "keep this"
+
+
+def test_no_patterns():
+    rules = compile_rules([], [])
+    text = "Menu | About\nReal text"
+    assert clean_text(text, rules) == legacy(text, [], []) == "Menu About\nReal text"
@@ -0,0 +1,24 @@
+from contact_facts import ContactFacts, wanted_kinds
+
+PAGE = ("Contact the registrar at registrar@example.edu for transcripts. "
+        "Our campus is at 123 Main Street, Springfield, IL 62701.")
+
+
+def test_email_address_question_only_wants_email():
+    assert wanted_kinds("what is the email address of the registrar?") == ["email"]
+    assert wanted_kinds("what is the e-mail address for billing?") == ["email"]
+
+
+def test_kind_words_match_at_word_start():
+    assert wanted_kinds("what is the address of the library?") == ["address"]
+    assert wanted_kinds("where is the library located?") == ["address"]
+    assert wanted_kinds("when does the library open?") == ["hours"]
+    assert wanted_kinds("who is in charge of the mailroom?") == []
+
+
+def test_email_address_answer_has_no_street_address():
+    facts = ContactFacts()
+    facts.add("https://example.edu/registrar", PAGE)
+    answer = facts.answer("what is the email address of the registrar?")
+    assert answer.startswith("registrar@example.edu\n")
+    assert "Main Street" not in answer
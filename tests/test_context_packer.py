@@ -0,0 +1,76 @@
+import random
+
+from Chunk_cleaned_text import approx_token_count, chunk_text
+from context_packer import overlap, pack, passage_text
+from synthetic_site import make_sentence
+
+
+class Chunk:
+    def __init__(self, url, text):
+        self.properties = {"url": url, "text": text}
+
+
+def page_text(seed, sentences=40):
+    rng = random.Random(seed)
+    return " ".join(make_sentence(rng) for _ in range(sentences))
+
+
+def test_overlap():
+    assert overlap("a" * 10 + "shared text that is long enough", "shared text that is long enough, then more") == 31
+    assert overlap("ends with short", "short start") == 0   # Less than MIN_OVERLAP in common
+    assert overlap("nothing in common at all here", "something else entirely, really") == 0
+
+
+def test_neighbours_are_merged_with_the_overlap_once():
+    text = page_text(0)
+    chunks = chunk_text(text, max_chars=400, overlap=150)
+    assert len(chunks) >= 4
+    # Retrieved out of page order, with a chunk of another page in between
+    order = [2, 0, 3, 1] + list(range(4, len(chunks)))
+    objects = [Chunk("https://example.com/a", chunks[i]) for i in order[:2]]
+    objects.append(Chunk("https://example.com/b", "A different page. It has its own text."))
+    objects += [Chunk("https://example.com/a", chunks[i]) for i in order[2:]]
+
+    passages, stats = pack(objects, budget=None)
+    assert [passage["url"] for passage in passages] == ["https://example.com/a", "https://example.com/b"]
+    assert passages[0]["text"] == text
+    assert passages[0]["ranks"] == [1, 4, 0, 3] + list(range(5, len(chunks) + 1))   # Page order
+    assert all(passages[0]["text"][offset:].startswith(chunks[i]) for i, offset in enumerate(passages[0]["offsets"]))
+    assert stats["merged"] == len(chunks) - 1 and stats["passages"] == 2
+    tokens = sum(approx_token_count(passage_text(p["url"], p["text"])) for p in passages)
+    assert stats["tokens"] == tokens
+    assert stats["tokens_saved"] == stats["tokens_before"] - tokens > 0
+
+
+def test_text_already_in_a_better_passage_is_dropped():
+    footer = "Contact us at info@example.com. All rights reserved."
+    objects = [Chunk("https://example.com/a", "The library opens at 9am. " + footer),
+               Chunk("https://example.com/b", footer)]
+    passages, stats = pack(objects)
+    assert [passage["url"] for passage in passages] == ["https://example.com/a"]
+    assert stats["duplicates"] == 1
+
+
+def test_budget_cuts_the_passage_that_does_not_fit():
+    first, second = page_text(1, 10), page_text(2, 40)
+    objects = [Chunk("https://example.com/a", first), Chunk("https://example.com/b", second),
+               Chunk("https://example.com/c", page_text(3, 40))]
+    budget = approx_token_count(passage_text("https://example.com/a", first)) + 100
+    passages, stats = pack(objects, budget=budget)
+    assert stats["tokens"] <= budget
+    assert [passage["url"] for passage in passages] == ["https://example.com/a", "https://example.com/b"]
+    assert passages[0]["text"] == first
+    assert second.startswith(passages[1]["text"]) and len(passages[1]["text"]) < len(second)   # Whole sentences
+    assert stats["trimmed"] == 1 and stats["dropped"] == 1   # Not even a sentence of c fits
+
+
+def test_trimmed_passage_starts_at_its_best_ranked_chunk():
+    text = page_text(4)
+    chunks = chunk_text(text, max_chars=400, overlap=150)
+    # The third chunk is the best match, the page's first two chunks come last
+    objects = [Chunk("https://example.com/a", chunks[i]) for i in [2, 3, 0, 1]]
+    passages, stats = pack(objects, budget=120)
+    [passage] = passages
+    assert stats["trimmed"] == 1 and stats["tokens"] <= 120
+    assert chunks[2].startswith(passage["text"][:100])
+    assert passage["ranks"][0] == 0
@@ -0,0 +1,73 @@
+from conversation_memory import (MAX_SUMMARIES, RECENT_TURNS, ConversationMemory, SessionDB, prompt_text, summarize,
+                                 truncate)
+
+LONG_ANSWER = "The billing office is on the second floor of the main building. " * 20
+
+
+def turn(i, answer=LONG_ANSWER):
+    return {"user": f"Question {i} about office {i}?", "assistant": answer, "entities": [f"office {i}"]}
+
+
+def test_short_conversation_is_kept_as_it_was():
+    memory = ConversationMemory()
+    for i in range(RECENT_TURNS):
+        memory.append(turn(i, "Short answer."))
+    assert len(memory) == RECENT_TURNS and memory.summaries == []
+    assert memory.tokens() <= memory.budget
+
+
+def test_older_turns_are_summarized_once_over_the_budget():
+    memory = ConversationMemory(budget=10_000)
+    for i in range(RECENT_TURNS + 2):
+        memory.append(turn(i))
+    # Past RECENT_TURNS the oldest turns become one line summaries
+    assert [t["user"] for t in memory] == [f"Question {i} about office {i}?" for i in range(2, RECENT_TURNS + 2)]
+    assert memory.summaries == [summarize(turn(0)), summarize(turn(1))]
+    assert memory.summaries[0].startswith("Question 0 about office 0? -> The billing office is on the second floor")
+
+    # A small budget summarizes recent turns too and drops the oldest summaries, the latest turn always stays
+    small = ConversationMemory(budget=120)
+    for i in range(RECENT_TURNS + 2):
+        small.append(turn(i))
+        assert small.tokens() <= 120 or len(small) == 1
+    assert small[-1]["user"] == f"Question {RECENT_TURNS + 1} about office {RECENT_TURNS + 1}?"
+    assert len(small) < RECENT_TURNS
+    assert small.count == RECENT_TURNS + 2
+
+
+def test_summaries_and_entities_are_capped():
+    memory = ConversationMemory(budget=10_000)
+    for i in range(20):
+        memory.append(turn(i, "Short answer."))
+    assert len(memory.summaries) == MAX_SUMMARIES
+    assert memory.entities[0] == "office 19" and "office 0" not in memory.entities
+    assert "Mentioned earlier: office 19; office 18" in prompt_text(memory)
+
+
+def test_answers_are_cut_in_the_prompt():
+    assert truncate("a few words", 10) == "a few words"
+    assert truncate(LONG_ANSWER, 10).endswith(" ...")
+    memory = ConversationMemory([turn(0)])
+    assert LONG_ANSWER not in prompt_text(memory)
+
+
+def test_session_round_trips_through_sqlite(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    memory = ConversationMemory(budget=10_000)
+    for i in range(RECENT_TURNS + 1):
+        memory.append(turn(i))
+    db = SessionDB(path, budget=10_000)
+    db.save("alice", memory)
+    db.close()
+
+    db = SessionDB(path, budget=10_000)
+    loaded = db.load("alice")
+    assert loaded == memory
+    assert loaded.to_dict() == memory.to_dict()
+    assert db.load("bob") is None
+    loaded.append(turn(9, "Short answer."))
+    db.save("alice", loaded)   # Saving again replaces the row
+    assert db.load("alice").count == RECENT_TURNS + 2
+    assert db.delete("alice") and not db.delete("alice")
+    assert db.load("alice") is None
+    db.close()
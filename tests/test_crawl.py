@@ -0,0 +1,90 @@
+import pytest
+
+import Website_crawl_scrape as crawler
+from synthetic_site import build_site, serve_site
+
+
+@pytest.fixture
+def site(monkeypatch):
+    pages = build_site(num_pages=20, seed=1)
+    server = serve_site(pages)
+    host = f"127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(crawler, "DOMAIN", host)
+    yield pages, f"http://{host}/"
+    server.shutdown()
+
+
+def extractor_for(bad_url=None, empty_url=None):
+    def extract(response):
+        if response.url == bad_url:
+            raise ValueError("parser choked")
+        text, hrefs = crawler.extract_page(response)
+        return ("" if response.url == empty_url else text), hrefs
+    return extract
+
+
+def test_parser_error_fails_the_page_not_the_crawl(site):
+    pages, start = site
+    stats = {}
+    crawled = list(crawler.crawl(start, stats, extractor=extractor_for(bad_url=start + "page5")))
+    assert stats["failed"] == 1
+    assert start + "page5" not in {page["url"] for page in crawled}
+    assert start + "page6" in {page["url"] for page in crawled}   # Only linked from page5 by the forward chain
+
+
+def test_page_that_lost_its_text_leaves_the_manifest(site):
+    pages, start = site
+    manifest = {}
+    list(crawler.crawl(start, manifest=manifest))
+    assert start + "page7" in manifest
+
+    pages["/page7"] += "<!-- edited -->"   # New ETag, the extractor then finds no text
+    stats = {}
+    crawled = list(crawler.crawl(start, stats, manifest=manifest, extractor=extractor_for(empty_url=start + "page7")))
+    assert {"url": start + "page7", "status": "removed"} in crawled
+    assert start + "page7" not in manifest
+    assert stats["empty"] == 1 and stats["removed"] == 1
+
+
+def test_sitemap_unchanged_pages_are_not_downloaded(site, monkeypatch):
+    pages, start = site
+    sitemap = crawler.fetch_sitemap(start)
+    manifest = {}
+    list(crawler.crawl(start, manifest=manifest, sitemap=sitemap))
+
+    fetched = []
+    scrape_page = crawler.scrape_page
+    monkeypatch.setattr(crawler, "scrape_page", lambda url, *args: fetched.append(url) or scrape_page(url, *args))
+    stats = {}
+    assert list(crawler.crawl(start, stats, manifest=manifest, sitemap=sitemap)) == []
+    assert fetched == [start]   # Only the start page, it is not in the sitemap
+    assert stats["unchanged"] == len(manifest)
+
+
+def test_failed_page_keeps_its_children_in_a_recrawl(monkeypatch):
+    def page(text, *links):
+        anchors = "".join(f"<a href='{link}'>{link}</a>" for link in links)
+        return f"<html><body><main><p>{text}</p>{anchors}</main></body></html>"
+
+    pages = {"/": page("Home page", "/hub", "/other"), "/hub": page("Hub page", "/leaf"),
+             "/leaf": page("Only the hub links here"), "/other": page("Another page")}
+    server = serve_site(pages)
+    host = f"127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(crawler, "DOMAIN", host)
+    start = f"http://{host}/"
+    try:
+        manifest = {}
+        list(crawler.crawl(start, manifest=manifest))
+        assert start + "leaf" in manifest
+
+        # A 5xx or timeout on the hub during the re-crawl
+        scrape_page = crawler.scrape_page
+        monkeypatch.setattr(crawler, "scrape_page", lambda url, *args: {"status": "failed"} if url == start + "hub"
+                            else scrape_page(url, *args))
+        stats = {}
+        crawled = list(crawler.crawl(start, stats, manifest=manifest))
+    finally:
+        server.shutdown()
+    assert stats["failed"] == 1 and stats["removed"] == 0
+    assert crawled == []
+    assert {start + "hub", start + "leaf"} <= set(manifest)
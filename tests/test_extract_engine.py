@@ -0,0 +1,91 @@
+import json
+import threading
+
+import pytest
+
+import ollama_client
+from extract_engine import NO_CHUNKS, ExtractEngine
+from stub_servers import serve_stub_ollama, stub_url
+from tracing import Tracer
+
+
+def test_failed_generation_cancels_the_others():
+    started = threading.Barrier(3)
+    stopped = []
+
+    def generate(prompt, cancelled, options, done):
+        started.wait(timeout=5)
+        if prompt == "fail":
+            raise ConnectionError("ollama went away")
+        # A slow generation that only ends when it is cancelled
+        stopped.append(cancelled.wait(timeout=5))
+        return None
+
+    engine = ExtractEngine("parallel", generate=generate, max_workers=3)
+    with pytest.raises(ConnectionError):
+        engine.run(["slow 0", "fail", "slow 2"])
+    engine.pool.shutdown(wait=True)
+    assert stopped == [True, True]
+
+
+def test_parallel_stops_after_the_answer():
+    def generate(prompt, cancelled, options, done):
+        if prompt == "slow":
+            cancelled.wait(timeout=5)
+            return None
+        return "not in my data" if prompt == "none" else "info@example.com"
+
+    timings = []
+    rank, text = ExtractEngine("parallel", generate=generate).run(["none", "found", "slow"], timings=timings)
+    assert (rank, text) == (1, "info@example.com")
+    assert [t["status"] for t in timings] == ["not_found", "answer", "cancelled"]
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel"])
+@pytest.mark.parametrize("prompts", [[], ["ok", ""], ["  \n"]])
+def test_empty_prompts_are_rejected(strategy, prompts):
+    calls = []
+    engine = ExtractEngine(strategy, generate=lambda prompt, cancelled, options, done: calls.append(prompt) or "x")
+    with pytest.raises(ValueError):
+        engine.run(prompts)
+    assert calls == []
+
+
+def test_extract_answer_without_chunks(monkeypatch):
+    conversation = pytest.importorskip("multi_turn_RAG_conversation")
+    monkeypatch.setattr(conversation, "EXTRACT_ENGINE", ExtractEngine("sequential"))
+    assert conversation.extract_answer(None, "email", "{text}", 0.01, 0.5, objects=[]) == NO_CHUNKS
+
+
+class Chunk:
+    def __init__(self, text):
+        self.properties = {"text": text, "url": "https://example.com/contact"}
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel"])
+def test_every_generation_reports_its_tokens(strategy, tmp_path, monkeypatch):
+    conversation = pytest.importorskip("multi_turn_RAG_conversation")
+    server = serve_stub_ollama(load_latency=0.6, token_latency=0.001)   # Loads for longer than COLD_LOAD_SECONDS
+    monkeypatch.setattr(ollama_client, "OLLAMA_URL", stub_url(server))
+    tracer = Tracer(str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(conversation, "TRACER", tracer)
+    monkeypatch.setattr(conversation, "EXTRACT_ENGINE", ExtractEngine(strategy))
+    metrics = {}
+    try:
+        with tracer.span("extract"):
+            conversation.extract_answer(None, "email", "Answer from {text} or say not in my data", 0.01, 0.5, metrics,
+                                        objects=[Chunk("Email us at info@example.com"), Chunk("Call us")])
+    finally:
+        server.shutdown()
+        tracer.close()
+
+    generated = [t for t in metrics["extract_chunks"] if t["status"] in ("answer", "not_found")]
+    assert generated and all(t["prompt_tokens"] > 0 and t["tokens_per_sec"] > 0 for t in generated)
+    assert metrics["cold_start"] is True
+    with open(tmp_path / "traces.jsonl", encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f]
+    parent = next(span for span in spans if span["name"] == "extract")
+    chunks = [span for span in spans if span["name"] == "extract_chunk"]
+    assert chunks and all(span["parent_id"] == parent["span_id"] for span in chunks)
+    assert all("prompt_tokens" in span for span in chunks if span["status"] != "cancelled")
+    assert {"extract_chunk"} <= set(tracer.prompt_tokens.series) & set(tracer.tokens_per_sec.series)
@@ -0,0 +1,13 @@
+from latency_stats import percentile
+
+
+def test_percentile():
+    values = [5, 1, 4, 2, 3]
+    assert percentile(values, 50) == 3
+    assert percentile(values, 95) == 5
+    assert percentile(values, 0) == 1
+    assert values == [5, 1, 4, 2, 3]
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 95) == 0.0
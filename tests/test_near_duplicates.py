@@ -0,0 +1,69 @@
+import json
+import random
+
+from near_duplicates import NearDuplicateIndex, choose_bands, drop_near_duplicates, save_report, shingles
+from synthetic_site import make_paragraph
+
+
+def pages():
+    rng = random.Random(0)
+    body = " ".join(make_paragraph(rng) for _ in range(6))
+    other = " ".join(make_paragraph(rng) for _ in range(6))
+    return [
+        {"url": "https://example.com/a", "text": f"Home > News. Updated 1 May 2024. {body}"},
+        {"url": "https://example.com/b", "text": other},
+        # The same page with another date and breadcrumb, and an exact copy
+        {"url": "https://example.com/a?session=42", "text": f"Home > Events. Updated 2 May 2024. {body}"},
+        {"url": "https://example.com/a-copy", "text": f"Home > News. Updated 1 May 2024. {body}"},
+        {"url": "https://example.com/empty", "text": ""},
+    ]
+
+
+def test_near_duplicates_are_dropped_and_the_first_copy_kept():
+    stats = {}
+    index = NearDuplicateIndex(0.8)
+    kept = list(drop_near_duplicates(pages(), index, stats=stats))
+    assert [page["url"] for page in kept] == ["https://example.com/a", "https://example.com/b",
+                                              "https://example.com/empty"]
+    assert stats["near_duplicates"] == 2
+    [cluster] = index.report()
+    assert cluster["kept"] == "https://example.com/a"
+    assert [r["key"] for r in cluster["removed"]] == ["https://example.com/a?session=42", "https://example.com/a-copy"]
+    assert cluster["removed"][1]["similarity"] == 1.0
+
+
+def test_distinct_texts_are_kept():
+    rng = random.Random(1)
+    index = NearDuplicateIndex(0.9)
+    assert all(index.add(i, " ".join(make_paragraph(rng) for _ in range(3))) is None for i in range(200))
+    assert index.report() == []
+
+
+def test_threshold_decides():
+    base = [f"word{i}" for i in range(100)]
+    changed = base[:90] + [f"other{i}" for i in range(10)]   # Jaccard similarity about 0.8 with base
+    strict, loose = NearDuplicateIndex(0.95), NearDuplicateIndex(0.5)
+    for index in (strict, loose):
+        index.add("base", " ".join(base))
+    assert strict.add("changed", " ".join(changed)) is None
+    assert loose.add("changed", " ".join(changed))[0] == "base"
+
+
+def test_signatures_are_stable():
+    text = "The library is open from 9am to 5pm on weekdays and closed on public holidays"
+    assert NearDuplicateIndex(seed=3).signature(text) == NearDuplicateIndex(seed=3).signature(text)
+    assert shingles("Two words") and shingles("") == set()
+    bands, rows = choose_bands(0.9, 64)
+    assert bands * rows == 64
+
+
+def test_report_keeps_both_levels(tmp_path):
+    path = str(tmp_path / "report.json")
+    index = NearDuplicateIndex(0.8)
+    list(drop_near_duplicates(pages(), index))
+    save_report(index, path, level="page")
+    save_report(NearDuplicateIndex(0.9), path, level="chunk")
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["page"]["threshold"] == 0.8 and len(report["page"]["clusters"]) == 1
+    assert report["chunk"] == {"threshold": 0.9, "clusters": []}
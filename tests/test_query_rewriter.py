@@ -0,0 +1,73 @@
+import pytest
+
+from query_rewriter import extract_entities, has_pronoun, is_follow_up, resolve_locally, similarity
+
+HISTORY = [{"user": "Where is the billing office?", "entities": ["the billing office"]}]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("What are their opening hours?", True),
+    ("Is it open on Saturday?", True),
+    ("Who is he?", True),
+    ("Tell her about it", True),
+    ("Is this the right form?", False),      # Whole words only: "this" is not "his"
+    ("Can I pay with a card?", False),       # "with" is not "it"
+    ("Where is the library?", False),
+])
+def test_has_pronoun(query, expected):
+    assert has_pronoun(query) is expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Do they take cards too?", True),
+    ("And parking as well.", True),
+    ("What about admissions?", True),
+    ("Is the fee too high?", False),
+    ("Does it also take cards?", False),
+])
+def test_is_follow_up(query, expected):
+    assert is_follow_up(query) is expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("What are their opening hours?", "What are the billing office's opening hours?"),
+    ("Is it open on Saturday?", "Is the billing office open on Saturday?"),
+    ("Do they take cards too?", "Do the billing office take cards too?"),
+    ("What is the phone number too?", "What is the phone number for the billing office?"),
+    ("Does Springfield Campus have parking as well?", "Does Springfield Campus have parking?"),
+    ("What about the admissions office?", "Where is the admissions office?"),
+])
+def test_resolve_locally(query, expected):
+    assert resolve_locally(query, HISTORY) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "Is the fee too high?",              # "too" in the middle is not a follow-up
+    "Who is he?",                        # People are left to the LLM
+    "Tell her about it",
+    "What is his email address?",
+    "Which of them is open late?",       # Picks from a group, not the latest entity
+    "Where is the library?",             # Nothing to resolve
+])
+def test_resolve_locally_leaves_alone(query):
+    assert resolve_locally(query, HISTORY) is None
+
+
+def test_resolve_locally_without_entities():
+    assert resolve_locally("What are their hours?", [{"user": "hello", "entities": []}]) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("What are the opening hours of the billing office?", ["the billing office"]),
+    ("Does the company offer internships?", ["the company"]),
+    ("How do I get to Springfield Campus?", ["Springfield Campus"]),
+    ("What are their opening hours?", []),
+    ("Where is it?", []),
+])
+def test_extract_entities(text, expected):
+    assert extract_entities(text) == expected
+
+
+def test_similarity():
+    assert similarity("What are the hours of the library?", "library hours") == 1.0
+    assert similarity("library hours", "billing office phone") == 0.0
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import bulk_import
+import import_knowledge_chunks_data as importer
+from Chunk_cleaned_text import chunk_page
+
+
+class FakeCollection:
+    """Just what sync_chunks uses of a Weaviate collection, insert_many fails for texts in failing"""
+
+    def __init__(self, failing=()):
+        self.objects = {}
+        self.failing = set(failing)
+        self.data = SimpleNamespace(insert_many=self.insert_many)
+
+    def iterator(self, return_properties=None):
+        for uuid, properties in self.objects.items():
+            yield SimpleNamespace(uuid=uuid, properties=properties)
+
+    def insert_many(self, objects):
+        errors = {}
+        for i, obj in enumerate(objects):
+            if obj.properties["text"] in self.failing:
+                errors[i] = SimpleNamespace(message="failed")
+            else:
+                self.objects[str(obj.uuid)] = obj.properties
+        return SimpleNamespace(errors=errors)
+
+
+def chunks(pages):
+    return [chunk for url, text in pages.items() for chunk in chunk_page({"url": url, "text": text})]
+
+
+def sync(collection, records, monkeypatch, removed_urls=None):
+    monkeypatch.setattr(importer, "delete_objects",
+                        lambda c, uuids: [c.objects.pop(uuid) for uuid in list(uuids)])
+    return importer.sync_chunks(collection, records, removed_urls)
+
+
+def test_edited_chunk_counts_as_changed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    collection = FakeCollection()
+    sync(collection, chunks({"https://a": "Old text of page a.", "https://b": "Page b."}), monkeypatch)
+
+    stats = sync(collection, chunks({"https://a": "New text of page a.", "https://b": "Page b."}), monkeypatch)
+    assert stats == {"new": 0, "changed": 1, "unchanged": 1, "deleted": 0, "kept_for_retry": 0}
+    assert sorted(p["text"] for p in collection.objects.values()) == ["New text of page a.", "Page b."]
+
+
+def test_removed_page_counts_as_deleted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    collection = FakeCollection()
+    sync(collection, chunks({"https://a": "Page a.", "https://b": "Page b."}), monkeypatch)
+
+    stats = sync(collection, chunks({"https://c": "Page c."}), monkeypatch, removed_urls=["https://b"])
+    assert stats == {"new": 1, "changed": 0, "unchanged": 0, "deleted": 1, "kept_for_retry": 0}
+    assert sorted(p["url"] for p in collection.objects.values()) == ["https://a", "https://c"]
+
+
+def test_old_objects_stay_when_replacement_fails(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bulk_import, "BACKOFF_SECONDS", 0.0)
+    collection = FakeCollection()
+    sync(collection, chunks({"https://a": "Old text of page a."}), monkeypatch)
+
+    collection.failing = {"New text of page a."}
+    stats = sync(collection, chunks({"https://a": "New text of page a."}), monkeypatch)
+    assert stats["kept_for_retry"] == 1 and stats["deleted"] == 0
+    assert [p["text"] for p in collection.objects.values()] == ["Old text of page a."]
+    assert (tmp_path / bulk_import.DEAD_LETTER_FILE).exists()
+
+    collection.failing = set()
+    stats = sync(collection, chunks({"https://a": "New text of page a."}), monkeypatch)
+    assert stats["changed"] == 1 and stats["kept_for_retry"] == 0
+    assert [p["text"] for p in collection.objects.values()] == ["New text of page a."]
@@ -0,0 +1,59 @@
+import pytest
+
+from index_profile import estimated_memory, vector_index_config
+from synthetic_site import make_queries, synthetic_chunks
+from tune_vector_index import best
+
+RESULTS = [
+    {"profile": {"quantizer": "none", "ef": 64}, "recall": 0.99, "p95_ms": 2.0, "estimated_mb": 40.0},
+    {"profile": {"quantizer": "sq", "ef": 64}, "recall": 0.97, "p95_ms": 3.0, "estimated_mb": 12.0},
+    {"profile": {"quantizer": "sq", "ef": 128}, "recall": 0.98, "p95_ms": 2.5, "estimated_mb": 12.0},
+    {"profile": {"quantizer": "bq", "ef": 64}, "recall": 0.80, "p95_ms": 1.0, "estimated_mb": 2.0},
+]
+
+
+def test_best_is_the_smallest_with_enough_recall():
+    assert best(RESULTS, 0.95)["profile"] == {"quantizer": "sq", "ef": 128}
+    assert best(RESULTS, 0.985)["profile"] == {"quantizer": "none", "ef": 64}
+    assert best(RESULTS, 0.5)["profile"] == {"quantizer": "bq", "ef": 64}
+
+
+def test_best_without_enough_recall_takes_the_highest():
+    assert best(RESULTS, 0.999)["profile"] == {"quantizer": "none", "ef": 64}
+
+
+@pytest.mark.parametrize("profile, expected", [
+    ({}, {}),
+    ({"ef": 64, "max_connections": 16, "ef_construction": 256, "quantizer": "none"},
+     {"ef": 64, "maxConnections": 16, "efConstruction": 256}),
+    ({"quantizer": "pq", "segments": 192, "training_limit": 500},
+     {"pq": {"enabled": True, "encoder": {}, "segments": 192, "trainingLimit": 500}}),
+    ({"quantizer": "bq"}, {"bq": {"enabled": True}}),
+    ({"quantizer": "sq", "training_limit": 500}, {"sq": {"enabled": True, "trainingLimit": 500}}),
+])
+def test_vector_index_config(profile, expected):
+    assert vector_index_config(profile)._to_dict() == expected
+
+
+def test_unknown_profile_settings_are_rejected():
+    with pytest.raises(ValueError):
+        vector_index_config({"efConstruction": 128})
+    with pytest.raises(ValueError):
+        vector_index_config({"quantizer": "rq"})
+
+
+def test_estimated_memory():
+    assert estimated_memory({"max_connections": 16}, 1000, 768) == 1000 * (4 * 768 + 2 * 16 * 8)
+    # pq only compresses once the collection holds training_limit vectors
+    assert estimated_memory({"quantizer": "pq", "segments": 192}, 1000, 768) == 1000 * (4 * 768 + 2 * 32 * 8)
+    assert estimated_memory({"quantizer": "pq", "segments": 192, "training_limit": 1000}, 1000, 768) == \
+        1000 * (192 + 2 * 32 * 8)
+
+
+def test_queries_come_from_their_chunk():
+    chunks = synthetic_chunks(5)
+    texts = {chunk["chunk_id"]: chunk["text"] for chunk in chunks}
+    queries = make_queries(chunks, 10, 6)
+    assert len(queries) == 10
+    assert all(query in texts[chunk_id] for query, chunk_id in queries)
+    assert make_queries(chunks, 10, 6) == queries
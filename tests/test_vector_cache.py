@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pytest
+
+from vector_cache import CachedEmbedder, VectorCache
+
+
+def embed(texts):
+    return [[float(len(text)), 1.0, 2.0] for text in texts]
+
+
+def test_vectors_are_reused_after_reopening(tmp_path):
+    first = CachedEmbedder(VectorCache(str(tmp_path)), embed=embed)
+    vectors = first(["a", "bb", "a"])
+    again = CachedEmbedder(VectorCache(str(tmp_path)), embed=embed)
+    assert again(["bb", "a"]) == [vectors[1], vectors[0]]
+    assert again.calls == 0 and again.hits == 2
+
+
+def test_missing_vectors_file_opens_empty(tmp_path):
+    cache = VectorCache(str(tmp_path))
+    cache.add_many(["k"], np.ones((1, 3)))
+    os.remove(cache.vectors_path)   # Interrupted before the vectors were written
+
+    cache = VectorCache(str(tmp_path))
+    assert len(cache) == 0 and cache.dim is None
+    cache.add_many(["k2"], np.ones((1, 5)))
+    reopened = VectorCache(str(tmp_path))
+    assert reopened.dim == 5 and list(reopened.rows) == ["k2"]
+
+
+def test_keys_without_vectors_are_cut_off(tmp_path):
+    cache = VectorCache(str(tmp_path))
+    cache.add_many(["a", "b"], np.ones((2, 3)))
+    with open(cache.keys_path, "a", encoding="utf-8") as f:
+        f.write("c\n")   # Crash after the key but before its vector
+    reopened = VectorCache(str(tmp_path))
+    assert list(reopened.rows) == ["a", "b"]
+    with pytest.raises(ValueError):
+        reopened.add_many(["d"], np.ones((1, 4)))
@@ -0,0 +1,239 @@
+
+# Where the time of a chat turn goes: every step of multi_turn_RAG_conversation.chat() and chat_stream() is a span
+# (needs_rewriting, resolve_locally, rewrite_query, retrieve, extract, generate) inside one "turn" span, which also
+# holds the turn's metrics dict (mode, rewrite, answer_cache, context...). Each chunk extract mode generates for is
+# an extract_chunk span inside "extract" (extract_engine.py)
+
+# Spans are written as JSON lines, one per finished span, children before their parent:
+#   {"trace_id", "span_id", "parent_id", "name", "start" (unix time), "seconds", ...attributes}
+# LLM spans carry what Ollama reports: prompt_tokens (prompt_eval_count), tokens (eval_count), tokens_per_sec
+# (eval_count / eval_duration), prompt_seconds (prompt_eval_duration, reading the prompt) and load_seconds
+# (load_duration), with cold set when loading the model took longer than COLD_LOAD_SECONDS (see model_warmup.py).
+# The same spans also feed histograms of their seconds, prompt tokens, tokens per second and the time to the first
+# token of streamed answers (cold_start or warm), which
+# chat_service.py serves in the Prometheus text format at GET /metrics.
+
+#   python multi_turn_RAG_conversation.py --trace traces.jsonl
+#   python chat_service.py --trace traces.jsonl --metrics
+#   python tracing.py traces.jsonl       p50/p95 of every span and the slowest turns
+
+# Tracing is off unless a file or metrics are asked for. Then span() returns the same do-nothing object every time,
+# so a turn pays a few attribute lookups and nothing else.
+
+import argparse
+import bisect
+import contextvars
+import functools
+import json
+import threading
+import time
+import uuid
+
+from latency_stats import percentile
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+TOKENS_PER_SEC_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+COLD_LOAD_SECONDS = 0.5   # An LLM call that spent longer loading its model found it unloaded
+
+_current = contextvars.ContextVar("span", default=None)   # (trace_id, span_id) of the span being run
+
+
+def generation_stats(result):
+    """Ollama's counts from the last (done) part of a generation, as span attributes"""
+    stats = {}
+    if result.get("prompt_eval_count") is not None:
+        stats["prompt_tokens"] = result["prompt_eval_count"]
+    if result.get("prompt_eval_duration"):
+        stats["prompt_seconds"] = result["prompt_eval_duration"] / 1e9
+    if result.get("eval_count") is not None:
+        stats["tokens"] = result["eval_count"]
+        if result.get("eval_duration"):
+            stats["tokens_per_sec"] = result["eval_count"] / (result["eval_duration"] / 1e9)
+    if result.get("load_duration") is not None:
+        stats["load_seconds"] = result["load_duration"] / 1e9
+        stats["cold"] = stats["load_seconds"] > COLD_LOAD_SECONDS
+    return stats
+
+
+class NoSpan:
+    """What span() returns while tracing is off, accepts everything and records nothing"""
+    trace_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+    def update(self, *args, **kwargs):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = self.span_id = self.parent_id = None
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace_id, self.parent_id = parent if parent else (uuid.uuid4().hex, None)
+        self.span_id = uuid.uuid4().hex[:16]
+        self._token = _current.set((self.trace_id, self.span_id))
+        self.start = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start
+        try:
+            _current.reset(self._token)
+        except ValueError:   # A generator closed from another context (chat_stream abandoned by its reader)
+            pass
+        if exc_type is GeneratorExit:
+            self.attributes["cancelled"] = True   # The reader stopped reading a streamed answer
+        elif exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer.finish(self)
+        return False
+
+    def __setitem__(self, key, value):
+        self.attributes[key] = value
+
+    def update(self, *args, **kwargs):
+        self.attributes.update(*args, **kwargs)
+
+    def record(self):
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+                "start": round(self.start, 6), "seconds": round(self.seconds, 6), **self.attributes}
+
+
+class Histogram:
+    """Prometheus style histogram with one series per label value"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}   # label value -> [counts per bucket (the last one is +Inf), sum]
+
+    def observe(self, label, value):
+        series = self.series.get(label)
+        if series is None:
+            series = self.series[label] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def lines(self, label_name):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for label, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}'
+            yield f'{self.name}_sum{{{label_name}="{label}"}} {total:g}'
+            yield f'{self.name}_count{{{label_name}="{label}"}} {cumulative}'
+
+
+class Tracer:
+    """
+    Args:
+        path: JSONL file the spans are appended to, None to not write them
+        metrics: Keep the histograms for prometheus() even without a path
+    """
+
+    def __init__(self, path=None, metrics=False):
+        self.enabled = bool(path or metrics)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self._lock = threading.Lock()
+        self.seconds = Histogram("rag_span_seconds", "Seconds spent in each step of a chat turn", SECONDS_BUCKETS)
+        self.prompt_tokens = Histogram("rag_prompt_tokens", "Prompt tokens of each LLM call", TOKEN_BUCKETS)
+        self.tokens_per_sec = Histogram("rag_tokens_per_second", "Tokens generated per second by each LLM call",
+                                        TOKENS_PER_SEC_BUCKETS)
+        self.first_token = Histogram("rag_first_token_seconds",
+                                     "Seconds from the start of a streamed turn to its first token", SECONDS_BUCKETS)
+        self.errors = {}   # span name -> spans that raised
+
+    def span(self, name, **attributes):
+        """Context manager timing a step, set more attributes on it with span[key] = value or span.update()"""
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name, attributes)
+
+    def bind(self, function):
+        """function, running inside the current span when called from another thread (e.g. a thread pool)"""
+        if not self.enabled:
+            return function
+        return functools.partial(contextvars.copy_context().run, function)
+
+    def finish(self, span):
+        line = json.dumps(span.record(), ensure_ascii=False, default=str) + "\n" if self._file else None
+        with self._lock:
+            self.seconds.observe(span.name, span.seconds)
+            if "prompt_tokens" in span.attributes:
+                self.prompt_tokens.observe(span.name, span.attributes["prompt_tokens"])
+            if "tokens_per_sec" in span.attributes:
+                self.tokens_per_sec.observe(span.name, span.attributes["tokens_per_sec"])
+            if "first_token_seconds" in span.attributes:
+                self.first_token.observe("cold" if span.attributes.get("cold_start") else "warm",
+                                         span.attributes["first_token_seconds"])
+            if "error" in span.attributes:
+                self.errors[span.name] = self.errors.get(span.name, 0) + 1
+            if line:
+                self._file.write(line)
+                self._file.flush()
+
+    def prometheus(self):
+        """The histograms in the Prometheus text format"""
+        with self._lock:
+            lines = [*self.seconds.lines("span"), *self.prompt_tokens.lines("span"),
+                     *self.tokens_per_sec.lines("span"), *self.first_token.lines("start"),
+                     "# HELP rag_span_errors_total Steps of a chat turn that raised an exception",
+                     "# TYPE rag_span_errors_total counter"]
+            lines.extend(f'rag_span_errors_total{{span="{name}"}} {count}' for name, count in sorted(self.errors.items()))
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default="traces.jsonl")
+    parser.add_argument("--slowest", type=int, default=5, help="turns to show, slowest first")
+    args = parser.parse_args()
+
+    spans = {}
+    traces = {}
+    with open(args.path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                spans.setdefault(span["name"], []).append(span)
+                traces.setdefault(span["trace_id"], []).append(span)
+
+    print(f"{'span':>16} {'count':>6} {'p50':>8} {'p95':>8} {'tokens/s':>9}")
+    for name, named in sorted(spans.items(), key=lambda item: -sum(s["seconds"] for s in item[1])):
+        seconds = [s["seconds"] for s in named]
+        speeds = [s["tokens_per_sec"] for s in named if "tokens_per_sec" in s]
+        speed = f"{percentile(speeds, 50):9.1f}" if speeds else f"{'':9}"
+        print(f"{name:>16} {len(named):6} {percentile(seconds, 50):7.3f}s {percentile(seconds, 95):7.3f}s {speed}")
+
+    turns = sorted((s for s in spans.get("turn", [])), key=lambda s: -s["seconds"])[:args.slowest]
+    for turn in turns:
+        steps = sorted((s for s in traces[turn["trace_id"]] if s is not turn), key=lambda s: s["start"])
+        print(f"\n{turn['seconds']:.2f}s turn {turn['trace_id']} ({turn.get('metrics', {}).get('mode', '?')})")
+        for step in steps:
+            print(f"   {step['name']:>16} {step['seconds']:7.3f}s")
@@ -0,0 +1,217 @@
+# Finds the vector index settings of KnowledgeChunk that need the least memory for the recall we want
+#   python tune_vector_index.py chunked_pages.json
+#   python tune_vector_index.py chunked_pages.json --max-connections 8 16 32 --quantizers none pq sq --min-recall 0.98
+#   python create_knowledge_chunks_collection.py --profile index_profile.json
+#   python tune_vector_index.py --stub        (synthetic chunks, stub Ollama and Weaviate, to try the tool itself:
+#                                              the stub searches exactly, so every profile gets a recall of 100%;
+#                                              tests/test_tune_vector_index.py checks how the profile is chosen)
+
+# For every combination of --max-connections, --ef-construction and --quantizers the chunks are imported into a new
+# collection (KnowledgeChunkTuning, deleted afterwards), then the queries are replayed for every --ef (ef can be
+# changed without rebuilding the graph). The chunks are embedded once, through vector_cache/, and imported with their
+# vectors, so the rebuilds don't wait for Ollama.
+# For each profile it reports:
+#   recall    share of the exact top --k (brute-force cosine similarity over all chunks) the search returned
+#   p50/p95   search latency, vector search only, the query's embedding is computed beforehand
+#   import    seconds to import the chunks and build the graph
+#   memory    estimated MB for vectors and graph (index_profile.estimated_memory), and "heap", how much Weaviate's
+#             heap grew during the import. The heap is read from Weaviate's Prometheus metrics, which need
+#             PROMETHEUS_MONITORING_ENABLED (set in docker-compose.yml), it is left out when they can't be read.
+# The winner is the profile with the smallest estimated memory among those with recall >= --min-recall (then the
+# fastest), written to index_profile.json. All results go to vector_index_sweep.json.
+
+# The queries are --queries (a text file with one question per line, e.g. questions your users asked) or else a
+# few words from random chunks. pq and sq only compress once a collection holds training_limit vectors, the tool
+# sets it to the number of chunks so that they compress here. Keep the same in the saved profile: a profile with
+# compression and the default limit of 100000 does nothing on a smaller site.
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+import urllib.request
+
+import weaviate
+from weaviate.classes.config import Configure, Reconfigure
+
+import ollama_client
+from bulk_import import BulkImporter
+from import_knowledge_chunks_data import VECTOR_NAME, chunk_object
+from index_profile import PROFILE_FILE, QUANTIZERS, estimated_memory, save_profile, vector_index_config
+from latency_stats import percentile
+from local_index import normalized, top
+from pipeline_io import read_records
+from synthetic_site import make_queries, synthetic_chunks
+from vector_cache import CachedEmbedder, VectorCache
+
+TUNING_COLLECTION = "KnowledgeChunkTuning"
+RESULTS_FILE = "vector_index_sweep.json"
+WARMUP_QUERIES = 10
+
+
+def read_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def unique_chunks(chunks):
+    """Chunks with a distinct UUID (the same chunk_id and text are one object in Weaviate), and their UUIDs"""
+    seen = {}
+    for chunk in chunks:
+        seen.setdefault(str(chunk_object(chunk)[0]), chunk)
+    return list(seen.values()), list(seen)
+
+
+def weaviate_heap(metrics_url):
+    """Bytes in use on Weaviate's heap, None if its metrics can't be read"""
+    try:
+        with urllib.request.urlopen(metrics_url, timeout=5) as response:
+            for line in response.read().decode("utf-8").splitlines():
+                if line.startswith("go_memstats_heap_inuse_bytes "):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def build(client, chunks, vectors, profile, metrics_url):
+    """Create the tuning collection with the profile and import the chunks, returns (collection, seconds, heap bytes)"""
+    if client.collections.exists(TUNING_COLLECTION):
+        client.collections.delete(TUNING_COLLECTION)
+    heap_before = weaviate_heap(metrics_url)
+    collection = client.collections.create(
+        name=TUNING_COLLECTION,
+        vector_config=Configure.Vectors.self_provided(name=VECTOR_NAME, vector_index_config=vector_index_config(profile)),
+    )
+
+    def objects():
+        for chunk, vector in zip(chunks, vectors):
+            uuid, properties = chunk_object(chunk)
+            yield uuid, properties, {VECTOR_NAME: vector.tolist()}
+
+    start = time.perf_counter()
+    # The objects are all in the input file, there is nothing to retry later
+    stats = BulkImporter(collection, dead_letter_path=os.devnull).run(objects())
+    seconds = time.perf_counter() - start
+    if stats["dead_letter"]:
+        print(f"   {stats['dead_letter']} chunks failed to import, recall will be lower")
+    heap_after = weaviate_heap(metrics_url)
+    heap = heap_after - heap_before if heap_before is not None and heap_after is not None else None
+    return collection, seconds, heap
+
+
+def search(collection, query_vectors, exact, uuids, k):
+    """(recall, latencies) of the collection's vector search against the exact results"""
+    for vector in query_vectors[:WARMUP_QUERIES]:
+        collection.query.near_vector(near_vector=vector.tolist(), limit=k, target_vector=VECTOR_NAME,
+                                     return_properties=[])
+    latencies, recalls = [], []
+    for vector, expected in zip(query_vectors, exact):
+        start = time.perf_counter()
+        response = collection.query.near_vector(near_vector=vector.tolist(), limit=k, target_vector=VECTOR_NAME,
+                                                return_properties=[])
+        latencies.append(time.perf_counter() - start)
+        found = {str(obj.uuid) for obj in response.objects}
+        recalls.append(len(found & {uuids[i] for i in expected}) / len(expected))
+    return statistics.mean(recalls), latencies
+
+
+def best(results, min_recall):
+    """The result with the least estimated memory (then the lowest p95) of those recalling enough"""
+    good = [r for r in results if r["recall"] >= min_recall]
+    if not good:
+        print(f"No profile reached a recall of {min_recall:.0%}, taking the one with the highest recall")
+        return max(results, key=lambda r: (r["recall"], -r["p95_ms"]))
+    return min(good, key=lambda r: (r["estimated_mb"], r["p95_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", nargs="?", default="chunked_pages.json")
+    parser.add_argument("--stub", action="store_true", help="synthetic chunks, stub Ollama and Weaviate")
+    parser.add_argument("--pages", type=int, default=200, help="synthetic pages with --stub")
+    parser.add_argument("--queries", help="text file with one query per line, default: words from random chunks")
+    parser.add_argument("--sample-queries", type=int, default=200, help="queries to take from the chunks")
+    parser.add_argument("--k", type=int, default=8, help="results per query (the chatbot retrieves 8)")
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--max-connections", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[128])
+    parser.add_argument("--quantizers", nargs="+", choices=QUANTIZERS, default=list(QUANTIZERS))
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--metrics-url", default="http://localhost:2112/metrics", help="Weaviate's Prometheus metrics")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--profile", default=PROFILE_FILE, help="where to write the winning profile")
+    args = parser.parse_args()
+
+    servers = []
+    if args.stub:
+        from stub_servers import serve_stub_ollama, serve_stub_weaviate, stub_url
+        servers = [serve_stub_ollama(), serve_stub_weaviate()]
+        ollama_client.OLLAMA_URL = stub_url(servers[0])
+        chunks = synthetic_chunks(args.pages)
+    else:
+        chunks = read_records(args.input_path)
+    chunks, uuids = unique_chunks(chunks)
+    if args.queries:
+        queries = read_queries(args.queries)
+    else:
+        queries = [query for query, chunk_id in make_queries(chunks, args.sample_queries, 6)]
+    embedder = CachedEmbedder(VectorCache(tempfile.mkdtemp()) if args.stub else VectorCache())
+    print(f"Embedding {len(chunks)} chunks and {len(queries)} queries (vectors already in vector_cache/ are reused)")
+    vectors = normalized(embedder([chunk["text"] for chunk in chunks]))
+    query_vectors = normalized(embedder(queries))
+    count, dimensions = vectors.shape
+    exact = [top(vectors @ vector, args.k) for vector in query_vectors]
+
+    results = []
+    if args.stub:
+        client = weaviate.connect_to_local(port=servers[1].server_address[1], grpc_port=servers[1].grpc_port,
+                                           skip_init_checks=True)
+    else:
+        client = weaviate.connect_to_local()
+    try:
+        for max_connections, ef_construction, quantizer in itertools.product(
+                args.max_connections, args.ef_construction, args.quantizers):
+            profile = {"max_connections": max_connections, "ef_construction": ef_construction, "quantizer": quantizer}
+            if quantizer == "pq":
+                profile["segments"] = dimensions // 4
+            if quantizer in ("pq", "sq"):
+                profile["training_limit"] = count
+            print(f"\nmaxConnections {max_connections}, efConstruction {ef_construction}, quantizer {quantizer}")
+            collection, import_seconds, heap = build(client, chunks, vectors, profile, args.metrics_url)
+            memory = estimated_memory(profile, count, dimensions) / 1e6
+            for ef in args.ef:
+                collection.config.update(vector_config=Reconfigure.Vectors.update(
+                    name=VECTOR_NAME, vector_index_config=Reconfigure.VectorIndex.hnsw(ef=ef)))
+                recall, latencies = search(collection, query_vectors, exact, uuids, args.k)
+                result = {"profile": {"ef": ef, **profile}, "recall": round(recall, 4),
+                          "p50_ms": round(1000 * percentile(latencies, 50), 2),
+                          "p95_ms": round(1000 * percentile(latencies, 95), 2),
+                          "import_seconds": round(import_seconds, 2), "estimated_mb": round(memory, 1),
+                          "heap_mb": None if heap is None else round(heap / 1e6, 1)}
+                results.append(result)
+                heap_text = "" if heap is None else f", heap +{result['heap_mb']} MB"
+                print(f"   ef {ef:>4}: recall@{args.k} {recall:.1%} | p50 {result['p50_ms']} ms p95 {result['p95_ms']} ms"
+                      f" | import {import_seconds:.1f}s | ~{memory:.1f} MB{heap_text}")
+        client.collections.delete(TUNING_COLLECTION)
+    finally:
+        client.close()
+        for server in servers:
+            server.shutdown()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"chunks": count, "dimensions": dimensions, "queries": len(queries), "k": args.k,
+                   "results": results}, f, indent=2)
+    winner = best(results, args.min_recall)
+    measured = {key: value for key, value in winner.items() if key != "profile"}
+    save_profile(winner["profile"], measured, args.profile)
+    print(f"\nBest profile: {winner['profile']}\n   {measured}")
+    print(f"Saved to {args.profile}, use it with: python create_knowledge_chunks_collection.py --profile {args.profile}")
+    print(f"All results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+
+# On-disk cache of embedding vectors, keyed by a hash of the embedded text
+# Used by import_knowledge_chunks_data.py --client-embed
+
+# The vectors are stored one after another in vectors.f32 and read through a memory map, so the cache can hold
+# far more vectors than fit in memory. keys.txt lists the text hash of each row. Both files are only ever appended to.
+# A crash can at worst leave vectors without their keys, and those are cut off when the cache is opened. If it
+# happened before the first vectors were written, the cache opens empty.
+# Deleting or re-creating the KnowledgeChunk collection does not touch this cache. Importing again only has to
+# embed text that is not already in it.
+
+# Install these packages: pip install numpy requests
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import ollama_client
+
+CACHE_DIR = "vector_cache"
+EMBED_BATCH_SIZE = 64   # Texts per /api/embed request
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class VectorCache:
+    """Append-only, memory-mapped store of float32 vectors for one embedding model"""
+
+    def __init__(self, path=CACHE_DIR, model=ollama_client.EMBED_MODEL):
+        self.dir = os.path.join(path, model.replace("/", "_").replace(":", "_"))
+        os.makedirs(self.dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.keys_path = os.path.join(self.dir, "keys.txt")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.dim = None
+        self.rows = {}      # text key -> row number
+        self._vectors = None
+
+        if os.path.exists(self.meta_path) and not os.path.exists(self.vectors_path):
+            # Interrupted before the first vectors were written: start empty and write meta.json again on add_many
+            os.remove(self.meta_path)
+            if os.path.exists(self.keys_path):
+                os.remove(self.keys_path)
+        elif os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+            complete_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+            lines = 0
+            with open(self.keys_path, "a+", encoding="utf-8") as f:
+                f.seek(0)
+                for lines, line in enumerate(f, 1):
+                    if lines <= complete_rows:
+                        self.rows[line.strip()] = lines - 1
+            if lines != len(self.rows) or complete_rows != len(self.rows):
+                self.repair()
+
+    def repair(self):
+        """Cut both files back to the rows that have a vector and a key, after a crash part way through add_many"""
+        with open(self.keys_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{key}\n" for key, row in sorted(self.rows.items(), key=lambda item: item[1]))
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(len(self.rows) * 4 * self.dim)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def vectors(self):
+        """Read only memory map of all the stored vectors"""
+        if self._vectors is None or len(self._vectors) < len(self.rows):
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.rows), self.dim))
+        return self._vectors
+
+    def get_many(self, keys):
+        """{key: vector} for the keys that are in the cache"""
+        found = [(key, self.rows[key]) for key in keys if key in self.rows]
+        if not found:
+            return {}
+        vectors = self.vectors()
+        return {key: vectors[row] for key, row in found}
+
+    def add_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"vector size {vectors.shape[1]} does not match the cache ({self.dim})")
+
+        # Vectors first, then their keys, so a key never points past the end of the vectors file
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.keys_path, "a", encoding="utf-8") as f:
+            for key in keys:
+                self.rows[key] = len(self.rows)
+                f.write(key + "\n")
+
+
+class CachedEmbedder:
+    """
+    Embeds texts in batches through Ollama, skipping every text already in the cache
+
+    Args:
+        cache: VectorCache to read from and add to
+        embed: Function taking a list of texts and returning their vectors, ollama_client.embed by default
+        batch_size: Texts per embed call
+    """
+
+    def __init__(self, cache, embed=ollama_client.embed, batch_size=EMBED_BATCH_SIZE):
+        self.cache = cache
+        self.embed = embed
+        self.batch_size = batch_size
+        self.calls = 0       # Requests made to the embedding model
+        self.embedded = 0    # Texts sent to the embedding model
+        self.hits = 0        # Texts found in the cache
+
+    def __call__(self, texts):
+        """One vector (list of floats) per text"""
+        keys = [text_key(text) for text in texts]
+        found = self.cache.get_many(keys)
+        self.hits += sum(key in found for key in keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[i:i + self.batch_size]
+            vectors = self.embed([missing[key] for key in batch_keys])
+            self.calls += 1
+            self.embedded += len(batch_keys)
+            self.cache.add_many(batch_keys, vectors)
+        if missing:
+            found.update(self.cache.get_many(missing_keys))
+
+        return [found[key].tolist() for key in keys]